@@ -5,6 +5,10 @@ LLM-basiertes semantisches Matching für Spracheingaben
 Endpoints:
 - POST /api/match - Vergleicht gesprochene Antwort mit erwarteter Antwort
 - GET /api/health - Health Check
+- GET /metrics - Prometheus Metriken (Latenz je Pfad, In-Flight, Upstream-Fehler)
+
+LLM-Urteile werden pro Karte gecacht (siehe match_cache), inkl. fast
+identischer Transkripte.
 
 Nutzung:
     uvicorn src.api.answer_matcher:app --host 0.0.0.0 --port 8085
@@ -13,11 +17,15 @@ Nutzung:
 import os
 import json
 import logging
+import time
 from typing import Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import httpx
+
+from src.api.match_cache import MatchCache, dice_coefficient
+from src.api.metrics import CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+from src.h5p.llm import get_llm_client, LLMError
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -61,6 +69,81 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 MATCH_THRESHOLD = 70  # Minimum Score für "korrekt"
 
+# Cache für LLM-Urteile (None wenn MATCH_CACHE_DISABLE gesetzt)
+match_cache = MatchCache.from_env()
+
+
+# ========== METRICS ==========
+
+METRICS = Registry()
+
+REQUEST_LATENCY = Histogram(
+    "answer_matcher_request_duration_seconds",
+    "Dauer von /api/match je Pfad (exact, cache, llm, fallback).",
+    ["path"],
+    registry=METRICS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "answer_matcher_requests_in_flight",
+    "Laufende /api/match Anfragen.",
+    registry=METRICS
+)
+LLM_LATENCY = Histogram(
+    "answer_matcher_llm_duration_seconds",
+    "Dauer der LLM-Aufrufe inkl. Retries.",
+    registry=METRICS
+)
+LLM_IN_FLIGHT = Gauge(
+    "answer_matcher_llm_requests_in_flight",
+    "Laufende LLM-Aufrufe.",
+    registry=METRICS
+)
+UPSTREAM_ERRORS = Counter(
+    "answer_matcher_upstream_errors_total",
+    "Fehlgeschlagene LLM-Aufrufe (HTTP-Status, Exception-Typ oder invalid_response).",
+    ["reason"],
+    registry=METRICS
+)
+FALLBACKS = Counter(
+    "answer_matcher_fallbacks_total",
+    "Antworten über fallback_match (no_api_key, upstream_error, invalid_response).",
+    ["reason"],
+    registry=METRICS
+)
+LLM_CACHE_HITS = Counter(
+    "answer_matcher_llm_cache_hits_total",
+    "Treffer im lokalen LLM Response Cache.",
+    registry=METRICS
+)
+LLM_CACHE_MISSES = Counter(
+    "answer_matcher_llm_cache_misses_total",
+    "Fehlschläge im lokalen LLM Response Cache.",
+    registry=METRICS
+)
+
+
+MATCH_CACHE_LOOKUPS = Counter(
+    "answer_matcher_match_cache_lookups_total",
+    "Lookups im Match-Cache (hit, near, shared, miss).",
+    ["result"],
+    registry=METRICS
+)
+MATCH_CACHE_ENTRIES = Gauge(
+    "answer_matcher_match_cache_entries",
+    "Gecachte Urteile.",
+    registry=METRICS
+)
+
+
+def _llm_cache_stat(key: str) -> float:
+    cache = get_llm_client().cache
+    return cache.stats().get(key, 0) if cache is not None else 0
+
+
+LLM_CACHE_HITS.set_function(lambda: _llm_cache_stat("hits"))
+LLM_CACHE_MISSES.set_function(lambda: _llm_cache_stat("misses"))
+MATCH_CACHE_ENTRIES.set_function(lambda: len(match_cache) if match_cache is not None else 0)
+
 
 # ========== LLM MATCHING ==========
 
@@ -92,13 +175,19 @@ Antworte NUR mit validem JSON:
 {{"match_score": <int>, "is_correct": <bool>, "feedback": "<string>"}}"""
 
 
+def _fallback(spoken: str, expected: str, reason: str) -> dict:
+    """fallback_match mit Zählung des Grundes"""
+    FALLBACKS.labels(reason=reason).inc()
+    return {**fallback_match(spoken, expected), "path": "fallback"}
+
+
 async def match_with_llm(spoken: str, expected: str, context: Optional[str] = None) -> dict:
-    """Führt LLM-basiertes Matching durch"""
+    """Führt LLM-basiertes Matching durch ("path": llm oder fallback)"""
 
     if not OPENAI_API_KEY:
         # Fallback: Einfaches String-Matching
         logger.warning("No OPENAI_API_KEY - using fallback matching")
-        return fallback_match(spoken, expected)
+        return _fallback(spoken, expected, "no_api_key")
 
     prompt = MATCH_PROMPT.format(
         context=context or "Dialogkarte",
@@ -107,46 +196,41 @@ async def match_with_llm(spoken: str, expected: str, context: Optional[str] = No
     )
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": OPENAI_MODEL,
-                    "messages": [
-                        {"role": "system", "content": "Du antwortest nur mit validem JSON."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 200
-                }
+        with LLM_IN_FLIGHT.track_inprogress(), LLM_LATENCY.time():
+            content = await get_llm_client().chat(
+                [
+                    {"role": "system", "content": "Du antwortest nur mit validem JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=200,
+                temperature=0.3,
+                json_mode=False,
+                timeout=30.0,
+                model=OPENAI_MODEL,
+                stage="answer_match"
             )
-
-            if response.status_code != 200:
-                logger.error(f"OpenAI API Error: {response.status_code} - {response.text}")
-                return fallback_match(spoken, expected)
-
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-
-            # Parse JSON response
-            try:
-                result = json.loads(content)
-                return {
-                    "match_score": result.get("match_score", 0),
-                    "is_correct": result.get("is_correct", False),
-                    "feedback": result.get("feedback", "")
-                }
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse LLM response: {content}")
-                return fallback_match(spoken, expected)
-
+    except LLMError as e:
+        logger.error(f"OpenAI API Error: {e.status_code} - {e.body}")
+        UPSTREAM_ERRORS.labels(reason=f"http_{e.status_code}").inc()
+        return _fallback(spoken, expected, "upstream_error")
     except Exception as e:
         logger.error(f"LLM matching error: {e}")
-        return fallback_match(spoken, expected)
+        UPSTREAM_ERRORS.labels(reason=type(e).__name__).inc()
+        return _fallback(spoken, expected, "upstream_error")
+
+    # Parse JSON response
+    try:
+        result = json.loads(content)
+        return {
+            "match_score": result.get("match_score", 0),
+            "is_correct": result.get("is_correct", False),
+            "feedback": result.get("feedback", ""),
+            "path": "llm"
+        }
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse LLM response: {content}")
+        UPSTREAM_ERRORS.labels(reason="invalid_response").inc()
+        return _fallback(spoken, expected, "invalid_response")
 
 
 def fallback_match(spoken: str, expected: str) -> dict:
@@ -155,18 +239,6 @@ def fallback_match(spoken: str, expected: str) -> dict:
     def normalize(s: str) -> str:
         return s.lower().strip()
 
-    def dice_coefficient(s1: str, s2: str) -> float:
-        if s1 == s2:
-            return 1.0
-        if len(s1) < 2 or len(s2) < 2:
-            return 0.0
-
-        bigrams1 = set(s1[i:i+2] for i in range(len(s1) - 1))
-        bigrams2 = set(s2[i:i+2] for i in range(len(s2) - 1))
-
-        intersection = len(bigrams1 & bigrams2)
-        return (2 * intersection) / (len(bigrams1) + len(bigrams2))
-
     s1 = normalize(spoken)
     s2 = normalize(expected)
 
@@ -206,10 +278,17 @@ async def health():
         "service": "H5P Answer Matcher",
         "version": "1.0.0",
         "llm_enabled": bool(OPENAI_API_KEY),
-        "model": OPENAI_MODEL if OPENAI_API_KEY else "fallback"
+        "model": OPENAI_MODEL if OPENAI_API_KEY else "fallback",
+        "match_cache": match_cache.stats() if match_cache is not None else None
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus Metriken"""
+    return Response(content=METRICS.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/api/match", response_model=MatchResponse)
 async def match_answer(request: MatchRequest):
     """
@@ -222,27 +301,47 @@ async def match_answer(request: MatchRequest):
     if not request.spoken or not request.expected:
         raise HTTPException(status_code=400, detail="spoken and expected are required")
 
-    # Normalisiere Texte
-    spoken_norm = normalize_text(request.spoken)
-    expected_norm = normalize_text(request.expected)
-
-    # Quick check: Exakte Übereinstimmung
-    if spoken_norm == expected_norm:
-        return MatchResponse(
-            match_score=100,
-            is_correct=True,
-            feedback="Perfekt! Genau richtig.",
-            spoken_normalized=spoken_norm,
-            expected_normalized=expected_norm
-        )
-
-    # LLM Matching
-    result = await match_with_llm(
-        spoken=request.spoken,
-        expected=request.expected,
-        context=request.context
-    )
+    started = time.perf_counter()
+    with REQUESTS_IN_FLIGHT.track_inprogress():
+        # Normalisiere Texte
+        spoken_norm = normalize_text(request.spoken)
+        expected_norm = normalize_text(request.expected)
+
+        # Quick check: Exakte Übereinstimmung
+        if spoken_norm == expected_norm:
+            REQUEST_LATENCY.labels(path="exact").observe(time.perf_counter() - started)
+            return MatchResponse(
+                match_score=100,
+                is_correct=True,
+                feedback="Perfekt! Genau richtig.",
+                spoken_normalized=spoken_norm,
+                expected_normalized=expected_norm
+            )
+
+        # LLM Matching (über den Cache: gleiche oder fast gleiche Antworten derselben Karte)
+        def compute():
+            return match_with_llm(
+                spoken=request.spoken,
+                expected=request.expected,
+                context=request.context
+            )
+
+        if match_cache is None:
+            result = await compute()
+            path = result["path"]
+        else:
+            result, lookup = await match_cache.get_or_compute(
+                request.expected,
+                request.context,
+                spoken_norm,
+                compute,
+                # Nur echte LLM-Urteile cachen, nach Upstream-Fehlern neu fragen
+                cacheable=lambda r: r["path"] == "llm"
+            )
+            MATCH_CACHE_LOOKUPS.labels(result=lookup).inc()
+            path = result["path"] if lookup == "miss" else "cache"
 
+    REQUEST_LATENCY.labels(path=path).observe(time.perf_counter() - started)
     return MatchResponse(
         match_score=result["match_score"],
         is_correct=result["is_correct"],
@@ -0,0 +1,251 @@
+"""
+Answer Match Cache
+
+In-process cache of /api/match verdicts: a class answering the same
+Dialogcard produces the same few transcripts over and over.
+- Exact tier: keyed by (expected, context, normalized spoken), LRU with TTL
+- Near-duplicate tier (opt-in, off by default): reuses the verdict of a
+  cached transcript for the same card whose bigram Dice score is >= the
+  threshold; never across differing negations ("ein" / "kein") or numbers
+  ("1789" / "1798"), which flip the verdict while barely changing the
+  bigrams. Single-word swaps are not detected, so only enable it for cards
+  with long free-text answers
+- Single flight: identical requests arriving while the first one is still
+  waiting for the LLM share its result instead of sending their own call
+- One cache per worker process
+
+Configuration: MATCH_CACHE_MAX_ENTRIES, MATCH_CACHE_TTL (seconds),
+MATCH_CACHE_NEAR_THRESHOLD (0 = exact tier only), MATCH_CACHE_DISABLE.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("MATCH_CACHE_MAX_ENTRIES") or 5000)
+DEFAULT_TTL = float(os.getenv("MATCH_CACHE_TTL") or 3600)
+DEFAULT_NEAR_THRESHOLD = float(os.getenv("MATCH_CACHE_NEAR_THRESHOLD") or 0)
+
+# Candidates compared per card in the near-duplicate tier
+MAX_VARIANTS_PER_CARD = 64
+# Shorter transcripts only use the exact tier (one letter changes a lot)
+MIN_NEAR_CHARS = 12
+
+NEGATIONS = frozenset({
+    "nicht", "kein", "keine", "keinen", "keinem", "keiner", "keines",
+    "nie", "niemals", "nichts", "ohne", "no", "not", "never", "none"
+})
+
+CardKey = Tuple[str, str]
+
+
+def bigrams(text: str) -> FrozenSet[str]:
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def dice_coefficient(s1: str, s2: str) -> float:
+    """Bigram Dice similarity of two strings (0.0 - 1.0)."""
+    if s1 == s2:
+        return 1.0
+    if len(s1) < 2 or len(s2) < 2:
+        return 0.0
+    return dice_score(bigrams(s1), bigrams(s2))
+
+
+def dice_score(bigrams1: FrozenSet[str], bigrams2: FrozenSet[str]) -> float:
+    """Dice similarity of two precomputed bigram sets."""
+    if not bigrams1 or not bigrams2:
+        return 0.0
+    return 2 * len(bigrams1 & bigrams2) / (len(bigrams1) + len(bigrams2))
+
+
+def guard_tokens(text: str) -> FrozenSet[str]:
+    """Negations and numbers; near duplicates must agree on them exactly."""
+    return frozenset(
+        word for word in text.split()
+        if word in NEGATIONS or any(char.isdigit() for char in word)
+    )
+
+
+@dataclass
+class _Entry:
+    result: Dict[str, Any]
+    expires_at: float
+    bigrams: FrozenSet[str]
+    guard_tokens: FrozenSet[str]
+
+
+class MatchCache:
+    """
+    LRU + TTL cache of match verdicts with an optional near-duplicate tier.
+
+    Args:
+        max_entries: Entries kept across all cards
+        ttl: Seconds a verdict stays valid
+        near_threshold: Minimum Dice score for the near-duplicate tier
+            (0 = off)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        near_threshold: float = DEFAULT_NEAR_THRESHOLD
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.near_threshold = near_threshold
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._cards: Dict[CardKey, "OrderedDict[str, None]"] = {}
+        self._pending: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["MatchCache"]:
+        if os.getenv("MATCH_CACHE_DISABLE", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key: Tuple[str, str, str]) -> None:
+        self._entries.pop(key, None)
+        variants = self._cards.get(key[:2])
+        if variants is not None:
+            variants.pop(key[2], None)
+            if not variants:
+                del self._cards[key[:2]]
+
+    def get(self, expected: str, context: Optional[str], spoken: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        Look up a verdict for a normalized transcript.
+
+        Returns:
+            (result, "hit" | "near") or (None, "miss")
+        """
+        card = (expected, context or "")
+        key = card + (spoken,)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._cards[card].move_to_end(spoken)
+                    self.hits += 1
+                    return entry.result, "hit"
+                self._remove(key)
+
+            if self.near_threshold > 0 and len(spoken) >= MIN_NEAR_CHARS:
+                spoken_bigrams = bigrams(spoken)
+                spoken_guard = guard_tokens(spoken)
+                best_key, best_score = None, self.near_threshold
+                for variant in list(self._cards.get(card, ())):
+                    candidate_key = card + (variant,)
+                    candidate = self._entries[candidate_key]
+                    if candidate.expires_at <= now:
+                        self._remove(candidate_key)
+                        continue
+                    if candidate.guard_tokens != spoken_guard:
+                        continue
+                    score = dice_score(spoken_bigrams, candidate.bigrams)
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self._cards[card].move_to_end(best_key[2])
+                    self.near_hits += 1
+                    return self._entries[best_key].result, "near"
+
+            self.misses += 1
+            return None, "miss"
+
+    def set(self, expected: str, context: Optional[str], spoken: str, result: Dict[str, Any]) -> None:
+        """Store the verdict for a normalized transcript."""
+        card = (expected, context or "")
+        key = card + (spoken,)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(
+                result=result,
+                expires_at=time.monotonic() + self.ttl,
+                bigrams=bigrams(spoken),
+                guard_tokens=guard_tokens(spoken)
+            )
+            variants = self._cards.setdefault(card, OrderedDict())
+            variants[spoken] = None
+            while len(variants) > MAX_VARIANTS_PER_CARD:
+                self._remove(card + (next(iter(variants)),))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    async def get_or_compute(
+        self,
+        expected: str,
+        context: Optional[str],
+        spoken: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool] = lambda result: True
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Cached verdict, or compute() it once for all concurrent identical requests.
+
+        Returns:
+            (result, "hit" | "near" | "shared" | "miss")
+        """
+        result, source = self.get(expected, context, spoken)
+        if result is not None:
+            return result, source
+
+        key = (expected, context or "", spoken)
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                result = await asyncio.shield(pending)
+                with self._lock:
+                    self.shared += 1
+                return result, "shared"
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The first request was cancelled: compute independently
+            return await compute(), "miss"
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await compute()
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._pending.pop(key, None)
+        future.set_result(result)
+        if cacheable(result):
+            self.set(expected, context, spoken, result)
+        return result, "miss"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._cards.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entries and lookup counts; "shared" misses were served by single flight."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "shared": self.shared,
+                "misses": self.misses,
+            }
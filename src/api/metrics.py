@@ -0,0 +1,226 @@
+"""
+Prometheus Metrics
+
+Minimal counters, gauges and histograms rendered in the Prometheus text
+exposition format (version 0.0.4), without the prometheus_client dependency.
+- Same call style as prometheus_client: metric.labels(path="llm").observe(0.2)
+- Values may also be read at scrape time (set_function), e.g. for counters
+  kept by another component such as the LLM response cache
+- One registry per process: with several uvicorn workers every worker
+  reports its own values, so scrape each worker (one port per worker) or
+  run a single worker per container
+
+Usage:
+    REQUESTS = Counter("app_requests_total", "Requests.", ["path"], registry=registry)
+    REQUESTS.labels(path="llm").inc()
+    text = registry.render()
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans the exact-match short-circuit (sub-ms) up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    """Holds metrics and renders them for a /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional[Registry] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self) -> "_Metric":
+        return type(self)(self.name, self.documentation)
+
+    def labels(self, **labels) -> "_Metric":
+        """The child metric for these label values (created on first use)."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` at scrape time (unlabelled metrics only)."""
+        self._function = function
+
+    def _series(self) -> List[Tuple[Tuple[Tuple[str, str], ...], "_Metric"]]:
+        if not self.labelnames:
+            return [((), self)]
+        with self._lock:
+            children = sorted(self._children.items())
+        return [(tuple(zip(self.labelnames, key)), child) for key, child in children]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        with self._lock:
+            return self._value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_label_text(labels)} {_format_value(child.get())}" for labels, child in self._series()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. requests in flight)."""
+    kind = "gauge"
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        """Increase the gauge while the block runs."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus sum and count."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional[Registry] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b))) + (math.inf,)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the seconds the block takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """(cumulative bucket counts, sum)."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, child in self._series():
+            cumulative, total = child.snapshot()
+            for bound, count in zip(child.buckets, cumulative):
+                bucket_labels = labels + (("le", _format_value(bound) if math.isinf(bound) else repr(bound)),)
+                lines.append(f"{self.name}_bucket{_label_text(bucket_labels)} {count}")
+            lines.append(f"{self.name}_sum{_label_text(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {cumulative[-1]}")
+        return lines
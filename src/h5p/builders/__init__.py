@@ -4,7 +4,7 @@ H5P Content Builders
 Modular builders for each H5P content type.
 Each builder creates a valid H5P package from structured data.
 """
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, Optional, Union
 
 from .base import create_h5p_package, COMMON_DEPENDENCIES, get_base_h5p_json
 from .multichoice import build_multichoice_h5p
@@ -17,6 +17,7 @@ from .accordion import build_accordion_h5p
 from .interactivevideo import build_interactivevideo_h5p
 from .imagehotspots import build_imagehotspots_h5p
 from .column import build_column_h5p, prepare_activity_for_column
+from .cache import H5PBuildCache, compute_build_key, get_build_cache
 
 
 # Builder registry - maps content type names to builder functions
@@ -48,6 +49,7 @@ def get_builder(content_type: str) -> Callable[[Dict[str, Any], str], str]:
 
     Returns:
         Builder function that takes (data, output_path) and returns path
+        (or the package bytes if output_path is None)
 
     Raises:
         ValueError: If content type is not supported
@@ -59,20 +61,31 @@ def get_builder(content_type: str) -> Callable[[Dict[str, Any], str], str]:
     return BUILDERS[ct_lower]
 
 
-def build_h5p(content_type: str, data: Dict[str, Any], output_path: str) -> str:
+def build_h5p(
+    content_type: str,
+    data: Dict[str, Any],
+    output_path: Optional[str] = None,
+    use_cache: bool = True
+) -> Union[str, bytes]:
     """
     Build an H5P package for any supported content type.
 
+    Unchanged build data is served from the build cache (see builders.cache).
+
     Args:
         content_type: Name of the content type
         data: Content data dict (type-specific fields)
-        output_path: Path for the .h5p file
+        output_path: Path for the .h5p file; None builds in memory
+        use_cache: Look up / store the package in the build cache
 
     Returns:
-        Path to created H5P package
+        Path to created H5P package, or the package bytes
     """
     builder = get_builder(content_type)
-    return builder(data, output_path)
+    cache = get_build_cache() if use_cache else None
+    if cache is None:
+        return builder(data, output_path)
+    return cache.build(content_type.lower(), data, output_path, builder)
 
 
 __all__ = [
@@ -93,6 +106,10 @@ __all__ = [
     # Container builders
     "build_column_h5p",
     "prepare_activity_for_column",
+    # Build cache
+    "H5PBuildCache",
+    "compute_build_key",
+    "get_build_cache",
     # Utilities
     "create_h5p_package",
     "COMMON_DEPENDENCIES",
@@ -3,44 +3,30 @@ Base H5P Builder Utilities
 
 Shared helper functions for all H5P content type builders.
 """
-import json
-import tempfile
-import zipfile
-from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 
+from ..package_writer import write_h5p_package
 
-def create_h5p_package(content_json: Dict[str, Any], h5p_json: Dict[str, Any], output_path: str) -> str:
+
+def create_h5p_package(
+    content_json: Dict[str, Any],
+    h5p_json: Dict[str, Any],
+    output_path: Optional[str] = None
+) -> Union[str, bytes]:
     """
     Create H5P ZIP package from content and manifest.
 
+    The archive is assembled in memory, without a temporary directory.
+
     Args:
         content_json: The content.json data for the H5P package
         h5p_json: The h5p.json manifest data
-        output_path: Path where the .h5p file should be saved
+        output_path: Path where the .h5p file should be saved; None returns bytes
 
     Returns:
-        Path to the created H5P package
+        Path to the created H5P package, or the package bytes
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmppath = Path(tmpdir)
-        content_dir = tmppath / "content"
-        content_dir.mkdir()
-
-        # Write content.json
-        with open(content_dir / "content.json", "w", encoding="utf-8") as f:
-            json.dump(content_json, f, ensure_ascii=False, indent=2)
-
-        # Write h5p.json manifest
-        with open(tmppath / "h5p.json", "w", encoding="utf-8") as f:
-            json.dump(h5p_json, f, ensure_ascii=False, indent=2)
-
-        # Create ZIP package
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.write(tmppath / "h5p.json", "h5p.json")
-            zf.write(content_dir / "content.json", "content/content.json")
-
-    return output_path
+    return write_h5p_package(content_json, h5p_json, output_path)
 
 
 # Common H5P dependencies used by multiple content types
@@ -0,0 +1,171 @@
+"""
+H5P Build Cache
+
+Content-addressed cache for built .h5p packages.
+- Key: SHA256 over content type, canonical build data and a fingerprint of
+  the builder code (which pins all library versions)
+- On a hit the stored package is copied to the output path (or returned as bytes)
+- Hit/miss counters for reporting
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+
+DEFAULT_CACHE_DIR = Path(
+    os.getenv("H5P_BUILD_CACHE_DIR")
+    or Path(os.getenv("LLM_CACHE_DIR") or Path.home() / ".cache" / "h5p_pipeline") / "builds"
+)
+
+_BUILDER_SOURCES = Path(__file__).parent
+
+
+@lru_cache(maxsize=1)
+def builder_fingerprint() -> str:
+    """
+    Hash of the builder sources and the package writer.
+
+    Library versions are hardcoded in the builders, so any version bump (or
+    other builder change) invalidates all cached packages.
+    """
+    digest = hashlib.sha256()
+    sources = sorted(_BUILDER_SOURCES.glob("*.py")) + [_BUILDER_SOURCES.parent / "package_writer.py"]
+    for source in sources:
+        digest.update(source.name.encode("utf-8"))
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def compute_build_key(content_type: str, data: Dict[str, Any]) -> str:
+    """
+    Hash a build request into a stable cache key.
+
+    Args:
+        content_type: Builder name (lowercase registry key)
+        data: Build data passed to the builder
+
+    Returns:
+        Hex SHA256 of content type, canonical data and builder fingerprint
+    """
+    canonical = json.dumps(
+        {"content_type": content_type, "data": data, "builders": builder_fingerprint()},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class H5PBuildCache:
+    """On-disk store of built packages, one <key>.h5p file per entry."""
+
+    def __init__(self, path: Path | str = DEFAULT_CACHE_DIR):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.bypass = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["H5PBuildCache"]:
+        """
+        Create the default cache, or None if disabled via H5P_BUILD_CACHE_DISABLE=1.
+        """
+        if os.getenv("H5P_BUILD_CACHE_DISABLE", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(DEFAULT_CACHE_DIR)
+
+    def _entry(self, key: str) -> Path:
+        return self.path / f"{key}.h5p"
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _store(self, key: str, package: Union[str, bytes]) -> None:
+        # Write to a temp file first, so concurrent readers never see partial packages
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(package, bytes):
+                    f.write(package)
+                else:
+                    with open(package, "rb") as src:
+                        shutil.copyfileobj(src, f)
+            os.replace(tmp, self._entry(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def build(
+        self,
+        content_type: str,
+        data: Dict[str, Any],
+        output_path: Optional[str],
+        builder: Callable[[Dict[str, Any], Optional[str]], Union[str, bytes]]
+    ) -> Union[str, bytes]:
+        """
+        Return a cached package for (content_type, data) or build and store it.
+
+        Args:
+            content_type: Builder name
+            data: Build data
+            output_path: Path for the .h5p file; None returns bytes
+            builder: Builder function to call on a miss
+
+        Returns:
+            output_path, or the package bytes if output_path is None
+        """
+        key = compute_build_key(content_type, data)
+        entry = self._entry(key)
+
+        if not self.bypass and entry.exists():
+            self._count(hit=True)
+            if output_path is None:
+                return entry.read_bytes()
+            shutil.copyfile(entry, output_path)
+            return output_path
+
+        self._count(hit=False)
+        result = builder(data, output_path)
+        self._store(key, result)
+        return result
+
+    def clear(self) -> None:
+        """Remove all cached packages."""
+        for entry in self.path.glob("*.h5p"):
+            entry.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and number of stored packages."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": sum(1 for _ in self.path.glob("*.h5p")),
+        }
+
+
+_cache: Optional[H5PBuildCache] = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def get_build_cache() -> Optional[H5PBuildCache]:
+    """Return the process-wide build cache (None if disabled)."""
+    global _cache, _cache_loaded
+    with _cache_lock:
+        if not _cache_loaded:
+            _cache = H5PBuildCache.from_env()
+            _cache_loaded = True
+        return _cache
@@ -5,8 +5,8 @@ Kombiniert mehrere H5P Content-Types in einem vertikalen Layout.
 Ein Column = Ein Moodle-Menüpunkt mit mehreren Aktivitäten.
 """
 from typing import Dict, Any, List
-import uuid
 
+from ..package_writer import derive_subcontent_id
 from .base import create_h5p_package, COMMON_DEPENDENCIES
 from .accordion import build_accordion_params
 from .blanks import build_blanks_params
@@ -196,7 +196,7 @@ def build_column_h5p(data: Dict[str, Any], output_path: str) -> str:
             "content": {
                 "library": library,
                 "params": content,
-                "subContentId": str(uuid.uuid4()),
+                "subContentId": derive_subcontent_id(data.get("title"), i, library, content),
                 "metadata": {
                     "contentType": library.split()[0],
                     "license": "U",
@@ -3,9 +3,9 @@ H5P Summary Builder
 
 Summary with statement selection for reflection.
 """
-import uuid
 from typing import Dict, Any
 
+from ..package_writer import derive_subcontent_id
 from .base import create_h5p_package, COMMON_DEPENDENCIES
 
 
@@ -14,7 +14,7 @@ def build_summary_params(data: Dict[str, Any]) -> Dict[str, Any]:
     statements = data.get("statements", [])
     summary_items = []
 
-    for stmt in statements:
+    for i, stmt in enumerate(statements):
         correct = stmt.get("correct", "Korrekte Aussage")
         wrong_list = stmt.get("wrong", ["Falsche Alternative"])
 
@@ -24,7 +24,7 @@ def build_summary_params(data: Dict[str, Any]) -> Dict[str, Any]:
         summary_items.append({
             "summary": options,
             "tip": stmt.get("tip", ""),
-            "subContentId": str(uuid.uuid4())
+            "subContentId": derive_subcontent_id("summary", i, options)
         })
 
     return {
@@ -54,7 +54,7 @@ def build_summary_h5p(data: Dict[str, Any], output_path: str) -> str:
     WICHTIG: H5P.Summary erwartet:
     - summaries[].summary: Liste von HTML-Strings (erster ist korrekt!)
     - summaries[].tip: Optionaler Tipp-String
-    - summaries[].subContentId: UUID für jeden Summary-Block
+    - summaries[].subContentId: UUID für jeden Summary-Block (stabil abgeleitet)
 
     Args:
         data: Dict with keys:
@@ -7,10 +7,8 @@ import argparse
 import json
 import os
 import sys
-import subprocess
 from pathlib import Path
 from typing import List, Dict, Any
-import httpx
 
 # Fix module path
 script_dir = Path(__file__).parent
@@ -20,6 +18,9 @@ from generator import generate_multichoice_h5p, generate_course_presentation_h5p
 from content_types import Answer, MultiChoiceContent, SlideElement, Slide, CoursePresentationContent
 from package_builder import build_h5p_from_json
 from course_schema import LLM_SYSTEM_PROMPT, LLM_USER_PROMPT_TEMPLATE
+from llm import get_llm_client
+from moodle_import import import_h5p_to_moodle
+from transcript_store import fetch_youtube_row
 
 
 # Supabase Configuration (self-hosted on VPS)
@@ -126,22 +127,8 @@ VIDEO-TRANSKRIPT:
 
 
 def fetch_youtube_data(youtube_url_id: int) -> Dict[str, Any]:
-    """Fetch YouTube data from Supabase by ID"""
-    url = f"{SUPABASE_URL}/rest/v1/youtube_urls?id=eq.{youtube_url_id}&select=id,title,subtitles"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}"
-    }
-
-    with httpx.Client() as client:
-        resp = client.get(url, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
-
-    if not data:
-        raise ValueError(f"YouTube URL with ID {youtube_url_id} not found")
-
-    return data[0]
+    """Fetch YouTube data from Supabase by ID (revalidated local copy if available)"""
+    return fetch_youtube_row(youtube_url_id, SUPABASE_URL, SUPABASE_KEY)
 
 
 def call_openai(transcript: str, max_tokens: int = 2000) -> Dict[str, Any]:
@@ -155,28 +142,14 @@ def call_openai(transcript: str, max_tokens: int = 2000) -> Dict[str, Any]:
 
     prompt = E_LEARNING_PROMPT + transcript
 
-    response = httpx.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": OPENAI_MODEL,
-            "messages": [
-                {"role": "system", "content": "Du antwortest ausschliesslich mit validem JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": max_tokens,
-            "temperature": 0.7,
-            "response_format": {"type": "json_object"}
-        },
-        timeout=60.0
+    return get_llm_client().chat_json_sync(
+        prompt,
+        system="Du antwortest ausschliesslich mit validem JSON.",
+        max_tokens=max_tokens,
+        temperature=0.7,
+        timeout=60.0,
+        model=OPENAI_MODEL
     )
-    response.raise_for_status()
-
-    content = response.json()["choices"][0]["message"]["content"]
-    return json.loads(content)
 
 
 def call_openai_rich(transcript: str, title: str = "Lernmodul", video_url: str = "") -> Dict[str, Any]:
@@ -194,28 +167,14 @@ def call_openai_rich(transcript: str, title: str = "Lernmodul", video_url: str =
         transcript=transcript
     )
 
-    response = httpx.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": OPENAI_MODEL,
-            "messages": [
-                {"role": "system", "content": LLM_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            "max_tokens": 4000,  # More tokens for rich content
-            "temperature": 0.7,
-            "response_format": {"type": "json_object"}
-        },
-        timeout=90.0  # Longer timeout for complex generation
+    return get_llm_client().chat_json_sync(
+        user_prompt,
+        system=LLM_SYSTEM_PROMPT,
+        max_tokens=4000,  # More tokens for rich content
+        temperature=0.7,
+        timeout=90.0,  # Longer timeout for complex generation
+        model=OPENAI_MODEL
     )
-    response.raise_for_status()
-
-    content = response.json()["choices"][0]["message"]["content"]
-    return json.loads(content)
 
 
 def generate_simple_quiz(transcript: str, title: str = "Quiz") -> Dict[str, Any]:
@@ -348,29 +307,14 @@ def build_multichoice_only(content: Dict[str, Any], output_path: str) -> str:
 
 
 def import_to_moodle(h5p_path: str, courseid: int, title: str, create_course: bool = False, course_name: str = None) -> dict:
-    """Import H5P to Moodle via PHP script"""
-    # Copy H5P to container
-    subprocess.run(["docker", "cp", h5p_path, "moodle-app:/tmp/generated.h5p"], check=True, capture_output=True)
-
-    # Build import command
-    cmd = ["docker", "exec", "moodle-app", "php", "/opt/bitnami/moodle/local/import_h5p.php",
-           f"--file=/tmp/generated.h5p", f"--title={title}"]
-
-    if create_course:
-        cmd.append("--createcourse")
-        if course_name:
-            cmd.append(f"--coursename={course_name}")
-    else:
-        cmd.append(f"--courseid={courseid}")
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    # Parse JSON output
-    for line in result.stdout.split("\n"):
-        if line.startswith("{"):
-            return json.loads(line)
-
-    return {"status": "error", "message": result.stderr or result.stdout}
+    """Import H5P to Moodle via the shared import worker"""
+    return import_h5p_to_moodle(
+        h5p_path,
+        courseid,
+        title,
+        create_course=create_course,
+        course_name=course_name
+    )
 
 
 def main():
@@ -7,10 +7,8 @@ import argparse
 import json
 import os
 import sys
-import subprocess
 from pathlib import Path
 from typing import List, Dict, Any
-import httpx
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -26,6 +24,8 @@ script_dir = Path(__file__).parent
 sys.path.insert(0, str(script_dir))
 
 from multi_quiz_generator import call_openai_multi_quiz, build_single_multichoice_h5p
+from moodle_import import import_h5p_to_moodle
+from transcript_store import fetch_youtube_row
 
 # Supabase Configuration (self-hosted on VPS)
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "http://148.230.71.150:8000")
@@ -37,46 +37,19 @@ OPENAI_MODEL = "gpt-4o-mini"
 
 
 def fetch_youtube_data(youtube_url_id: int) -> Dict[str, Any]:
-    """Fetch YouTube data from Supabase by ID"""
-    url = f"{SUPABASE_URL}/rest/v1/youtube_urls?id=eq.{youtube_url_id}&select=id,title,subtitles,url"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}"
-    }
-
-    with httpx.Client() as client:
-        resp = client.get(url, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
-
-    if not data:
-        raise ValueError(f"YouTube URL with ID {youtube_url_id} not found")
-
-    return data[0]
+    """Fetch YouTube data from Supabase by ID (revalidated local copy if available)"""
+    return fetch_youtube_row(youtube_url_id, SUPABASE_URL, SUPABASE_KEY)
 
 
 def import_to_moodle(h5p_path: str, courseid: int, title: str, create_course: bool = False, course_name: str = None) -> dict:
-    """Import H5P to Moodle via PHP script"""
-    # Copy H5P to container
-    subprocess.run(["docker", "cp", h5p_path, "moodle-app:/tmp/generated.h5p"], check=True, capture_output=True)
-
-    # Build import command - NOTE: option is --course not --courseid!
-    cmd = ["docker", "exec", "moodle-app", "php", "/opt/bitnami/moodle/local/import_h5p.php",
-           f"--file=/tmp/generated.h5p", f"--title={title}"]
-
-    if create_course:
-        cmd.append(f"--coursename={course_name or title}")
-    else:
-        cmd.append(f"--course={courseid}")
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    # Parse JSON output
-    for line in result.stdout.split("\n"):
-        if line.startswith("{"):
-            return json.loads(line)
-
-    return {"status": "error", "message": result.stderr or result.stdout}
+    """Import H5P to Moodle via the shared import worker"""
+    return import_h5p_to_moodle(
+        h5p_path,
+        courseid,
+        title,
+        create_course=create_course,
+        course_name=course_name
+    )
 
 
 def main():
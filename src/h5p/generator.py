@@ -1,13 +1,10 @@
 """H5P Package Generator"""
-import json
 import os
-import shutil
-import tempfile
-import zipfile
 from pathlib import Path
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Optional
 
 from .content_types import MultiChoiceContent, CoursePresentationContent
+from .package_writer import H5PPackageWriter
 
 
 class H5PGenerator:
@@ -25,48 +22,45 @@ class H5PGenerator:
     def generate(
         self,
         content: Union[MultiChoiceContent, CoursePresentationContent],
-        output_path: str
-    ) -> str:
-        """Generate H5P package from content model"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmppath = Path(tmpdir)
-
-            # Create content directory
-            content_dir = tmppath / "content"
-            content_dir.mkdir()
-
-            # Write content.json
-            content_json = content.to_content_json()
-            with open(content_dir / "content.json", "w", encoding="utf-8") as f:
-                json.dump(content_json, f, ensure_ascii=False, indent=2)
-
-            # Write h5p.json
-            h5p_json = content.to_h5p_json()
-            with open(tmppath / "h5p.json", "w", encoding="utf-8") as f:
-                json.dump(h5p_json, f, ensure_ascii=False, indent=2)
-
-            # Copy required libraries
-            self._copy_libraries(tmppath, h5p_json)
-
-            # Create ZIP
-            self._create_zip(tmppath, output_path)
-
-        return output_path
-
-    def _copy_libraries(self, dest: Path, h5p_json: Dict[str, Any]):
-        """Copy required H5P libraries to package directory"""
-        for dep in h5p_json.get("preloadedDependencies", []):
-            machine_name = dep["machineName"]
+        output_path: Optional[str] = None
+    ) -> Union[str, bytes]:
+        """Generate H5P package from content model
+
+        The package is streamed straight into the ZIP (or into memory if
+        output_path is None, in which case the package bytes are returned).
+        """
+        h5p_json = content.to_h5p_json()
+
+        with H5PPackageWriter(output_path) as writer:
+            writer.add_json("h5p.json", h5p_json)
+            writer.add_json("content/content.json", content.to_content_json())
+
+            # Add required libraries
+            self._add_libraries(writer, h5p_json)
+
+        return writer.close()
+
+    def _add_libraries(self, writer: H5PPackageWriter, h5p_json: Dict[str, Any]):
+        """Stream required H5P libraries from the library path into the package"""
+        machine_names = dict.fromkeys(
+            dep["machineName"] for dep in h5p_json.get("preloadedDependencies", [])
+        )
+        for machine_name in machine_names:
             lib_src = self.library_path / machine_name
+            if not lib_src.exists():
+                continue
 
-            if lib_src.exists():
-                lib_dest = dest / machine_name
-                shutil.copytree(lib_src, lib_dest, dirs_exist_ok=True)
+            for root, dirs, files in os.walk(lib_src):
+                # Skip .git and .github directories
+                # Sorted walk keeps the entry order stable
+                dirs[:] = sorted(d for d in dirs if d not in ('.git', '.github'))
 
-                # Remove .git if exists
-                git_dir = lib_dest / ".git"
-                if git_dir.exists():
-                    shutil.rmtree(git_dir)
+                for file in sorted(files):
+                    if not self._is_allowed_file(file):
+                        continue
+                    file_path = Path(root) / file
+                    arcname = Path(machine_name) / file_path.relative_to(lib_src)
+                    writer.add_file(arcname.as_posix(), file_path)
 
     # Allowed file extensions in H5P packages (Moodle whitelist)
     # Note: md/textile are technically allowed but we skip README files anyway
@@ -86,28 +80,17 @@ class H5PGenerator:
         '.gitignore', '.eslintrc.json', '.babelrc', '.h5pignore'
     }
 
-    def _create_zip(self, source_dir: Path, output_path: str):
-        """Create H5P ZIP archive"""
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(source_dir):
-                # Skip .git and .github directories
-                dirs[:] = [d for d in dirs if d not in ('.git', '.github')]
-
-                for file in files:
-                    # Skip hidden files
-                    if file.startswith('.'):
-                        continue
-                    # Skip specifically excluded files
-                    if file in self.EXCLUDED_FILES:
-                        continue
-                    # Filter out files with disallowed extensions
-                    ext = file.rsplit('.', 1)[-1].lower() if '.' in file else ''
-                    if ext and ext not in self.ALLOWED_EXTENSIONS:
-                        continue
-
-                    file_path = Path(root) / file
-                    arcname = file_path.relative_to(source_dir)
-                    zf.write(file_path, arcname)
+    def _is_allowed_file(self, file: str) -> bool:
+        """Check a library file against the H5P/Moodle whitelist"""
+        # Skip hidden files
+        if file.startswith('.'):
+            return False
+        # Skip specifically excluded files
+        if file in self.EXCLUDED_FILES:
+            return False
+        # Filter out files with disallowed extensions
+        ext = file.rsplit('.', 1)[-1].lower() if '.' in file else ''
+        return not ext or ext in self.ALLOWED_EXTENSIONS
 
 
 def generate_multichoice_h5p(
@@ -3,6 +3,23 @@
  * CLI Script to import H5P content into Moodle
  *
  * FIXED: Now properly deploys H5P content via core_h5p framework
+ *
+ * Modes:
+ *   --file=...           Import a single package (one JSON result line)
+ *   --manifest=list.json Import every entry of a JSON array (one JSON line per entry)
+ *   --stdin              Long-lived worker: read one JSON request per line from
+ *                        stdin, answer with one JSON line each. Requests may carry
+ *                        the package inline as base64 ("data" + "filename",
+ *                        optional "sha256" for integrity/staging name).
+ *
+ * Manifest/stdin requests accept the same keys as the CLI options
+ * (file, courseid, title, section, createcourse, coursename, courseimage,
+ * cmid, deletecmid).
+ *
+ * Incremental updates:
+ *   --cmid=N        Replace the package of an existing H5P activity in place
+ *                   (keeps the activity, its position and its cmid)
+ *   --deletecmid=N  Delete an H5P activity
  */
 
 define('CLI_SCRIPT', true);
@@ -30,6 +47,10 @@ list($options, $unrecognized) = cli_get_params([
     'createcourse' => false,
     'coursename' => '',
     'courseimage' => '',  // URL to course image (YouTube thumbnail or generated)
+    'cmid' => 0,          // Existing h5pactivity to update in place
+    'deletecmid' => 0,    // Existing h5pactivity to delete
+    'manifest' => '',
+    'stdin' => false,
     'help' => false
 ], [
     'f' => 'file',
@@ -45,283 +66,468 @@ if ($options['help']) {
     exit(0);
 }
 
-// Allow "create course only" mode without H5P file
-$createCourseOnly = $options['createcourse'] && (empty($options['file']) || $options['file'] === '/dev/null');
+/**
+ * Import one H5P package (or only create a course).
+ *
+ * @param array $options Same keys as the CLI options
+ * @return array Result that is printed as one JSON line
+ */
+function import_h5p_package(array $options): array {
+    global $DB, $CFG;
 
-if (!$createCourseOnly && (empty($options['file']) || !file_exists($options['file']))) {
-    echo json_encode(['status' => 'error', 'message' => 'H5P file not found: ' . $options['file']]) . "\n";
-    exit(1);
-}
+    // Allow "create course only" mode without H5P file
+    $createCourseOnly = $options['createcourse'] && (empty($options['file']) || $options['file'] === '/dev/null');
 
-$courseid = (int)$options['courseid'];
+    if (!$createCourseOnly && (empty($options['file']) || !file_exists($options['file']))) {
+        return ['status' => 'error', 'message' => 'H5P file not found: ' . $options['file']];
+    }
+
+    $courseid = (int)$options['courseid'];
 
-// Create course if requested
-if ($options['createcourse']) {
-    $category = $DB->get_record('course_categories', ['id' => 1]);
-    if (!$category) {
-        $category = core_course_category::create(['name' => 'Imported Courses']);
+    // Update mode: the existing activity determines the course
+    $updatecmid = (int)($options['cmid'] ?? 0);
+    if ($updatecmid > 0) {
+        $existingcm = get_coursemodule_from_id('h5pactivity', $updatecmid);
+        if (!$existingcm) {
+            return ['status' => 'error', 'message' => 'Activity not found: cmid ' . $updatecmid, 'missing' => true];
+        }
+        $courseid = (int)$existingcm->course;
     }
 
-    $coursename = $options['coursename'] ?: 'Course - ' . date('Y-m-d H:i:s');
-    $newcourse = new stdClass();
-    $newcourse->category = $category->id ?? 1;
-    $newcourse->fullname = $coursename;
-    $newcourse->shortname = 'C' . time();
-    $newcourse->summary = 'Auto-generated course';
-    $newcourse->format = 'topics';
-    $newcourse->numsections = 0;  // Only General section - no empty topics
-    $newcourse->visible = 1;
-
-    $course = create_course($newcourse);
-    $courseid = $course->id;
-
-    // Set course image if provided
-    if (!empty($options['courseimage'])) {
-        $imageurl = $options['courseimage'];
-        $context = context_course::instance($courseid);
-
-        // Download image
-        $imagedata = @file_get_contents($imageurl);
-        if ($imagedata) {
-            $fs = get_file_storage();
-
-            // Delete existing overview files
-            $fs->delete_area_files($context->id, 'course', 'overviewfiles');
-
-            // Determine file extension
-            $ext = 'jpg';
-            if (strpos($imageurl, '.png') !== false) {
-                $ext = 'png';
+    // Create course if requested
+    if ($options['createcourse'] && $updatecmid <= 0) {
+        $category = $DB->get_record('course_categories', ['id' => 1]);
+        if (!$category) {
+            $category = core_course_category::create(['name' => 'Imported Courses']);
+        }
+
+        $coursename = $options['coursename'] ?: 'Course - ' . date('Y-m-d H:i:s');
+        $newcourse = new stdClass();
+        $newcourse->category = $category->id ?? 1;
+        $newcourse->fullname = $coursename;
+        // Several workers may create courses in the same second, so time()
+        // alone collides (shortnametaken); add worker PID and a random suffix
+        do {
+            $shortname = 'C' . time() . '-' . getmypid() . '-' . bin2hex(random_bytes(3));
+        } while ($DB->record_exists('course', ['shortname' => $shortname]));
+        $newcourse->shortname = $shortname;
+        $newcourse->summary = 'Auto-generated course';
+        $newcourse->format = 'topics';
+        $newcourse->numsections = 0;  // Only General section - no empty topics
+        $newcourse->visible = 1;
+
+        $course = create_course($newcourse);
+        $courseid = $course->id;
+
+        // Set course image if provided
+        if (!empty($options['courseimage'])) {
+            $imageurl = $options['courseimage'];
+            $context = context_course::instance($courseid);
+
+            // Download image
+            $imagedata = @file_get_contents($imageurl);
+            if ($imagedata) {
+                $fs = get_file_storage();
+
+                // Delete existing overview files
+                $fs->delete_area_files($context->id, 'course', 'overviewfiles');
+
+                // Determine file extension
+                $ext = 'jpg';
+                if (strpos($imageurl, '.png') !== false) {
+                    $ext = 'png';
+                }
+
+                $filerecord = [
+                    'contextid' => $context->id,
+                    'component' => 'course',
+                    'filearea' => 'overviewfiles',
+                    'itemid' => 0,
+                    'filepath' => '/',
+                    'filename' => 'course_image.' . $ext
+                ];
+
+                $fs->create_file_from_string($filerecord, $imagedata);
             }
+        }
 
-            $filerecord = [
-                'contextid' => $context->id,
-                'component' => 'course',
-                'filearea' => 'overviewfiles',
-                'itemid' => 0,
-                'filepath' => '/',
-                'filename' => 'course_image.' . $ext
-            ];
+        // Enable self-enrolment for the course
+        $enrolplugin = enrol_get_plugin('self');
+        if ($enrolplugin) {
+            // Check if self-enrolment already exists
+            $enrolinstance = $DB->get_record('enrol', ['courseid' => $courseid, 'enrol' => 'self']);
+            if ($enrolinstance) {
+                // Enable existing instance
+                $enrolinstance->status = 0; // 0 = enabled
+                $DB->update_record('enrol', $enrolinstance);
+            } else {
+                // Add new self-enrolment instance
+                $enrolplugin->add_instance($course, [
+                    'status' => 0,  // 0 = enabled
+                    'roleid' => 5,  // Student role
+                    'enrolperiod' => 0,  // No time limit
+                ]);
+            }
+        }
+
+        // Rebuild course cache
+        rebuild_course_cache($courseid, true);
 
-            $fs->create_file_from_string($filerecord, $imagedata);
+        // If "create course only" mode, return success with courseid and exit
+        if ($createCourseOnly) {
+            return [
+                'status' => 'success',
+                'courseid' => $courseid,
+                'coursename' => $coursename,
+                'message' => 'Course created successfully'
+            ];
         }
     }
 
-    // Enable self-enrolment for the course
-    $enrolplugin = enrol_get_plugin('self');
-    if ($enrolplugin) {
-        // Check if self-enrolment already exists
-        $enrolinstance = $DB->get_record('enrol', ['courseid' => $courseid, 'enrol' => 'self']);
-        if ($enrolinstance) {
-            // Enable existing instance
-            $enrolinstance->status = 0; // 0 = enabled
-            $DB->update_record('enrol', $enrolinstance);
-        } else {
-            // Add new self-enrolment instance
-            $enrolplugin->add_instance($course, [
-                'status' => 0,  // 0 = enabled
-                'roleid' => 5,  // Student role
-                'enrolperiod' => 0,  // No time limit
-            ]);
-        }
+    if ($courseid <= 0) {
+        return ['status' => 'error', 'message' => 'No valid course ID'];
     }
 
-    // Rebuild course cache
-    rebuild_course_cache($courseid, true);
+    $course = $DB->get_record('course', ['id' => $courseid], '*', MUST_EXIST);
 
-    // If "create course only" mode, return success with courseid and exit
-    if ($createCourseOnly) {
-        echo json_encode([
-            'status' => 'success',
-            'courseid' => $courseid,
-            'coursename' => $coursename,
-            'message' => 'Course created successfully'
-        ]) . "\n";
-        exit(0);
-    }
-}
+    $h5pfilepath = $options['file'];
+    $h5pfilename = basename($h5pfilepath);
 
-if ($courseid <= 0) {
-    echo json_encode(['status' => 'error', 'message' => 'No valid course ID']) . "\n";
-    exit(1);
-}
+    $fs = get_file_storage();
 
-$course = $DB->get_record('course', ['id' => $courseid], '*', MUST_EXIST);
-
-$h5pfilepath = $options['file'];
-$h5pfilename = basename($h5pfilepath);
-
-$fs = get_file_storage();
-
-try {
-    // Step 1: Create the h5pactivity module entry first
-    $module = $DB->get_record('modules', ['name' => 'h5pactivity'], '*', MUST_EXIST);
-
-    $cm = new stdClass();
-    $cm->course = $courseid;
-    $cm->module = $module->id;
-    $cm->instance = 0;
-    $cm->section = $options['section'];
-    $cm->visible = 1;
-    $cm->added = time();
-
-    $cmid = $DB->insert_record('course_modules', $cm);
-
-    $h5pactivity = new stdClass();
-    $h5pactivity->course = $courseid;
-    $h5pactivity->name = $options['title'];
-    $h5pactivity->intro = '<p>Interaktives Lernmodul generiert aus Video-Inhalten.</p>';
-    $h5pactivity->introformat = FORMAT_HTML;
-    $h5pactivity->timecreated = time();
-    $h5pactivity->timemodified = time();
-    $h5pactivity->displayoptions = 15;
-    $h5pactivity->enabletracking = 1;
-    $h5pactivity->grademethod = 1;
-    $h5pactivity->reviewmode = 1;
-
-    $instanceid = $DB->insert_record('h5pactivity', $h5pactivity);
-
-    $DB->set_field('course_modules', 'instance', $instanceid, ['id' => $cmid]);
-
-    course_add_cm_to_section($course, $cmid, $options['section']);
-
-    // Step 2: Get module context AFTER creating the activity
-    $modcontext = context_module::instance($cmid);
-
-    // Step 3: Store H5P file with CORRECT itemid (must be 0 for package filearea per Moodle spec)
-    // But we need to use the correct context
-    $filerecord = [
-        'contextid' => $modcontext->id,
-        'component' => 'mod_h5pactivity',
-        'filearea' => 'package',
-        'itemid' => 0,  // This is correct per Moodle H5P spec
-        'filepath' => '/',
-        'filename' => $h5pfilename
-    ];
-
-    // Delete any existing file with same details
-    $existingfile = $fs->get_file(
-        $filerecord['contextid'],
-        $filerecord['component'],
-        $filerecord['filearea'],
-        $filerecord['itemid'],
-        $filerecord['filepath'],
-        $filerecord['filename']
-    );
-    if ($existingfile) {
-        $existingfile->delete();
-    }
+    try {
+        if ($updatecmid > 0) {
+            // Step 1 (update): Keep the activity, drop its old package and deployed content
+            $cmid = $updatecmid;
+            $instanceid = $existingcm->instance;
+            $DB->update_record('h5pactivity', (object)[
+                'id' => $instanceid,
+                'name' => $options['title'],
+                'timemodified' => time()
+            ]);
+
+            $oldcontext = context_module::instance($cmid);
+            $oldfiles = $fs->get_area_files($oldcontext->id, 'mod_h5pactivity', 'package', 0, 'id', false);
+            foreach ($oldfiles as $oldfile) {
+                $DB->delete_records('h5p', ['pathnamehash' => $oldfile->get_pathnamehash()]);
+                $oldfile->delete();
+            }
+        } else {
+            // Step 1: Create the h5pactivity module entry first
+            $module = $DB->get_record('modules', ['name' => 'h5pactivity'], '*', MUST_EXIST);
+
+            $cm = new stdClass();
+            $cm->course = $courseid;
+            $cm->module = $module->id;
+            $cm->instance = 0;
+            $cm->section = $options['section'];
+            $cm->visible = 1;
+            $cm->added = time();
+
+            $cmid = $DB->insert_record('course_modules', $cm);
+
+            $h5pactivity = new stdClass();
+            $h5pactivity->course = $courseid;
+            $h5pactivity->name = $options['title'];
+            $h5pactivity->intro = '<p>Interaktives Lernmodul generiert aus Video-Inhalten.</p>';
+            $h5pactivity->introformat = FORMAT_HTML;
+            $h5pactivity->timecreated = time();
+            $h5pactivity->timemodified = time();
+            $h5pactivity->displayoptions = 15;
+            $h5pactivity->enabletracking = 1;
+            $h5pactivity->grademethod = 1;
+            $h5pactivity->reviewmode = 1;
+
+            $instanceid = $DB->insert_record('h5pactivity', $h5pactivity);
+
+            $DB->set_field('course_modules', 'instance', $instanceid, ['id' => $cmid]);
+
+            course_add_cm_to_section($course, $cmid, $options['section']);
+        }
 
-    $storedfile = $fs->create_file_from_pathname($filerecord, $h5pfilepath);
+        // Step 2: Get module context AFTER creating the activity
+        $modcontext = context_module::instance($cmid);
+
+        // Step 3: Store H5P file with CORRECT itemid (must be 0 for package filearea per Moodle spec)
+        // But we need to use the correct context
+        $filerecord = [
+            'contextid' => $modcontext->id,
+            'component' => 'mod_h5pactivity',
+            'filearea' => 'package',
+            'itemid' => 0,  // This is correct per Moodle H5P spec
+            'filepath' => '/',
+            'filename' => $h5pfilename
+        ];
+
+        // Delete any existing file with same details
+        $existingfile = $fs->get_file(
+            $filerecord['contextid'],
+            $filerecord['component'],
+            $filerecord['filearea'],
+            $filerecord['itemid'],
+            $filerecord['filepath'],
+            $filerecord['filename']
+        );
+        if ($existingfile) {
+            $existingfile->delete();
+        }
 
-    // Step 4: Deploy H5P content via core_h5p framework
-    // H5P packages must be deployed/validated before they can be played
-    $factory = new factory();
+        $storedfile = $fs->create_file_from_pathname($filerecord, $h5pfilepath);
 
-    // Deploy config - allow all display options
-    $config = new stdClass();
-    $config->frame = 1;
-    $config->export = 0;
-    $config->embed = 0;
-    $config->copyright = 0;
+        // Step 4: Deploy H5P content via core_h5p framework
+        // H5P packages must be deployed/validated before they can be played
+        $factory = new factory();
 
-    // Try to deploy the H5P file - this validates and extracts the package
-    $h5pid = false;
-    $deployError = null;
+        // Deploy config - allow all display options
+        $config = new stdClass();
+        $config->frame = 1;
+        $config->export = 0;
+        $config->embed = 0;
+        $config->copyright = 0;
 
-    try {
-        // Method 1: Use helper::save_h5p (preferred)
-        $h5pid = helper::save_h5p($factory, $storedfile, $config);
-    } catch (Exception $e) {
-        $deployError = $e->getMessage();
-    }
+        // Try to deploy the H5P file - this validates and extracts the package
+        $h5pid = false;
+        $deployError = null;
 
-    // If deployment failed, try alternative method with full content extraction
-    if ($h5pid === false) {
         try {
-            // Method 2: Manual deployment - extract content from H5P package
-            $pathnamehash = $storedfile->get_pathnamehash();
-            $contenthash = $storedfile->get_contenthash();
-
-            // Check if there's already an h5p entry for this file
-            $existing = $DB->get_record('h5p', ['pathnamehash' => $pathnamehash]);
-            if ($existing) {
-                $h5pid = $existing->id;
-            } else {
-                // Extract content from H5P package
-                $mainLibraryId = 0;
-                $jsoncontent = '{}';
-                $zip = new ZipArchive();
-
-                if ($zip->open($h5pfilepath) === true) {
-                    // Get h5p.json for library info
-                    $h5pjson = $zip->getFromName('h5p.json');
-                    if ($h5pjson) {
-                        $h5pdata = json_decode($h5pjson, true);
-                        if (isset($h5pdata['mainLibrary'])) {
-                            $mainLib = $h5pdata['mainLibrary'];
-                            // Find library ID in database
-                            $lib = $DB->get_record_sql(
-                                "SELECT id FROM {h5p_libraries} WHERE machinename = ? ORDER BY majorversion DESC, minorversion DESC LIMIT 1",
-                                [$mainLib]
-                            );
-                            if ($lib) {
-                                $mainLibraryId = $lib->id;
+            // Method 1: Use helper::save_h5p (preferred)
+            $h5pid = helper::save_h5p($factory, $storedfile, $config);
+        } catch (Exception $e) {
+            $deployError = $e->getMessage();
+        }
+
+        // If deployment failed, try alternative method with full content extraction
+        if ($h5pid === false) {
+            try {
+                // Method 2: Manual deployment - extract content from H5P package
+                $pathnamehash = $storedfile->get_pathnamehash();
+                $contenthash = $storedfile->get_contenthash();
+
+                // Check if there's already an h5p entry for this file
+                $existing = $DB->get_record('h5p', ['pathnamehash' => $pathnamehash]);
+                if ($existing) {
+                    $h5pid = $existing->id;
+                } else {
+                    // Extract content from H5P package
+                    $mainLibraryId = 0;
+                    $jsoncontent = '{}';
+                    $zip = new ZipArchive();
+
+                    if ($zip->open($h5pfilepath) === true) {
+                        // Get h5p.json for library info
+                        $h5pjson = $zip->getFromName('h5p.json');
+                        if ($h5pjson) {
+                            $h5pdata = json_decode($h5pjson, true);
+                            if (isset($h5pdata['mainLibrary'])) {
+                                $mainLib = $h5pdata['mainLibrary'];
+                                // Find library ID in database
+                                $lib = $DB->get_record_sql(
+                                    "SELECT id FROM {h5p_libraries} WHERE machinename = ? ORDER BY majorversion DESC, minorversion DESC LIMIT 1",
+                                    [$mainLib]
+                                );
+                                if ($lib) {
+                                    $mainLibraryId = $lib->id;
+                                }
                             }
                         }
-                    }
 
-                    // Get content/content.json - this is the actual H5P content!
-                    $contentjson = $zip->getFromName('content/content.json');
-                    if ($contentjson) {
-                        // Validate it's proper JSON
-                        $contentdata = json_decode($contentjson, true);
-                        if ($contentdata !== null) {
-                            $jsoncontent = $contentjson;
+                        // Get content/content.json - this is the actual H5P content!
+                        $contentjson = $zip->getFromName('content/content.json');
+                        if ($contentjson) {
+                            // Validate it's proper JSON
+                            $contentdata = json_decode($contentjson, true);
+                            if ($contentdata !== null) {
+                                $jsoncontent = $contentjson;
+                            }
                         }
+
+                        $zip->close();
                     }
 
-                    $zip->close();
+                    // Create H5P content entry with extracted content
+                    $h5pcontent = new stdClass();
+                    $h5pcontent->jsoncontent = $jsoncontent;
+                    $h5pcontent->mainlibraryid = $mainLibraryId;
+                    $h5pcontent->displayoptions = 15;
+                    $h5pcontent->pathnamehash = $pathnamehash;
+                    $h5pcontent->contenthash = $contenthash;
+                    $h5pcontent->filtered = null;
+                    $h5pcontent->timecreated = time();
+                    $h5pcontent->timemodified = time();
+
+                    $h5pid = $DB->insert_record('h5p', $h5pcontent);
                 }
-
-                // Create H5P content entry with extracted content
-                $h5pcontent = new stdClass();
-                $h5pcontent->jsoncontent = $jsoncontent;
-                $h5pcontent->mainlibraryid = $mainLibraryId;
-                $h5pcontent->displayoptions = 15;
-                $h5pcontent->pathnamehash = $pathnamehash;
-                $h5pcontent->contenthash = $contenthash;
-                $h5pcontent->filtered = null;
-                $h5pcontent->timecreated = time();
-                $h5pcontent->timemodified = time();
-
-                $h5pid = $DB->insert_record('h5p', $h5pcontent);
+            } catch (Exception $e2) {
+                $deployError = ($deployError ? $deployError . '; ' : '') . $e2->getMessage();
             }
-        } catch (Exception $e2) {
-            $deployError = ($deployError ? $deployError . '; ' : '') . $e2->getMessage();
         }
+
+        // If still no h5pid, report error but don't fail completely
+        // The content will be deployed on first view
+        if ($h5pid === false && !$deployError) {
+            $h5pid = -1; // Indicates pending deployment
+        }
+
+        rebuild_course_cache($courseid, true);
+
+        return [
+            'status' => 'success',
+            'cmid' => $cmid,
+            'instanceid' => $instanceid,
+            'h5pid' => $h5pid,
+            'courseid' => $courseid,
+            'coursename' => $course->fullname,
+            'title' => $options['title'],
+            'updated' => $updatecmid > 0,
+            'url' => $CFG->wwwroot . '/mod/h5pactivity/view.php?id=' . $cmid
+        ];
+
+    } catch (Exception $e) {
+        return ['status' => 'error', 'message' => $e->getMessage(), 'trace' => $e->getTraceAsString()];
+    }
+}
+
+/**
+ * Delete one H5P activity (used to replace changed activities).
+ *
+ * @param int $cmid Course module ID of the h5pactivity
+ * @return array Result that is printed as one JSON line
+ */
+function delete_h5p_activity(int $cmid): array {
+    $cm = get_coursemodule_from_id('h5pactivity', $cmid);
+    if (!$cm) {
+        return ['status' => 'error', 'message' => 'Activity not found: cmid ' . $cmid, 'missing' => true];
+    }
+
+    try {
+        course_delete_module($cmid);
+        rebuild_course_cache($cm->course, true);
+    } catch (Exception $e) {
+        return ['status' => 'error', 'message' => $e->getMessage()];
+    }
+
+    return ['status' => 'success', 'cmid' => $cmid, 'courseid' => (int)$cm->course, 'deleted' => true];
+}
+
+/**
+ * Run import options: delete, update in place or import.
+ */
+function dispatch_options(array $options): array {
+    if (!empty($options['deletecmid'])) {
+        return delete_h5p_activity((int)$options['deletecmid']);
+    }
+    return import_h5p_package($options);
+}
+
+/**
+ * Turn a manifest/stdin request into import options.
+ *
+ * Inline packages ("data" = base64, "filename", optional "sha256") are staged
+ * under a content-hash + worker-PID directory, so parallel workers never share
+ * a staging path. The caller removes it via cleanup_request_file().
+ */
+function request_to_options(array $request, array $defaults): array {
+    $options = array_merge($defaults, array_intersect_key($request, $defaults));
+    $options['createcourse'] = !empty($options['createcourse']);
+    $options['tmpdir'] = null;
+
+    if (!empty($request['data'])) {
+        $bytes = base64_decode($request['data'], true);
+        if ($bytes === false) {
+            throw new Exception('data is not valid base64');
+        }
+        $sha256 = hash('sha256', $bytes);
+        if (!empty($request['sha256']) && $request['sha256'] !== $sha256) {
+            throw new Exception('sha256 mismatch for ' . ($request['filename'] ?? 'package'));
+        }
+
+        $tmpdir = sys_get_temp_dir() . '/h5p_import_' . $sha256 . '_' . getmypid();
+        if (!is_dir($tmpdir)) {
+            mkdir($tmpdir, 0700, true);
+        }
+        $filename = basename($request['filename'] ?? 'package.h5p');
+        $options['file'] = $tmpdir . '/' . $filename;
+        file_put_contents($options['file'], $bytes);
+        $options['tmpdir'] = $tmpdir;
     }
 
-    // If still no h5pid, report error but don't fail completely
-    // The content will be deployed on first view
-    if ($h5pid === false && !$deployError) {
-        $h5pid = -1; // Indicates pending deployment
+    return $options;
+}
+
+function cleanup_request_file(array $options): void {
+    if (!empty($options['tmpdir'])) {
+        @unlink($options['file']);
+        @rmdir($options['tmpdir']);
+    }
+}
+
+function run_request(array $request, array $defaults): array {
+    $options = null;
+    try {
+        $options = request_to_options($request, $defaults);
+        $result = dispatch_options($options);
+    } catch (Throwable $e) {
+        $result = ['status' => 'error', 'message' => $e->getMessage()];
+    } finally {
+        if ($options !== null) {
+            cleanup_request_file($options);
+        }
+    }
+    if (isset($request['id'])) {
+        $result['id'] = $request['id'];
     }
+    return $result;
+}
 
-    rebuild_course_cache($courseid, true);
-
-    echo json_encode([
-        'status' => 'success',
-        'cmid' => $cmid,
-        'instanceid' => $instanceid,
-        'h5pid' => $h5pid,
-        'courseid' => $courseid,
-        'coursename' => $course->fullname,
-        'title' => $options['title'],
-        'url' => $CFG->wwwroot . '/mod/h5pactivity/view.php?id=' . $cmid
-    ]) . "\n";
-
-} catch (Exception $e) {
-    echo json_encode(['status' => 'error', 'message' => $e->getMessage(), 'trace' => $e->getTraceAsString()]) . "\n";
-    exit(1);
+function emit_result(array $result): void {
+    fwrite(STDOUT, json_encode($result) . "\n");
+    fflush(STDOUT);
 }
+
+$defaults = [
+    'file' => '',
+    'courseid' => 0,
+    'title' => 'H5P Content',
+    'section' => 0,
+    'createcourse' => false,
+    'coursename' => '',
+    'courseimage' => '',
+    'cmid' => 0,
+    'deletecmid' => 0,
+];
+
+if ($options['stdin']) {
+    // Long-lived worker: one Moodle bootstrap for many packages
+    while (($line = fgets(STDIN)) !== false) {
+        $line = trim($line);
+        if ($line === '') {
+            continue;
+        }
+        $request = json_decode($line, true);
+        if (!is_array($request)) {
+            emit_result(['status' => 'error', 'message' => 'Invalid JSON request']);
+            continue;
+        }
+        emit_result(run_request($request, $defaults));
+    }
+    exit(0);
+}
+
+if (!empty($options['manifest'])) {
+    $manifest = json_decode((string)@file_get_contents($options['manifest']), true);
+    if (!is_array($manifest)) {
+        emit_result(['status' => 'error', 'message' => 'Manifest not readable: ' . $options['manifest']]);
+        exit(1);
+    }
+    $failed = false;
+    foreach ($manifest as $request) {
+        $result = run_request((array)$request, $defaults);
+        $failed = $failed || $result['status'] !== 'success';
+        emit_result($result);
+    }
+    exit($failed ? 1 : 0);
+}
+
+$result = dispatch_options(array_intersect_key($options, $defaults));
+emit_result($result);
+exit($result['status'] === 'success' ? 0 : 1);
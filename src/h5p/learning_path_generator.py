@@ -7,15 +7,23 @@ Supports 9 Content Types: MultiChoice, TrueFalse, Blanks, Dialogcards, Accordion
 import json
 import os
 import sys
-import subprocess
-import tempfile
-import zipfile
 import base64
 import re
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 import httpx
 
+try:
+    from .llm import get_llm_client
+    from . import moodle_import
+    from .package_writer import derive_subcontent_id, write_h5p_package
+    from .transcript_store import fetch_youtube_row
+except ImportError:
+    from llm import get_llm_client
+    import moodle_import
+    from package_writer import derive_subcontent_id, write_h5p_package
+    from transcript_store import fetch_youtube_row
+
 
 # ============================================================================
 # AI IMAGE GENERATION FOR IMAGEHOTSPOTS
@@ -358,10 +366,6 @@ VIDEO-TRANSKRIPT:
 
 def call_openai_learning_path(transcript: str, title: str = "Lernmodul", video_url: str = "") -> Dict[str, Any]:
     """Call OpenAI API to generate complete learning path"""
-    api_key = os.environ.get("OPENAI_API_KEY", "")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set")
-
     # Truncate very long transcripts
     if len(transcript) > 18000:
         transcript = transcript[:18000] + "... [gekürzt]"
@@ -401,28 +405,13 @@ def call_openai_learning_path(transcript: str, title: str = "Lernmodul", video_u
     if video_url:
         prompt += f"\n\nVERFÜGBARE VIDEO-URL: {video_url}\n"
 
-    response = httpx.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": "Du antwortest ausschliesslich mit validem JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 5000,  # Increased for more content types
-            "temperature": 0.7,
-            "response_format": {"type": "json_object"}
-        },
+    return get_llm_client().chat_json_sync(
+        prompt,
+        system="Du antwortest ausschliesslich mit validem JSON.",
+        max_tokens=5000,  # Increased for more content types
+        temperature=0.7,
         timeout=120.0  # Increased timeout for longer responses
     )
-    response.raise_for_status()
-
-    content = response.json()["choices"][0]["message"]["content"]
-    return json.loads(content)
 
 
 # ============================================================================
@@ -525,36 +514,16 @@ body, .h5p-content { color: #e8e8e8; }
 """
 
 
-def _create_h5p_package(content_json: Dict, h5p_json: Dict, output_path: str) -> str:
-    """Helper to create H5P zip package with embedded dark theme CSS"""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmppath = Path(tmpdir)
-        content_dir = tmppath / "content"
-        content_dir.mkdir()
+def _create_h5p_package(content_json: Dict, h5p_json: Dict, output_path: Optional[str]) -> Union[str, bytes]:
+    """Helper to create H5P zip package with embedded dark theme CSS (in memory)"""
+    # Add preloadedCss to h5p.json for dark theme
+    if "preloadedCss" not in h5p_json:
+        h5p_json["preloadedCss"] = []
+    h5p_json["preloadedCss"].append({"path": "content/css/dark-theme.css"})
 
-        # Create CSS directory and add dark theme
-        css_dir = content_dir / "css"
-        css_dir.mkdir()
-        with open(css_dir / "dark-theme.css", "w", encoding="utf-8") as f:
-            f.write(H5P_DARK_THEME_CSS)
-
-        with open(content_dir / "content.json", "w", encoding="utf-8") as f:
-            json.dump(content_json, f, ensure_ascii=False, indent=2)
-
-        # Add preloadedCss to h5p.json for dark theme
-        if "preloadedCss" not in h5p_json:
-            h5p_json["preloadedCss"] = []
-        h5p_json["preloadedCss"].append({"path": "content/css/dark-theme.css"})
-
-        with open(tmppath / "h5p.json", "w", encoding="utf-8") as f:
-            json.dump(h5p_json, f, ensure_ascii=False, indent=2)
-
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.write(tmppath / "h5p.json", "h5p.json")
-            zf.write(content_dir / "content.json", "content/content.json")
-            zf.write(css_dir / "dark-theme.css", "content/css/dark-theme.css")
-
-    return output_path
+    return write_h5p_package(content_json, h5p_json, output_path, files={
+        "content/css/dark-theme.css": H5P_DARK_THEME_CSS,
+    })
 
 
 def build_multichoice_h5p(data: Dict[str, Any], output_path: str) -> str:
@@ -869,10 +838,8 @@ def build_summary_h5p(data: Dict[str, Any], output_path: str) -> str:
     WICHTIG: H5P.Summary erwartet:
     - summaries[].summary: Liste von HTML-Strings (erster ist korrekt!)
     - summaries[].tip: Optionaler Tipp-String
-    - summaries[].subContentId: UUID für jeden Summary-Block
+    - summaries[].subContentId: UUID für jeden Summary-Block (stabil abgeleitet)
     """
-    import uuid
-
     statements = data.get("statements", [])
     summary_items = []
     for i, stmt in enumerate(statements):
@@ -888,7 +855,7 @@ def build_summary_h5p(data: Dict[str, Any], output_path: str) -> str:
         summary_items.append({
             "summary": options,
             "tip": stmt.get("tip", ""),
-            "subContentId": str(uuid.uuid4())
+            "subContentId": derive_subcontent_id("summary", i, options)
         })
 
     content_json = {
@@ -1437,45 +1404,19 @@ def build_image_hotspots_h5p(data: Dict[str, Any], output_path: str, transcript:
         return _create_h5p_package(content_json, h5p_json, output_path)
 
 
-def _create_h5p_package_with_image(content_json: Dict, h5p_json: Dict, output_path: str,
-                                    image_path: str, image_bytes: bytes) -> str:
-    """Create H5P package with embedded image file and dark theme CSS."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmppath = Path(tmpdir)
-        content_dir = tmppath / "content"
-        content_dir.mkdir()
-
-        # Create images subdirectory and save image
-        images_dir = content_dir / "images"
-        images_dir.mkdir()
-        image_filename = Path(image_path).name
-        with open(images_dir / image_filename, "wb") as f:
-            f.write(image_bytes)
-
-        # Create CSS directory and add dark theme
-        css_dir = content_dir / "css"
-        css_dir.mkdir()
-        with open(css_dir / "dark-theme.css", "w", encoding="utf-8") as f:
-            f.write(H5P_DARK_THEME_CSS)
+def _create_h5p_package_with_image(content_json: Dict, h5p_json: Dict, output_path: Optional[str],
+                                    image_path: str, image_bytes: bytes) -> Union[str, bytes]:
+    """Create H5P package with embedded image file and dark theme CSS (in memory)."""
+    # Add preloadedCss to h5p.json for dark theme
+    if "preloadedCss" not in h5p_json:
+        h5p_json["preloadedCss"] = []
+    h5p_json["preloadedCss"].append({"path": "content/css/dark-theme.css"})
 
-        with open(content_dir / "content.json", "w", encoding="utf-8") as f:
-            json.dump(content_json, f, ensure_ascii=False, indent=2)
-
-        # Add preloadedCss to h5p.json for dark theme
-        if "preloadedCss" not in h5p_json:
-            h5p_json["preloadedCss"] = []
-        h5p_json["preloadedCss"].append({"path": "content/css/dark-theme.css"})
-
-        with open(tmppath / "h5p.json", "w", encoding="utf-8") as f:
-            json.dump(h5p_json, f, ensure_ascii=False, indent=2)
-
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.write(tmppath / "h5p.json", "h5p.json")
-            zf.write(content_dir / "content.json", "content/content.json")
-            zf.write(images_dir / image_filename, f"content/images/{image_filename}")
-            zf.write(css_dir / "dark-theme.css", "content/css/dark-theme.css")
-
-        return output_path
+    image_filename = Path(image_path).name
+    return write_h5p_package(content_json, h5p_json, output_path, files={
+        f"content/images/{image_filename}": image_bytes,
+        "content/css/dark-theme.css": H5P_DARK_THEME_CSS,
+    })
 
 
 # ============================================================================
@@ -1496,49 +1437,21 @@ BUILDERS = {
 
 
 def import_h5p_to_moodle(h5p_path: str, courseid: int, title: str) -> Dict[str, Any]:
-    """Import H5P to Moodle via PHP script"""
-    subprocess.run(["docker", "cp", h5p_path, "moodle-app:/tmp/generated.h5p"],
-                   check=True, capture_output=True)
-
-    cmd = ["docker", "exec", "moodle-app", "php", "/opt/bitnami/moodle/local/import_h5p.php",
-           f"--file=/tmp/generated.h5p", f"--title={title}", f"--courseid={courseid}"]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    for line in result.stdout.split("\n"):
-        if line.startswith("{"):
-            return json.loads(line)
-
-    return {"status": "error", "message": result.stderr or result.stdout}
+    """Import H5P to Moodle via the shared import worker"""
+    return moodle_import.import_h5p_to_moodle(h5p_path, courseid, title)
 
 
 def create_moodle_course(coursename: str, courseimage: Optional[str] = None) -> Dict[str, Any]:
-    """Create a new Moodle course via PHP script"""
-    # Build command with optional courseimage
-    cmd = [
-        "docker", "exec", "moodle-app", "php", "/opt/bitnami/moodle/local/import_h5p.php",
-        "--createcourse",
-        f"--coursename={coursename}",
-        "--file=/dev/null"  # Dummy file, we just want to create the course
-    ]
-
-    if courseimage:
-        cmd.append(f"--courseimage={courseimage}")
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    for line in result.stdout.split("\n"):
-        if line.startswith("{"):
-            data = json.loads(line)
-            # Extract courseid from the response - ensure it's an integer
-            if data.get("status") == "success" or data.get("courseid"):
-                courseid = data.get("courseid")
-                if courseid:
-                    courseid = int(courseid)  # Ensure integer
-                return {"status": "success", "courseid": courseid}
-            return data
+    """Create a new Moodle course via the shared import worker"""
+    data = moodle_import.create_moodle_course(coursename, courseimage)
 
-    return {"status": "error", "message": result.stderr or result.stdout}
+    # Extract courseid from the response - ensure it's an integer
+    if data.get("status") == "success" or data.get("courseid"):
+        courseid = data.get("courseid")
+        if courseid:
+            courseid = int(courseid)  # Ensure integer
+        return {"status": "success", "courseid": courseid}
+    return data
 
 
 def generate_learning_path(
@@ -1679,25 +1592,11 @@ def generate_learning_path(
 
 
 def fetch_youtube_data(youtube_url_id: int) -> Dict[str, Any]:
-    """Fetch YouTube data from Supabase by ID"""
+    """Fetch YouTube data from Supabase by ID (revalidated local copy if available)"""
     supabase_url = os.environ.get("SUPABASE_URL", "http://148.230.71.150:8000")
     supabase_key = os.environ.get("SUPABASE_SERVICE_KEY", os.environ.get("SUPABASE_ANON_KEY", ""))
 
-    url = f"{supabase_url}/rest/v1/youtube_urls?id=eq.{youtube_url_id}&select=id,title,subtitles,url"
-    headers = {
-        "apikey": supabase_key,
-        "Authorization": f"Bearer {supabase_key}"
-    }
-
-    with httpx.Client() as client:
-        resp = client.get(url, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
-
-    if not data:
-        raise ValueError(f"YouTube URL with ID {youtube_url_id} not found")
-
-    return data[0]
+    return fetch_youtube_row(youtube_url_id, supabase_url, supabase_key)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""
+LLM Access Layer
+
+Shared, pooled client used by every pipeline stage and legacy CLI,
+backed by a local content-addressed response cache, with token budgeting,
+per-stage usage accounting and rate-limit-aware retries.
+"""
+
+from .client import (
+    LLMClient,
+    LLMError,
+    get_llm_client,
+    chat_json,
+    chat_json_sync,
+    JSON_SYSTEM_PROMPT,
+    DEFAULT_MODEL,
+)
+from .cache import LLMResponseCache, compute_cache_key
+from .streaming import IncrementalJSONParser, parse_sse_line, parse_sse_usage
+from .tokens import (
+    TokenBudgetError,
+    count_tokens,
+    count_message_tokens,
+    completion_budget,
+    scaled_max_tokens,
+    chars_for_tokens,
+)
+from .usage import UsageRecord, UsageTracker, get_usage_tracker
+from .ratelimit import RateLimiter, TokenBucket, backoff_delay, get_rate_limiter, retry_after
+
+__all__ = [
+    "LLMClient",
+    "LLMError",
+    "get_llm_client",
+    "chat_json",
+    "chat_json_sync",
+    "JSON_SYSTEM_PROMPT",
+    "DEFAULT_MODEL",
+    "LLMResponseCache",
+    "compute_cache_key",
+    "IncrementalJSONParser",
+    "parse_sse_line",
+    "parse_sse_usage",
+    "TokenBudgetError",
+    "count_tokens",
+    "count_message_tokens",
+    "completion_budget",
+    "scaled_max_tokens",
+    "chars_for_tokens",
+    "UsageRecord",
+    "UsageTracker",
+    "get_usage_tracker",
+    "RateLimiter",
+    "TokenBucket",
+    "backoff_delay",
+    "get_rate_limiter",
+    "retry_after",
+]
@@ -0,0 +1,144 @@
+"""
+Local LLM Response Cache
+
+Content-addressed on-disk cache (SQLite) for chat completion responses.
+- Key: SHA256 over model, messages and sampling parameters
+- Size-based LRU eviction (least recently read entries go first)
+- Safe to share between threads and async tasks of one process
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+DEFAULT_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR") or Path.home() / ".cache" / "h5p_pipeline")
+DEFAULT_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB") or 256)
+
+
+def compute_cache_key(payload: Dict[str, Any]) -> str:
+    """
+    Hash a chat completion payload into a stable cache key.
+
+    Args:
+        payload: Request body (model, messages, max_tokens, temperature, ...)
+
+    Returns:
+        Hex SHA256 of the canonical JSON representation
+    """
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache with size-based LRU eviction."""
+
+    def __init__(self, path: Path | str, max_bytes: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMResponseCache"]:
+        """
+        Create the default cache, or None if disabled via LLM_CACHE_DISABLE=1.
+        """
+        if os.getenv("LLM_CACHE_DISABLE", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(DEFAULT_CACHE_DIR / "llm_responses.sqlite3", int(DEFAULT_MAX_MB * 1024 * 1024))
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached content for key and mark it as recently used."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, content: str, model: str = "") -> None:
+        """Store content under key and evict old entries if over budget."""
+        size = len(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses (key, model, content, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, model, content, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        stale = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def total_bytes(self) -> int:
+        """Total size of all cached responses in bytes."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,603 @@
+"""
+Shared LLM Client
+
+One pooled HTTP client for all OpenAI chat completion calls.
+- Keeps keep-alive connections (HTTP/2 when `h2` is installed)
+- Owns model, timeout, retry and JSON-mode handling
+- Serves repeated identical requests from the local response cache
+- Streaming JSON mode: top-level array elements are reported as they complete
+- Token budgeting: prompt tokens are counted before sending and max_tokens is
+  capped to the context window; every call's usage and latency is recorded
+  per stage (see tokens, usage)
+- Rate limits: 429/5xx are retried honouring Retry-After and x-ratelimit-*
+  headers, with jittered backoff; an optional RPM/TPM token bucket throttles
+  requests before they are sent (see ratelimit)
+- Offers async (pipeline stages, answer matcher) and sync (legacy CLIs) APIs
+- Base URL is configurable (LLM_BASE_URL), e.g. for OpenAI-compatible
+  gateways or the local mock server (see mock_server)
+- Every call runs in an "llm.chat" span carrying stage, tokens, response
+  bytes and retries (see tracing)
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from .cache import LLMResponseCache, compute_cache_key
+from .ratelimit import RateLimiter, backoff_delay, get_rate_limiter, retry_after
+from .streaming import IncrementalJSONParser, parse_sse_line, parse_sse_usage
+from .tokens import completion_budget, count_message_tokens, count_tokens
+from .usage import UsageRecord, UsageTracker, get_usage_tracker
+try:
+    from ..tracing import current_span, traced
+except ImportError:
+    # Legacy CLIs run as scripts import this package as top-level `llm`;
+    # their directory (src/h5p) is on sys.path
+    from tracing import current_span, traced
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+DEFAULT_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+JSON_SYSTEM_PROMPT = "Du antwortest ausschliesslich mit validem JSON. Keine Markdown-Codeblöcke."
+
+# Status codes worth another attempt (rate limit + transient server errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the LLM API returns a non-200 response."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"OpenAI API error: {status_code} - {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class LLMClient:
+    """
+    Pooled OpenAI chat completion client.
+
+    The async httpx client is bound to the event loop it was created in, so a
+    new pool is opened transparently if the client is used from another loop
+    (e.g. several asyncio.run() calls in one process). Code that owns a loop
+    should await aclose() before the loop ends; a pool whose loop has already
+    closed cannot close its connections any more.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: str = DEFAULT_MODEL,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        http2: bool = HTTP2_AVAILABLE,
+        cache: Optional[LLMResponseCache] = None,
+        usage: Optional[UsageTracker] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        transport: Optional[httpx.MockTransport] = None
+    ):
+        self._api_key = api_key
+        self._base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        # Bypass skips cache reads but still stores fresh responses
+        self.cache = cache
+        self.cache_bypass = False
+        self.usage = usage or get_usage_tracker()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # Replaces the network for both pools (tests, offline runs)
+        self.transport = transport
+
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_client: Optional[httpx.Client] = None
+
+    # ------------------------------------------------------------------
+    # Connection pools
+    # ------------------------------------------------------------------
+
+    @property
+    def api_key(self) -> str:
+        # Read lazily so load_dotenv() after import still takes effect
+        api_key = self._api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not set")
+        return api_key
+
+    @property
+    def chat_url(self) -> str:
+        # Read lazily as well, the benchmark points an existing client at the mock server
+        base_url = self._base_url or os.getenv("LLM_BASE_URL") or DEFAULT_BASE_URL
+        return f"{base_url.rstrip('/')}/chat/completions"
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop or self._async_loop.is_closed():
+            if self._async_client is not None and self._async_loop.is_running():
+                # Pool of a loop in another thread, close it there
+                asyncio.run_coroutine_threadsafe(self._async_client.aclose(), self._async_loop)
+            self._async_client = httpx.AsyncClient(http2=self.http2, limits=self.limits, transport=self.transport)
+            self._async_loop = loop
+        return self._async_client
+
+    def _get_sync_client(self) -> httpx.Client:
+        if self._sync_client is None:
+            self._sync_client = httpx.Client(http2=self.http2, limits=self.limits, transport=self.transport)
+        return self._sync_client
+
+    async def aclose(self):
+        """Close the async connection pool."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    def close(self):
+        """Close the sync connection pool."""
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    # ------------------------------------------------------------------
+    # Request building
+    # ------------------------------------------------------------------
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        model: Optional[str]
+    ) -> Dict[str, Any]:
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _backoff(self, attempt: int) -> float:
+        return backoff_delay(attempt)
+
+    def _retry_delay(self, attempt: int, response: httpx.Response) -> float:
+        """
+        Wait before retrying a 429/5xx response.
+
+        A server hint (Retry-After) wins over the own backoff; a 429 also
+        pauses every other request sharing the rate limiter.
+        """
+        hinted = retry_after(response.headers)
+        if hinted is not None:
+            delay = hinted + random.uniform(0, 0.1 * hinted)
+        else:
+            delay = self._backoff(attempt)
+        if response.status_code == 429:
+            self.rate_limiter.throttle(delay)
+        current_span().add("retries").set(last_status=response.status_code)
+        return delay
+
+    def _settle(self, reserved: int, prompt_tokens: int, usage: Optional[Dict[str, Any]]):
+        """Return the unused part of the max_tokens reservation to the TPM bucket."""
+        if usage:
+            used = usage.get("total_tokens") or (
+                usage.get("prompt_tokens", prompt_tokens) + usage.get("completion_tokens", 0)
+            )
+            self.rate_limiter.release(reserved - used)
+
+    def _release_failed(self, reserved: int):
+        """Return the whole reservation of an attempt that produced no completion."""
+        self.rate_limiter.release(reserved)
+
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> tuple[str, Optional[Dict[str, Any]]]:
+        """Return (content, usage) of a completed response."""
+        if response.status_code != 200:
+            raise LLMError(response.status_code, response.text)
+        data = response.json()
+        return data["choices"][0]["message"]["content"], data.get("usage")
+
+    def _budget(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        model: Optional[str]
+    ) -> tuple[int, int]:
+        """Return (prompt_tokens, max_tokens capped to the context window)."""
+        model = model or self.model
+        prompt_tokens = count_message_tokens(messages, model)
+        return prompt_tokens, completion_budget(prompt_tokens, max_tokens, model)
+
+    def _record_usage(
+        self,
+        stage: Optional[str],
+        payload: Dict[str, Any],
+        prompt_tokens: int,
+        content: str,
+        usage: Optional[Dict[str, Any]],
+        started: float,
+        cached: bool = False
+    ):
+        record = UsageRecord(
+            stage=stage or "other",
+            model=payload["model"],
+            prompt_tokens=(usage or {}).get("prompt_tokens", prompt_tokens),
+            completion_tokens=(usage or {}).get("completion_tokens") or count_tokens(content, payload["model"]),
+            latency_s=round(time.monotonic() - started, 3),
+            max_tokens=payload["max_tokens"],
+            cached=cached,
+            estimated=usage is None
+        )
+        self.usage.record(record)
+        current_span().set(
+            stage=record.stage,
+            model=record.model,
+            prompt_tokens=record.prompt_tokens,
+            completion_tokens=record.completion_tokens,
+            max_tokens=record.max_tokens,
+            bytes=len(content.encode("utf-8")),
+            cached=cached
+        )
+
+    def _cache_lookup(self, payload: Dict[str, Any], use_cache: bool) -> tuple[Optional[str], Optional[str]]:
+        """Return (cache_key, cached_content); key is None if caching is off."""
+        if self.cache is None or not use_cache:
+            return None, None
+        cache_key = compute_cache_key(payload)
+        if self.cache_bypass:
+            return cache_key, None
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_store(self, cache_key: Optional[str], payload: Dict[str, Any], content: str):
+        if cache_key is None:
+            return
+        if "response_format" in payload:
+            # Never persist broken JSON, the next run should ask again
+            try:
+                json.loads(content)
+            except json.JSONDecodeError:
+                return
+        self.cache.set(cache_key, content, payload["model"])
+
+    # ------------------------------------------------------------------
+    # Async API
+    # ------------------------------------------------------------------
+
+    @traced("llm.chat")
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        json_mode: bool = True,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        stage: Optional[str] = None
+    ) -> str:
+        """
+        Send a chat completion request and return the raw message content.
+
+        Args:
+            messages: OpenAI chat messages
+            max_tokens: Completion token limit (capped to fit the context window)
+            temperature: Sampling temperature
+            json_mode: Request response_format json_object
+            timeout: Per-request timeout (defaults to client timeout)
+            model: Override the default model
+            use_cache: Consult and fill the local response cache
+            stage: Label for usage accounting (e.g. "stage1")
+
+        Returns:
+            Content string of the first choice
+
+        Raises:
+            LLMError: If the API still fails after all retries
+        """
+        started = time.monotonic()
+        prompt_tokens, max_tokens = self._budget(messages, max_tokens, model)
+        payload = self._payload(messages, max_tokens, temperature, json_mode, model)
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            self._record_usage(stage, payload, prompt_tokens, cached, None, started, cached=True)
+            return cached
+
+        headers = self._headers()
+        client = self._get_async_client()
+        reserved = prompt_tokens + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            await self.rate_limiter.acquire(reserved)
+            try:
+                response = await client.post(
+                    self.chat_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=timeout or self.timeout
+                )
+            except httpx.TransportError:
+                self._release_failed(reserved)
+                if last_attempt:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self.rate_limiter.observe(response.headers)
+            if response.status_code != 200:
+                self._release_failed(reserved)
+            if response.status_code in RETRYABLE_STATUS_CODES and not last_attempt:
+                await asyncio.sleep(self._retry_delay(attempt, response))
+                continue
+
+            content, usage = self._parse_response(response)
+            self._settle(reserved, prompt_tokens, usage)
+            self._record_usage(stage, payload, prompt_tokens, content, usage, started)
+            self._cache_store(cache_key, payload, content)
+            return content
+
+    async def chat_json(
+        self,
+        prompt: str,
+        *,
+        system: str = JSON_SYSTEM_PROMPT,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        stage: Optional[str] = None
+    ) -> dict:
+        """
+        JSON-mode completion for a single user prompt.
+
+        Returns:
+            Parsed JSON response
+        """
+        content = await self.chat(
+            [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            json_mode=True,
+            timeout=timeout,
+            model=model,
+            use_cache=use_cache,
+            stage=stage
+        )
+        return json.loads(content)
+
+    @traced("llm.chat_stream")
+    async def chat_json_stream(
+        self,
+        prompt: str,
+        *,
+        on_item: Optional[Callable[[str, Any], None]] = None,
+        system: str = JSON_SYSTEM_PROMPT,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        stage: Optional[str] = None
+    ) -> dict:
+        """
+        Streaming JSON-mode completion for a single user prompt.
+
+        The response is consumed as server-sent events and parsed
+        incrementally; on_item(array_key, element) is called for every element
+        of a top-level array (e.g. "sections", "learning_path") as soon as it
+        is complete. Cached responses are replayed through the same parser.
+
+        Returns:
+            Parsed JSON response
+        """
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        started = time.monotonic()
+        prompt_tokens, max_tokens = self._budget(messages, max_tokens, model)
+        payload = self._payload(messages, max_tokens, temperature, True, model)
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        parser = IncrementalJSONParser()
+        usage: Optional[Dict[str, Any]] = None
+
+        def _feed(chunk: str):
+            for key, item in parser.feed(chunk):
+                if on_item is not None:
+                    on_item(key, item)
+
+        if cached is not None:
+            _feed(cached)
+            self._record_usage(stage, payload, prompt_tokens, cached, None, started, cached=True)
+            return parser.result()
+
+        headers = self._headers()
+        client = self._get_async_client()
+        reserved = prompt_tokens + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            await self.rate_limiter.acquire(reserved)
+            try:
+                async with client.stream(
+                    "POST",
+                    self.chat_url,
+                    headers=headers,
+                    json={**payload, "stream": True, "stream_options": {"include_usage": True}},
+                    timeout=timeout or self.timeout
+                ) as response:
+                    self.rate_limiter.observe(response.headers)
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", errors="replace")
+                        self._release_failed(reserved)
+                        if response.status_code in RETRYABLE_STATUS_CODES and not last_attempt:
+                            await asyncio.sleep(self._retry_delay(attempt, response))
+                            continue
+                        raise LLMError(response.status_code, body)
+
+                    async for line in response.aiter_lines():
+                        usage = parse_sse_usage(line) or usage
+                        delta = parse_sse_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            _feed(delta)
+            except httpx.TransportError:
+                self._release_failed(reserved)
+                # Items already reported must not be reported twice
+                if last_attempt or parser.text:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self._settle(reserved, prompt_tokens, usage)
+            self._record_usage(stage, payload, prompt_tokens, parser.text, usage, started)
+            self._cache_store(cache_key, payload, parser.text)
+            return parser.result()
+
+    # ------------------------------------------------------------------
+    # Sync API (legacy CLIs)
+    # ------------------------------------------------------------------
+
+    @traced("llm.chat")
+    def chat_sync(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        json_mode: bool = True,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        stage: Optional[str] = None
+    ) -> str:
+        """Blocking variant of chat()."""
+        started = time.monotonic()
+        prompt_tokens, max_tokens = self._budget(messages, max_tokens, model)
+        payload = self._payload(messages, max_tokens, temperature, json_mode, model)
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            self._record_usage(stage, payload, prompt_tokens, cached, None, started, cached=True)
+            return cached
+
+        headers = self._headers()
+        client = self._get_sync_client()
+        reserved = prompt_tokens + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            self.rate_limiter.acquire_sync(reserved)
+            try:
+                response = client.post(
+                    self.chat_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=timeout or self.timeout
+                )
+            except httpx.TransportError:
+                self._release_failed(reserved)
+                if last_attempt:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self.rate_limiter.observe(response.headers)
+            if response.status_code != 200:
+                self._release_failed(reserved)
+            if response.status_code in RETRYABLE_STATUS_CODES and not last_attempt:
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+
+            content, usage = self._parse_response(response)
+            self._settle(reserved, prompt_tokens, usage)
+            self._record_usage(stage, payload, prompt_tokens, content, usage, started)
+            self._cache_store(cache_key, payload, content)
+            return content
+
+    def chat_json_sync(
+        self,
+        prompt: str,
+        *,
+        system: str = JSON_SYSTEM_PROMPT,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        stage: Optional[str] = None
+    ) -> dict:
+        """Blocking variant of chat_json()."""
+        content = self.chat_sync(
+            [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            json_mode=True,
+            timeout=timeout,
+            model=model,
+            use_cache=use_cache,
+            stage=stage
+        )
+        return json.loads(content)
+
+
+_default_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide shared LLM client."""
+    global _default_client
+    if _default_client is None:
+        _default_client = LLMClient(cache=LLMResponseCache.from_env())
+    return _default_client
+
+
+async def chat_json(prompt: str, **kwargs) -> dict:
+    """Shortcut for get_llm_client().chat_json()."""
+    return await get_llm_client().chat_json(prompt, **kwargs)
+
+
+def chat_json_sync(prompt: str, **kwargs) -> dict:
+    """Shortcut for get_llm_client().chat_json_sync()."""
+    return get_llm_client().chat_json_sync(prompt, **kwargs)
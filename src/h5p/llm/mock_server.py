@@ -0,0 +1,449 @@
+"""
+Local Mock LLM Server
+
+Stand-in for the OpenAI chat completions endpoint, so the pipeline can be run
+and benchmarked end-to-end without the real API (point LLM_BASE_URL at it).
+- Replays recorded responses from an LLM response cache file (exact payload
+  match), e.g. the cache filled by earlier real runs
+- Otherwise answers from fixtures: rules {"match": regex, "response": JSON}
+  checked in order against the user prompt; built-in fixtures produce valid
+  output for every pipeline stage (Stage 1, reduce, Stage 2, Stage 3 single
+  and batched)
+- Configurable latency: fixed part + per completion token, with jitter
+- Error injection: 429 with retry-after-ms, 503
+- JSON responses and SSE streaming ("stream": true, with a usage chunk)
+
+Standard library HTTP server, one thread per connection.
+
+Usage:
+    python -m src.h5p.llm.mock_server --port 8089 --latency-ms 400 --rate-limit-rate 0.05
+    LLM_BASE_URL=http://127.0.0.1:8089/v1 python src/h5p/run_pipeline.py ...
+
+    with MockLLMServer(latency_ms=50) as server:
+        client = LLMClient(api_key="mock", base_url=server.base_url)
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import click
+
+from .cache import LLMResponseCache, compute_cache_key
+from .tokens import count_message_tokens, count_tokens
+
+# A fixture response: static JSON or a function of the regex match
+FixtureResponse = Dict[str, Any] | Callable[[re.Match], Dict[str, Any]]
+Fixture = Tuple[re.Pattern, FixtureResponse]
+
+# Characters per SSE chunk when streaming
+STREAM_CHUNK_CHARS = 24
+
+
+# ----------------------------------------------------------------------
+# Built-in fixtures
+# ----------------------------------------------------------------------
+
+CONTENT_FIXTURES: Dict[str, Dict[str, Any]] = {
+    "dialogcards": {
+        "title": "Grundbegriffe",
+        "cards": [
+            {"front": "Machine Learning", "back": "Algorithmen, die Muster aus Trainingsdaten lernen."},
+            {"front": "Trainingsdaten", "back": "Beispiele, aus denen ein Modell lernt."},
+            {"front": "Modell", "back": "Gelernte Abbildung von Eingaben auf Vorhersagen."},
+        ],
+    },
+    "accordion": {
+        "title": "Ablauf des Trainings",
+        "panels": [
+            {"title": "Daten sammeln", "content": "<p>Zuerst werden Trainingsdaten gesammelt.</p>"},
+            {"title": "Modell trainieren", "content": "<p>Dann lernt das Modell aus den Daten.</p>"},
+            {"title": "Vorhersagen", "content": "<p>Schliesslich trifft das Modell Vorhersagen.</p>"},
+        ],
+    },
+    "truefalse": {
+        "title": "Wahr oder falsch?",
+        "statement": "Machine Learning lernt Regeln aus Beispielen.",
+        "correct": True,
+        "feedback_correct": "Richtig, die Regeln werden aus Daten gelernt.",
+        "feedback_wrong": "Doch: Machine Learning leitet Regeln aus Beispielen ab.",
+    },
+    "blanks": {
+        "title": "Lückentext",
+        "text": "Beim *Machine Learning* lernt ein *Algorithmus* aus *Trainingsdaten*.",
+        "description": "Fülle die Lücken aus.",
+    },
+    "dragtext": {
+        "title": "Begriffe zuordnen",
+        "task_description": "Ziehe die Begriffe an die richtige Stelle.",
+        "text": "*KI* ist ein Teilbereich der *Informatik*, *Machine Learning* ein Teil von KI.",
+    },
+    "multichoice": {
+        "title": "Verständnisfrage",
+        "question": "Woraus lernt ein Machine-Learning-Modell?",
+        "answers": [
+            {"text": "Aus Trainingsdaten", "correct": True, "feedback": "Richtig."},
+            {"text": "Aus fest programmierten Regeln", "correct": False, "feedback": "Das ist klassische Programmierung."},
+            {"text": "Aus Zufallszahlen", "correct": False, "feedback": "Nein."},
+        ],
+    },
+    "summary": {
+        "title": "Zusammenfassung",
+        "intro": "Wähle jeweils die richtige Aussage.",
+        "statements": [
+            {"correct": "ML lernt aus Daten.", "wrong": ["ML braucht keine Daten.", "ML ist kein Teil von KI."]},
+            {"correct": "Ein Modell trifft Vorhersagen.", "wrong": ["Ein Modell sammelt Daten.", "Ein Modell ist eine Datenbank."]},
+        ],
+    },
+}
+
+STRUCTURED_SCRIPT = {
+    "title": "Grundlagen des Machine Learning",
+    "summary": "Machine Learning ist ein Teilbereich der KI. Modelle lernen aus Trainingsdaten und treffen Vorhersagen.",
+    "sections": [
+        {"title": "Einführung", "concepts": [
+            {"type": "DEFINITION", "term": "Machine Learning", "explanation": "Lernen von Mustern aus Daten"},
+            {"type": "FAKT", "statement": "ML ist ein Teilbereich der KI", "is_common_misconception": False},
+        ]},
+        {"title": "Training", "concepts": [
+            {"type": "PROZESS", "name": "Training", "steps": ["Daten sammeln", "Modell trainieren", "Vorhersagen"]},
+        ]},
+        {"title": "Abgrenzung", "concepts": [
+            {"type": "VERGLEICH", "item_a": "Machine Learning", "item_b": "Klassische Programmierung",
+             "differences": ["Regeln gelernt statt programmiert"]},
+            {"type": "BEISPIEL", "context": "Klassifikation", "example": "Spam-Erkennung in E-Mails"},
+        ]},
+    ],
+    "key_terms": ["Machine Learning", "Trainingsdaten", "Modell", "Algorithmus"],
+    "visual_opportunities": ["Der Trainingsprozess als Flowchart"],
+}
+
+# Valid for the mvp milestone: passive first, no type twice in a row, summary last
+PLAN_COLUMNS = [
+    ("Einführung", "passive", ["dialogcards", "accordion"]),
+    ("Wissenstest", "active", ["truefalse", "multichoice", "blanks"]),
+    ("Anwendung", "active", ["dragtext", "truefalse", "multichoice"]),
+    ("Abschluss", "reflect", ["blanks", "summary"]),
+]
+
+
+def _learning_path(match: re.Match) -> Dict[str, Any]:
+    columns = []
+    order = 0
+    for title, phase, types in PLAN_COLUMNS:
+        activities = []
+        for content_type in types:
+            order += 1
+            activities.append({
+                "order": order,
+                "content_type": content_type,
+                "concept_refs": ["Machine Learning"],
+                "rationale": f"{content_type} zu Machine Learning",
+                "brief": f"Erstelle {content_type} zu Machine Learning und Trainingsdaten",
+            })
+        columns.append({"title": title, "phase": phase, "activities": activities})
+    learning_path = [a for column in columns for a in column["activities"]]
+    return {"columns": columns, "learning_path": learning_path}
+
+
+def _batch_items(match: re.Match) -> Dict[str, Any]:
+    tasks = re.findall(r"### AKTIVITÄT (\d+): (\w+)", match.string)
+    return {"items": [
+        {"index": int(index), "content": CONTENT_FIXTURES.get(content_type, {})}
+        for index, content_type in tasks
+    ]}
+
+
+DEFAULT_FIXTURES: List[Fixture] = [
+    (re.compile(r"### AKTIVITÄT \d+:"), _batch_items),
+    (re.compile(r"Generiere H5P-Content für den Typ: (\w+)"),
+     lambda match: CONTENT_FIXTURES.get(match.group(1), {})),
+    (re.compile(r"Lernpfad-Plan"), _learning_path),
+    (re.compile(r"gemeinsamen Titel"),
+     lambda match: {"title": STRUCTURED_SCRIPT["title"], "summary": STRUCTURED_SCRIPT["summary"]}),
+    (re.compile(r"strukturiertes Lern-Skript"), lambda match: STRUCTURED_SCRIPT),
+]
+
+
+def load_fixtures(path: Path | str) -> List[Fixture]:
+    """
+    Load fixture rules from a JSON file.
+
+    Format: [{"match": "<regex>", "response": {...}}, ...]; rules are checked
+    in order against the user prompt, before the built-in fixtures.
+    """
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    return [(re.compile(rule["match"]), rule["response"]) for rule in rules]
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
+
+class MockLLMServer:
+    """
+    Mock chat completions server running in a background thread.
+
+    Args:
+        fixtures: Extra fixture rules, checked before the built-in ones
+        recorded: Response cache to replay recorded responses from
+        latency_ms: Fixed latency per request
+        ms_per_token: Additional latency per completion token
+        jitter: Relative latency jitter (0.2 = +-20%)
+        rate_limit_rate: Share of requests answered with 429
+        error_rate: Share of requests answered with 503
+        retry_after_ms: retry-after-ms header value of injected 429s
+        host: Bind address
+        port: Port (0 = pick a free one)
+        seed: Random seed for reproducible latency and error injection
+    """
+
+    def __init__(
+        self,
+        fixtures: Optional[List[Fixture]] = None,
+        recorded: Optional[LLMResponseCache] = None,
+        latency_ms: float = 0.0,
+        ms_per_token: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after_ms: int = 200,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None
+    ):
+        self.fixtures = list(fixtures or []) + DEFAULT_FIXTURES
+        self.recorded = recorded
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after_ms = retry_after_ms
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.replayed = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "errors": self.errors,
+                "replayed": self.replayed,
+            }
+
+    # ------------------------------------------------------------------
+    # Request handling
+    # ------------------------------------------------------------------
+
+    def _inject(self) -> Optional[int]:
+        """Status code of an injected failure, or None."""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.rate_limited += 1
+                return 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                return 503
+        return None
+
+    def _latency(self, completion_tokens: int) -> float:
+        """Seconds to spend on a response."""
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, (self.latency_ms + self.ms_per_token * completion_tokens) * factor / 1000)
+
+    def respond(self, payload: Dict[str, Any]) -> str:
+        """Completion content for a request payload (recorded or fixture)."""
+        if self.recorded is not None:
+            request = {k: v for k, v in payload.items() if k not in ("stream", "stream_options")}
+            recorded = self.recorded.get(compute_cache_key(request))
+            if recorded is not None:
+                with self._lock:
+                    self.replayed += 1
+                return recorded
+
+        prompt = "\n".join(
+            m.get("content") or "" for m in payload.get("messages", []) if m.get("role") != "system"
+        )
+        for pattern, response in self.fixtures:
+            match = pattern.search(prompt)
+            if match:
+                return json.dumps(response(match) if callable(response) else response, ensure_ascii=False)
+        return "{}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+
+                status = server._inject()
+                if status == 429:
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+                        {"retry-after-ms": str(server.retry_after_ms)}
+                    )
+                    return
+                if status is not None:
+                    self._send_json(status, {"error": {"message": "Service unavailable (mock)"}})
+                    return
+
+                content = server.respond(payload)
+                model = payload.get("model", "mock")
+                usage = {
+                    "prompt_tokens": count_message_tokens(payload.get("messages", []), model),
+                    "completion_tokens": count_tokens(content, model),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                latency = server._latency(usage["completion_tokens"])
+
+                if payload.get("stream"):
+                    include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+                    self._stream(content, usage if include_usage else None, latency)
+                    return
+
+                time.sleep(latency)
+                self._send_json(200, {
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            def _stream(self, content: str, usage: Optional[Dict[str, int]], latency: float):
+                chunks = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                # Time to first token is the fixed latency, the rest is spread over the chunks
+                first = min(latency, server.latency_ms / 1000)
+                per_chunk = (latency - first) / max(1, len(chunks))
+                time.sleep(first)
+                for chunk in chunks:
+                    event = {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if per_chunk:
+                        time.sleep(per_chunk)
+                if usage is not None:
+                    self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="Bind address")
+@click.option("--port", type=int, default=8089, help="Port")
+@click.option("--fixtures", "fixtures_path", default=None, help="JSON file with extra fixture rules")
+@click.option("--recorded", default=None, help="LLM response cache file to replay recorded responses from")
+@click.option("--latency-ms", type=float, default=0.0, help="Fixed latency per request")
+@click.option("--ms-per-token", type=float, default=0.0, help="Additional latency per completion token")
+@click.option("--jitter", type=float, default=0.0, help="Relative latency jitter (0.2 = +-20%)")
+@click.option("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+@click.option("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+@click.option("--retry-after-ms", type=int, default=200, help="retry-after-ms of injected 429 responses")
+def main(
+    host: str,
+    port: int,
+    fixtures_path: Optional[str],
+    recorded: Optional[str],
+    latency_ms: float,
+    ms_per_token: float,
+    jitter: float,
+    rate_limit_rate: float,
+    error_rate: float,
+    retry_after_ms: int
+):
+    """Serve mock OpenAI chat completions for offline runs and benchmarks."""
+    server = MockLLMServer(
+        fixtures=load_fixtures(fixtures_path) if fixtures_path else None,
+        recorded=LLMResponseCache(recorded, max_bytes=1 << 62) if recorded else None,
+        latency_ms=latency_ms,
+        ms_per_token=ms_per_token,
+        jitter=jitter,
+        rate_limit_rate=rate_limit_rate,
+        error_rate=error_rate,
+        retry_after_ms=retry_after_ms,
+        host=host,
+        port=port
+    )
+    print(f"Mock LLM server on {server.base_url} (set LLM_BASE_URL to use it)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
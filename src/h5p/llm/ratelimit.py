@@ -0,0 +1,195 @@
+"""
+Rate Limiting and Backoff
+
+Client-side protection against OpenAI rate limits, shared by every request
+of a process (Stage 3 and batch runs send many calls concurrently).
+- Token buckets for requests per minute (LLM_RPM) and tokens per minute
+  (LLM_TPM); a request reserves its prompt tokens plus max_tokens, like the
+  API counts it, and unused tokens are returned once the real usage is known
+- Retry-After / retry-after-ms and x-ratelimit-* response headers are
+  honoured; a 429 pauses all callers, not only the one that received it
+- Jittered exponential backoff when the server gives no hint
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+
+# 0 = no client-side limit (server headers are still honoured)
+DEFAULT_RPM = float(os.getenv("LLM_RPM") or 0)
+DEFAULT_TPM = float(os.getenv("LLM_TPM") or 0)
+
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX") or 30)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a reset header such as "1s", "6m0s", "120ms" or "2.5"."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Server-requested wait in seconds (retry-after-ms or Retry-After), if any."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """
+    Exponential backoff with jitter.
+
+    Half of min(cap, base * 2**attempt) is fixed, the other half random, so
+    concurrent callers that failed together do not retry together.
+    """
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """
+    Bucket refilled at `per_minute` units per minute, holding at most one
+    minute's worth.
+
+    Reservations may drive the level negative; the caller then waits until
+    its share has been refilled, which serves callers in reservation order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` units; returns the seconds to wait before using them."""
+        self._refill(now)
+        # A single oversized request must not block forever
+        self._level -= min(amount, self.capacity)
+        return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def release(self, amount: float, now: float) -> None:
+        """Return units that were reserved but not used."""
+        self._refill(now)
+        self._level = min(self.capacity, self._level + amount)
+
+
+class RateLimiter:
+    """Process-wide RPM/TPM limiter with a shared pause for server throttling."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM):
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.waited_s = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens; returns the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            self.waited_s += wait
+            return wait
+
+    async def acquire(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, tokens: int) -> None:
+        """Return reserved tokens the request did not use."""
+        if self._tokens is None or tokens <= 0:
+            return
+        with self._lock:
+            self._tokens.release(tokens, time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def throttle(self, seconds: float) -> None:
+        """Record a 429 response and pause all callers."""
+        with self._lock:
+            self.throttled += 1
+        self.pause(seconds)
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Pause until the reset time when x-ratelimit-remaining-* reports an exhausted quota."""
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                continue
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if exhausted and reset:
+                self.pause(reset)
+
+    def stats(self) -> Dict[str, Any]:
+        """429 responses seen and total seconds callers waited."""
+        with self._lock:
+            return {"throttled": self.throttled, "waited_s": round(self.waited_s, 3)}
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,120 @@
+"""
+Streaming helpers for chat completions
+
+- parse_sse_line: extract the content delta from one server-sent event line
+- parse_sse_usage: extract the final usage event (stream_options.include_usage)
+- IncrementalJSONParser: feed streamed JSON text, get every element of a
+  top-level array as soon as it is complete (e.g. one section, one activity)
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+
+SSE_DONE = "[DONE]"
+
+
+def parse_sse_line(line: str) -> Optional[str]:
+    """
+    Return the content delta of one SSE line from the chat completions stream.
+
+    Returns:
+        Delta text, "" for events without content, None for the final [DONE]
+    """
+    line = line.strip()
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == SSE_DONE:
+        return None
+
+    event = json.loads(data)
+    choices = event.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def parse_sse_usage(line: str) -> Optional[dict]:
+    """Return the usage dict of an SSE line, None if it carries none."""
+    line = line.strip()
+    if not line.startswith("data:") or '"usage"' not in line:
+        return None
+    data = line[len("data:"):].strip()
+    if data == SSE_DONE:
+        return None
+    return json.loads(data).get("usage")
+
+
+class IncrementalJSONParser:
+    """
+    Incremental scanner for a streamed JSON object.
+
+    Tracks string/escape state and container nesting only; every object or
+    array element of a top-level array is parsed with json.loads once its
+    closing bracket arrives and returned as (array_key, element).
+
+    Usage:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for key, item in parser.feed(chunk):
+                ...
+        result = parser.result()
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._current_key: Optional[str] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add streamed text; return the array elements completed by it."""
+        self.text += chunk
+        completed = []
+
+        while self._pos < len(self.text):
+            ch = self.text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._expect_key and len(self._stack) == 1:
+                        self._current_key = json.loads(self.text[self._string_start:self._pos + 1])
+                        self._expect_key = False
+
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+
+            elif ch in "{[":
+                if self._stack == ["{", "["]:
+                    self._item_start = self._pos
+                self._stack.append(ch)
+                if self._stack == ["{"]:
+                    self._expect_key = True
+
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._stack == ["{", "["] and self._item_start is not None:
+                    item = json.loads(self.text[self._item_start:self._pos + 1])
+                    completed.append((self._current_key, item))
+                    self._item_start = None
+
+            elif ch == "," and self._stack == ["{"]:
+                self._expect_key = True
+
+            self._pos += 1
+
+        return completed
+
+    def result(self) -> Any:
+        """Parse the complete text (raises json.JSONDecodeError if incomplete)."""
+        return json.loads(self.text)
@@ -0,0 +1,116 @@
+"""
+Token Budgeting
+
+Counts prompt tokens before a request is sent and sizes inputs and
+max_tokens against the model's context window.
+- Uses tiktoken when installed, otherwise a character-based estimate
+- completion_budget() caps max_tokens so prompt + completion fit the context
+  (OpenAI also counts max_tokens against the TPM rate limit, so oversized
+  values throttle concurrency for nothing)
+"""
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+    TOKENIZER_AVAILABLE = True
+except ImportError:
+    TOKENIZER_AVAILABLE = False
+
+
+# Fallback estimate; German text runs a bit below the English ~4 chars/token
+CHARS_PER_TOKEN = 3.5
+
+# Per-message overhead of the chat format (role, separators) and reply priming
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS") or 128000)
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1-mini": 1047576,
+    "gpt-4.1": 1047576,
+    "gpt-3.5-turbo": 16385,
+}
+
+# Safety margin for tokenizer differences when no local tokenizer is available
+SAFETY_MARGIN_TOKENS = 256
+
+
+class TokenBudgetError(ValueError):
+    """Raised when a prompt leaves no room for the requested completion."""
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: Optional[str]):
+    if not TOKENIZER_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model or "gpt-4o-mini")
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens in text (exact with tiktoken, estimated otherwise)."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    """Prompt tokens of a chat message list, including format overhead."""
+    return sum(
+        MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "", model)
+        for message in messages
+    ) + REPLY_OVERHEAD_TOKENS
+
+
+def context_window(model: Optional[str] = None) -> int:
+    """Context size of the model in tokens."""
+    for name, size in sorted(MODEL_CONTEXT_TOKENS.items(), key=lambda item: -len(item[0])):
+        if model and model.startswith(name):
+            return size
+    return DEFAULT_CONTEXT_TOKENS
+
+
+def completion_budget(
+    prompt_tokens: int,
+    max_tokens: int,
+    model: Optional[str] = None,
+    min_tokens: int = 256
+) -> int:
+    """
+    Largest max_tokens <= the requested value that fits the context window.
+
+    Raises:
+        TokenBudgetError: If fewer than min_tokens remain for the completion
+    """
+    margin = 0 if TOKENIZER_AVAILABLE else SAFETY_MARGIN_TOKENS
+    available = context_window(model) - prompt_tokens - margin
+    if available < min(min_tokens, max_tokens):
+        raise TokenBudgetError(
+            f"Prompt uses {prompt_tokens} tokens, only {available} left for the completion"
+        )
+    return min(max_tokens, available)
+
+
+def scaled_max_tokens(input_tokens: int, ratio: float, floor: int, ceiling: int) -> int:
+    """max_tokens proportional to the input size, clamped to [floor, ceiling]."""
+    return max(floor, min(ceiling, int(input_tokens * ratio)))
+
+
+def chars_for_tokens(text: str, tokens: int, model: Optional[str] = None) -> int:
+    """
+    Number of characters of text that make up about `tokens` tokens.
+
+    Uses the text's own chars-per-token ratio, so input windows can be sized
+    in tokens while splitting on characters.
+    """
+    if not text:
+        return 0
+    ratio = len(text) / max(1, count_tokens(text, model))
+    return int(tokens * ratio)
@@ -0,0 +1,110 @@
+"""
+LLM Usage Accounting
+
+Records prompt/completion tokens and latency of every LLM call and
+aggregates them per stage into a run report.
+- Token counts come from the response `usage` field; cached responses and
+  streams without usage fall back to local counts (marked "estimated")
+- Process-wide tracker, safe to use from threads and async tasks
+"""
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class UsageRecord:
+    """One LLM call."""
+    stage: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_s: float
+    max_tokens: int
+    cached: bool = False
+    estimated: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class UsageTracker:
+    """Collects UsageRecords and builds per-stage reports."""
+
+    def __init__(self):
+        self._records: List[UsageRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, record: UsageRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    def records(self) -> List[UsageRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Aggregate per stage and in total.
+
+        Returns:
+            {"stages": {stage: {...}}, "total": {...}}; each entry has calls,
+            cached_calls, prompt/completion/total tokens, reserved max_tokens
+            and latency avg/p50/p95/max (API calls only)
+        """
+        records = self.records()
+        stages: Dict[str, List[UsageRecord]] = {}
+        for record in records:
+            stages.setdefault(record.stage, []).append(record)
+
+        def summarize(items: List[UsageRecord]) -> Dict[str, Any]:
+            latencies = [r.latency_s for r in items if not r.cached]
+            return {
+                "calls": len(items),
+                "cached_calls": sum(1 for r in items if r.cached),
+                "prompt_tokens": sum(r.prompt_tokens for r in items),
+                "completion_tokens": sum(r.completion_tokens for r in items),
+                "total_tokens": sum(r.total_tokens for r in items),
+                "max_tokens_reserved": sum(r.max_tokens for r in items if not r.cached),
+                "latency_avg_s": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "latency_p50_s": round(percentile(latencies, 50), 3),
+                "latency_p95_s": round(percentile(latencies, 95), 3),
+                "latency_max_s": round(max(latencies), 3) if latencies else 0.0,
+            }
+
+        return {
+            "stages": {stage: summarize(items) for stage, items in sorted(stages.items())},
+            "total": summarize(records),
+        }
+
+    def export(self) -> List[Dict[str, Any]]:
+        """All records as dicts (e.g. for a JSON report file)."""
+        return [{**asdict(r), "total_tokens": r.total_tokens} for r in self.records()]
+
+
+_tracker: Optional[UsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Return the process-wide usage tracker."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = UsageTracker()
+        return _tracker
@@ -0,0 +1,478 @@
+"""
+Moodle H5P Import Channel
+
+Long-lived `import_h5p.php --stdin` workers inside the Moodle container:
+- Moodle config is bootstrapped once per worker instead of once per package
+- Packages are sent inline (base64), no `docker cp` per package
+- Staging paths inside the container are named by content hash + worker PID,
+  so a pool of workers can import in parallel without clobbering each other
+- One JSON request line in, one JSON result line out
+- A worker that does not answer within MOODLE_IMPORT_TIMEOUT seconds is
+  killed and restarted; the tail of its stderr (PHP errors) is added to the
+  error result
+- Incremental re-import: package hashes are recorded per course/activity key,
+  unchanged packages are skipped, changed ones are updated in place
+
+Usage:
+    result = import_h5p_to_moodle("/tmp/quiz.h5p", courseid=12, title="Quiz")
+    results = get_import_pool().import_packages([{"h5p_path": ..., "title": ...}])
+    result = import_h5p_tracked("42:column:1", "/tmp/col.h5p", 12, "Teil 1", incremental=True)
+"""
+import atexit
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+MOODLE_CONTAINER = os.environ.get("MOODLE_CONTAINER", "moodle-app")
+IMPORT_SCRIPT = "/opt/bitnami/moodle/local/import_h5p.php"
+DEFAULT_POOL_SIZE = int(os.environ.get("MOODLE_IMPORT_WORKERS", "1"))
+DEFAULT_TIMEOUT = float(os.environ.get("MOODLE_IMPORT_TIMEOUT", "300"))
+STDERR_TAIL_LINES = 20
+DEFAULT_STATE_PATH = Path(
+    os.environ.get("MOODLE_IMPORT_STATE")
+    or Path(os.environ.get("LLM_CACHE_DIR") or Path.home() / ".cache" / "h5p_pipeline") / "moodle_import_state.json"
+)
+
+
+class MoodleImportWorker:
+    """
+    Persistent import worker (`docker exec -i <container> php import_h5p.php --stdin`).
+
+    Requests are serialised with a lock, so the worker can be shared between
+    threads (e.g. asyncio.to_thread callers). A dead worker is restarted on the
+    next request; a request that was in flight when the worker died or timed
+    out is reported as error and not replayed, to avoid duplicate activities.
+
+    stdout and stderr are read by daemon threads: stdout lines go to a queue,
+    so a result can be awaited with a deadline, and the last stderr lines are
+    kept for error results.
+    """
+
+    def __init__(
+        self,
+        container: str = MOODLE_CONTAINER,
+        script: str = IMPORT_SCRIPT,
+        timeout: float = DEFAULT_TIMEOUT
+    ):
+        self.container = container
+        self.script = script
+        self.timeout = timeout
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[str]" = queue.Queue()
+        self._stderr: deque = deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_reader: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _command(self) -> List[str]:
+        return ["docker", "exec", "-i", self.container, "php", self.script, "--stdin"]
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                self._command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                bufsize=1
+            )
+            # Fresh buffers per process, a dead worker's readers may still drain
+            self._lines = queue.Queue()
+            self._stderr = deque(maxlen=STDERR_TAIL_LINES)
+            threading.Thread(target=self._pump, args=(self._proc.stdout, self._lines.put), daemon=True).start()
+            self._stderr_reader = threading.Thread(
+                target=self._pump, args=(self._proc.stderr, self._stderr.append), daemon=True
+            )
+            self._stderr_reader.start()
+        return self._proc
+
+    @staticmethod
+    def _pump(stream, sink) -> None:
+        for line in stream:
+            sink(line)
+        # End of stream
+        sink("")
+
+    def _readline(self, deadline: float) -> str:
+        try:
+            return self._lines.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError(f"Moodle import worker did not answer within {self.timeout:g}s") from None
+
+    def stderr_tail(self) -> str:
+        """Last stderr lines of the current (or last) worker process."""
+        if self._proc is None and self._stderr_reader is not None:
+            # Worker has exited, let the reader drain what is left
+            self._stderr_reader.join(timeout=1)
+        return "".join(line for line in list(self._stderr) if line).strip()
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request to the worker and wait for its JSON result line."""
+        with self._lock:
+            deadline = time.monotonic() + self.timeout
+            try:
+                proc = self._ensure_started()
+                proc.stdin.write(json.dumps(payload, ensure_ascii=False) + "\n")
+                proc.stdin.flush()
+
+                # PHP notices may precede the result, skip until the JSON line
+                while True:
+                    line = self._readline(deadline)
+                    if not line:
+                        raise RuntimeError("Moodle import worker exited unexpectedly")
+                    if line.startswith("{"):
+                        return json.loads(line)
+            except Exception as e:
+                self._terminate(kill=isinstance(e, TimeoutError))
+                result = {"status": "error", "message": str(e)}
+                stderr = self.stderr_tail()
+                if stderr:
+                    result["message"] += f"\n{stderr}"
+                    result["stderr"] = stderr
+                return result
+
+    def import_package(
+        self,
+        h5p_path: str,
+        title: str,
+        courseid: Optional[int] = None,
+        section: int = 0,
+        create_course: bool = False,
+        course_name: Optional[str] = None,
+        course_image: Optional[str] = None,
+        cmid: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Import one .h5p package.
+
+        Args:
+            h5p_path: Local path of the package
+            title: Activity title in Moodle
+            courseid: Target course (ignored if create_course)
+            section: Course section number (0 = General)
+            create_course: Create a new course and import into it
+            course_name: Name of the new course
+            course_image: Optional course image URL for a new course
+            cmid: Existing activity whose package is replaced in place
+
+        Returns:
+            Result dict from import_h5p.php (status, cmid, courseid, url, ...)
+        """
+        try:
+            data = Path(h5p_path).read_bytes()
+        except OSError as e:
+            return {"status": "error", "message": str(e)}
+
+        payload = {
+            "data": base64.b64encode(data).decode("ascii"),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "filename": Path(h5p_path).name,
+            "title": title,
+            "section": section,
+            "createcourse": create_course,
+        }
+        if create_course:
+            payload["coursename"] = course_name or ""
+            if course_image:
+                payload["courseimage"] = course_image
+        else:
+            payload["courseid"] = courseid or 0
+        if cmid:
+            payload["cmid"] = cmid
+
+        return self.request(payload)
+
+    def delete_activity(self, cmid: int) -> Dict[str, Any]:
+        """Delete an H5P activity by course module ID."""
+        return self.request({"deletecmid": cmid})
+
+    def create_course(self, course_name: str, course_image: Optional[str] = None) -> Dict[str, Any]:
+        """Create an empty course (with self-enrolment) and return its courseid."""
+        payload = {"createcourse": True, "coursename": course_name}
+        if course_image:
+            payload["courseimage"] = course_image
+        return self.request(payload)
+
+    def import_packages(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Import many packages over the same worker.
+
+        Args:
+            items: Keyword dicts for import_package (h5p_path, title, courseid, ...)
+
+        Returns:
+            One result dict per item, in input order
+        """
+        return [self.import_package(**item) for item in items]
+
+    def _terminate(self, kill: bool = False):
+        if self._proc is not None:
+            try:
+                if kill:
+                    # A hung worker would not react to EOF on stdin
+                    self._proc.kill()
+                self._proc.stdin.close()
+                self._proc.wait(timeout=10)
+            except Exception:
+                self._proc.kill()
+                self._proc.wait()
+            self._proc = None
+
+    def close(self):
+        """Stop the worker (closing stdin ends the PHP loop)."""
+        with self._lock:
+            self._terminate()
+
+
+class MoodleImportPool:
+    """
+    Fixed-size pool of import workers.
+
+    Each worker handles one request at a time; callers block until a worker
+    is idle. Same interface as MoodleImportWorker.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, worker_factory=MoodleImportWorker):
+        self.size = max(1, size)
+        self._workers = [worker_factory() for _ in range(self.size)]
+        self._idle: "queue.Queue[MoodleImportWorker]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def _with_worker(self, method: str, *args, **kwargs) -> Dict[str, Any]:
+        worker = self._idle.get()
+        try:
+            return getattr(worker, method)(*args, **kwargs)
+        finally:
+            self._idle.put(worker)
+
+    def import_package(self, h5p_path: str, title: str, **kwargs) -> Dict[str, Any]:
+        """See MoodleImportWorker.import_package."""
+        return self._with_worker("import_package", h5p_path, title, **kwargs)
+
+    def create_course(self, course_name: str, course_image: Optional[str] = None) -> Dict[str, Any]:
+        """See MoodleImportWorker.create_course."""
+        return self._with_worker("create_course", course_name, course_image)
+
+    def delete_activity(self, cmid: int) -> Dict[str, Any]:
+        """See MoodleImportWorker.delete_activity."""
+        return self._with_worker("delete_activity", cmid)
+
+    def import_packages(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Import many packages in parallel across the pool, results in input order."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda item: self.import_package(**item), items))
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+
+_pool: Optional[MoodleImportPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_import_pool() -> MoodleImportPool:
+    """Return the process-wide import pool (workers start lazily)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MoodleImportPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def configure_import_pool(size: int) -> MoodleImportPool:
+    """Replace the process-wide pool with one of the given size."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            if _pool.size == max(1, size):
+                return _pool
+            _pool.close()
+        _pool = MoodleImportPool(size)
+        atexit.register(_pool.close)
+        return _pool
+
+
+class ImportState:
+    """
+    Package hash per imported activity, persisted as JSON.
+
+    Entries are keyed by course and a caller-defined activity key (e.g.
+    "<youtube_url_id>:column:<n>") and hold cmid, sha256 and title.
+
+    Several processes (batch and single runs) may share the file: every
+    read and write happens under an fcntl lock on a sidecar .lock file, and
+    a write re-reads the file and merges its entry, so entries recorded by
+    other processes are kept.
+    """
+
+    def __init__(self, path: Path | str = DEFAULT_STATE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _key(courseid: int, key: str) -> str:
+        return f"{courseid}/{key}"
+
+    @contextmanager
+    def _file_lock(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.path.with_suffix(self.path.suffix + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> None:
+        try:
+            self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, courseid: int, key: str) -> Optional[Dict[str, Any]]:
+        """Recorded entry for the activity, or None."""
+        with self._file_lock():
+            self._load()
+            return self._entries.get(self._key(courseid, key))
+
+    def record(self, courseid: int, key: str, cmid: int, sha256: str, title: str) -> None:
+        """Record (or replace) the entry for the activity and save."""
+        with self._file_lock():
+            self._load()
+            self._entries[self._key(courseid, key)] = {"cmid": cmid, "sha256": sha256, "title": title}
+            self._save()
+
+    def _save(self) -> None:
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._entries, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+_state: Optional[ImportState] = None
+_state_lock = threading.Lock()
+
+
+def get_import_state() -> ImportState:
+    """Return the process-wide import state."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = ImportState()
+        return _state
+
+
+def import_h5p_tracked(
+    key: str,
+    h5p_path: str,
+    courseid: Optional[int],
+    title: str,
+    *,
+    incremental: bool = False,
+    update_in_place: bool = True,
+    create_course: bool = False,
+    course_name: Optional[str] = None,
+    section: int = 0,
+    state: Optional[ImportState] = None
+) -> Dict[str, Any]:
+    """
+    Import H5P to Moodle and record its package hash.
+
+    With incremental=True and a recorded entry for (courseid, key), an
+    unchanged package is skipped and a changed one either replaces the
+    package of the existing activity (update_in_place) or the activity is
+    deleted and imported again.
+
+    Returns:
+        Result dict from import_h5p.php plus "action"
+        (created, updated, replaced or unchanged)
+    """
+    state = state or get_import_state()
+    pool = get_import_pool()
+
+    try:
+        sha256 = hashlib.sha256(Path(h5p_path).read_bytes()).hexdigest()
+    except OSError as e:
+        return {"status": "error", "message": str(e)}
+
+    entry = state.get(courseid, key) if incremental and courseid and not create_course else None
+
+    if entry and entry["sha256"] == sha256:
+        return {
+            "status": "success",
+            "action": "unchanged",
+            "cmid": entry["cmid"],
+            "courseid": courseid,
+            "title": title,
+        }
+
+    result = None
+    action = "created"
+    if entry and update_in_place:
+        result = pool.import_package(h5p_path, title, courseid=courseid, section=section, cmid=entry["cmid"])
+        action = "updated"
+        if result.get("missing"):
+            # Activity was removed in Moodle, import it again
+            result = None
+    elif entry:
+        pool.delete_activity(entry["cmid"])
+        action = "replaced"
+
+    if result is None:
+        result = pool.import_package(
+            h5p_path,
+            title,
+            courseid=courseid,
+            section=section,
+            create_course=create_course,
+            course_name=course_name
+        )
+        action = "replaced" if entry else "created"
+
+    if result.get("status") == "success" and result.get("cmid"):
+        state.record(result["courseid"], key, result["cmid"], sha256, title)
+        result["action"] = action
+
+    return result
+
+
+def import_h5p_to_moodle(
+    h5p_path: str,
+    courseid: Optional[int],
+    title: str,
+    *,
+    create_course: bool = False,
+    course_name: Optional[str] = None,
+    section: int = 0
+) -> Dict[str, Any]:
+    """Import H5P to Moodle via the shared import pool."""
+    return get_import_pool().import_package(
+        h5p_path,
+        title,
+        courseid=courseid,
+        section=section,
+        create_course=create_course,
+        course_name=course_name
+    )
+
+
+def create_moodle_course(course_name: str, course_image: Optional[str] = None) -> Dict[str, Any]:
+    """Create a new Moodle course via the shared import pool."""
+    return get_import_pool().create_course(course_name, course_image)
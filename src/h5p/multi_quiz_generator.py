@@ -6,10 +6,15 @@ Workaround for H5P Course Presentation JavaScript compatibility issues
 import json
 import os
 import sys
-import subprocess
 from pathlib import Path
 from typing import List, Dict, Any
-import httpx
+
+try:
+    from .llm import get_llm_client
+    from . import moodle_import
+except ImportError:
+    from llm import get_llm_client
+    import moodle_import
 
 # LLM prompt for generating multiple quiz questions
 MULTI_QUIZ_PROMPT = """Du bist ein E-Learning Experte. Erstelle aus dem Video-Transkript 5-8 Multiple-Choice Quizfragen.
@@ -54,38 +59,19 @@ VIDEO-TRANSKRIPT:
 
 def call_openai_multi_quiz(transcript: str, title: str = "Lernmodul") -> Dict[str, Any]:
     """Call OpenAI API to generate multiple quiz questions"""
-    api_key = os.environ.get("OPENAI_API_KEY", "")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set")
-
     # Truncate very long transcripts
     if len(transcript) > 15000:
         transcript = transcript[:15000] + "... [gekürzt]"
 
     prompt = MULTI_QUIZ_PROMPT + transcript
 
-    response = httpx.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": "Du antwortest ausschliesslich mit validem JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 3000,
-            "temperature": 0.7,
-            "response_format": {"type": "json_object"}
-        },
+    return get_llm_client().chat_json_sync(
+        prompt,
+        system="Du antwortest ausschliesslich mit validem JSON.",
+        max_tokens=3000,
+        temperature=0.7,
         timeout=60.0
     )
-    response.raise_for_status()
-
-    content = response.json()["choices"][0]["message"]["content"]
-    return json.loads(content)
 
 
 def build_single_multichoice_h5p(question_data: Dict[str, Any], output_path: str) -> str:
@@ -194,22 +180,8 @@ def build_single_multichoice_h5p(question_data: Dict[str, Any], output_path: str
 
 
 def import_h5p_to_moodle(h5p_path: str, courseid: int, title: str) -> Dict[str, Any]:
-    """Import H5P to Moodle via PHP script"""
-    # Copy H5P to container
-    subprocess.run(["docker", "cp", h5p_path, "moodle-app:/tmp/generated.h5p"],
-                   check=True, capture_output=True)
-
-    # Import - NOTE: option is --course not --courseid!
-    cmd = ["docker", "exec", "moodle-app", "php", "/opt/bitnami/moodle/local/import_h5p.php",
-           f"--file=/tmp/generated.h5p", f"--title={title}", f"--course={courseid}"]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    for line in result.stdout.split("\n"):
-        if line.startswith("{"):
-            return json.loads(line)
-
-    return {"status": "error", "message": result.stderr or result.stdout}
+    """Import H5P to Moodle via the shared import worker"""
+    return moodle_import.import_h5p_to_moodle(h5p_path, courseid, title)
 
 
 def generate_multi_quiz_activities(
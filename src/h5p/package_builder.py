@@ -5,18 +5,15 @@ Converts the LLM-generated CoursePresentation JSON into a valid H5P package
 that can be uploaded to Moodle.
 """
 
-import json
 import os
-import shutil
-import tempfile
-import zipfile
-from pathlib import Path
 from typing import Any
 
 try:
     from .course_schema import CoursePresentation, Slide, SlideElement
+    from .package_writer import derive_subcontent_id, write_h5p_package
 except ImportError:
     from course_schema import CoursePresentation, Slide, SlideElement
+    from package_writer import derive_subcontent_id, write_h5p_package
 
 
 class H5PPackageBuilder:
@@ -57,51 +54,30 @@ class H5PPackageBuilder:
         self.course = course
         self.used_libraries: set[str] = {"H5P.CoursePresentation"}
         self.media_files: dict[str, bytes] = {}
+        # subContentIds are derived from the course content + element position;
+        # the content is hashed once here, each ID only hashes seed + counter
+        self._id_seed = derive_subcontent_id(course.model_dump(mode="json"))
+        self._id_counter = 0
 
-    def build(self, output_path: str) -> str:
+    def build(self, output_path: str | None = None) -> str | bytes:
         """
         Build the H5P package and save to output_path.
 
-        Returns the path to the created .h5p file.
+        Returns the path to the created .h5p file, or the package bytes
+        if output_path is None. The ZIP is assembled in memory and contains
+        no directory entries (important for Moodle!).
         """
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Create content directory
-            content_dir = Path(tmpdir) / "content"
-            content_dir.mkdir()
-
-            # Generate content.json
-            content_json = self._build_content_json()
-            (content_dir / "content.json").write_text(
-                json.dumps(content_json, ensure_ascii=False, indent=2),
-                encoding="utf-8"
-            )
-
-            # Copy media files if any
-            if self.media_files:
-                images_dir = content_dir / "images"
-                images_dir.mkdir(exist_ok=True)
-                for filename, data in self.media_files.items():
-                    (images_dir / filename).write_bytes(data)
-
-            # Generate h5p.json
-            h5p_json = self._build_h5p_json()
-            (Path(tmpdir) / "h5p.json").write_text(
-                json.dumps(h5p_json, ensure_ascii=False, indent=2),
-                encoding="utf-8"
-            )
-
-            # Create ZIP without directory entries (important for Moodle!)
-            h5p_path = Path(output_path)
-            with zipfile.ZipFile(h5p_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                # Add h5p.json
-                zf.write(Path(tmpdir) / "h5p.json", "h5p.json")
-                # Add content/content.json
-                zf.write(content_dir / "content.json", "content/content.json")
-                # Add media files
-                for filename in self.media_files:
-                    zf.write(content_dir / "images" / filename, f"content/images/{filename}")
-
-            return str(h5p_path)
+        media = {
+            f"content/images/{filename}": data
+            for filename, data in self.media_files.items()
+        }
+        result = write_h5p_package(
+            self._build_content_json(),
+            self._build_h5p_json(),
+            output_path,
+            files=media
+        )
+        return str(result) if output_path is not None else result
 
     def _build_h5p_json(self) -> dict:
         """Build the h5p.json manifest."""
@@ -130,6 +106,7 @@ class H5PPackageBuilder:
 
     def _build_content_json(self) -> dict:
         """Build the content.json for Course Presentation."""
+        self._id_counter = 0
         slides = []
         for slide in self.course.slides:
             slides.append(self._build_slide(slide))
@@ -438,9 +415,9 @@ class H5PPackageBuilder:
         }
 
     def _generate_id(self) -> str:
-        """Generate a unique subContentId."""
-        import uuid
-        return str(uuid.uuid4())
+        """Generate a stable subContentId (same course -> same IDs)."""
+        self._id_counter += 1
+        return derive_subcontent_id(self._id_seed, self._id_counter)
 
 
 def build_h5p_from_json(course_json: dict, output_path: str) -> str:
@@ -0,0 +1,134 @@
+"""
+H5P Package Writer
+
+Assembles .h5p ZIP archives directly from in-memory data:
+- JSON, text and media entries are written straight into the ZIP stream
+- Target is a file path or an in-memory buffer (returns bytes)
+- No temporary directories, no write/re-read round-trip
+- Deterministic: sorted JSON, fixed entry timestamps/permissions, so identical
+  inputs give byte-identical packages (see also derive_subcontent_id)
+
+Usage:
+    write_h5p_package(content_json, h5p_json, "/tmp/quiz.h5p")
+    data = write_h5p_package(content_json, h5p_json)  # bytes, e.g. for upload
+"""
+import io
+import json
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+
+PackageData = Union[bytes, str, Dict[str, Any], list]
+
+# Earliest timestamp a ZIP entry can carry; used for every entry
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+SUBCONTENT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "yt-to-h5p-pipeline/subContentId")
+
+
+def derive_subcontent_id(*parts: Any) -> str:
+    """
+    Derive a stable subContentId (UUID format) from the given parts.
+
+    Pass the content the ID belongs to plus its position, so identical
+    content at the same place always gets the same ID.
+    """
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return str(uuid.uuid5(SUBCONTENT_NAMESPACE, canonical))
+
+
+def _zip_info(arcname: str) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(arcname, date_time=FIXED_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.create_system = 3  # Unix, independent of the build host
+    info.external_attr = 0o644 << 16
+    return info
+
+
+class H5PPackageWriter:
+    """
+    Streaming ZIP writer for H5P packages.
+
+    Only file entries are written (no directory entries, which Moodle rejects).
+    Use as context manager or call close(); close() returns the output path,
+    or the package bytes when no output path was given.
+    """
+
+    def __init__(self, output_path: Optional[str] = None):
+        self.output_path = output_path
+        self._buffer = io.BytesIO() if output_path is None else None
+        self._zip = zipfile.ZipFile(
+            output_path if output_path is not None else self._buffer,
+            "w",
+            zipfile.ZIP_DEFLATED
+        )
+        self._result: Optional[Union[str, bytes]] = None
+
+    def add_json(self, arcname: str, data: Any) -> None:
+        """Serialise data as UTF-8 JSON (sorted keys) into arcname."""
+        self.add_text(arcname, json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True))
+
+    def add_text(self, arcname: str, text: str) -> None:
+        """Write a UTF-8 text entry (CSS, JS, ...)."""
+        self.add_bytes(arcname, text.encode("utf-8"))
+
+    def add_bytes(self, arcname: str, data: bytes) -> None:
+        """Write a binary entry (images, audio, ...)."""
+        self._zip.writestr(_zip_info(arcname), data)
+
+    def add_file(self, arcname: str, path: Union[str, Path]) -> None:
+        """Copy an existing file from disk into the package."""
+        self.add_bytes(arcname, Path(path).read_bytes())
+
+    def add(self, arcname: str, data: PackageData) -> None:
+        """Add an entry, choosing the encoding by type (dict/list -> JSON)."""
+        if isinstance(data, (dict, list)):
+            self.add_json(arcname, data)
+        elif isinstance(data, str):
+            self.add_text(arcname, data)
+        else:
+            self.add_bytes(arcname, data)
+
+    def close(self) -> Union[str, bytes]:
+        """Finish the archive; returns output_path or the package bytes."""
+        if self._result is None:
+            self._zip.close()
+            if self._buffer is not None:
+                self._result = self._buffer.getvalue()
+            else:
+                self._result = self.output_path
+        return self._result
+
+    def __enter__(self) -> "H5PPackageWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def write_h5p_package(
+    content_json: Dict[str, Any],
+    h5p_json: Dict[str, Any],
+    output_path: Optional[str] = None,
+    files: Optional[Dict[str, PackageData]] = None
+) -> Union[str, bytes]:
+    """
+    Write a complete H5P package in one pass.
+
+    Args:
+        content_json: The content.json data
+        h5p_json: The h5p.json manifest data
+        output_path: Path for the .h5p file; None returns the package bytes
+        files: Extra entries by archive name, e.g. {"content/images/a.png": b"..."}
+
+    Returns:
+        output_path, or the package bytes if output_path is None
+    """
+    with H5PPackageWriter(output_path) as writer:
+        writer.add_json("h5p.json", h5p_json)
+        writer.add_json("content/content.json", content_json)
+        for arcname, data in (files or {}).items():
+            writer.add(arcname, data)
+    return writer.close()
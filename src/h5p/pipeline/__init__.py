@@ -4,14 +4,18 @@
 Stufe 1: Transcript → Strukturiertes Skript (stage1_summarizer)
 Stufe 2: Skript → Lernpfad-Plan (stage2_planner)
 Stufe 3: Plan → H5P Content (stage3_generator)
+
+executor: Pipelined Ausführung Stufe 2 → Stufe 3 → Build → Import
 """
 
 from .stage1_summarizer import summarize_transcript
 from .stage2_planner import plan_learning_path
 from .stage3_generator import generate_h5p_content
+from .executor import PipelinedExecutor
 
 __all__ = [
     "summarize_transcript",
     "plan_learning_path",
     "generate_h5p_content",
+    "PipelinedExecutor",
 ]
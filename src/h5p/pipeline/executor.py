@@ -0,0 +1,252 @@
+"""
+Pipelined Ausführung: Stufe 2 → Stufe 3 → Build → Import
+
+Statt jede Stufe komplett abzuwarten, fließt jedes Element weiter, sobald es
+fertig ist (verbunden über asyncio.Queues):
+- Jede geplante Aktivität geht direkt in die Generierung (Stufe 2 wird
+  gestreamt, siehe plan_learning_path(on_activity=...))
+- Jede Spalte (bzw. Einzel-Aktivität im Legacy-Modus) wird gebaut, sobald
+  ihr gesamter Content generiert ist
+- Jedes gebaute Paket wird importiert, während andere noch generiert werden
+
+Optional werden die Aktivitäten einer Spalte in Gruppen zu je batch_size
+gemeinsam generiert (ein LLM-Call pro Gruppe, siehe
+generate_h5p_content_batch); die Spalte wird dann gebündelt eingeplant,
+sobald sie fertig gestreamt ist.
+
+Importe laufen in Plan-Reihenfolge (Reorder-Buffer), damit die Reihenfolge
+im Moodle-Abschnitt stimmt und der erste Import den Kurs anlegen kann.
+Die Latenz pro Video nähert sich so der langsamsten Einzelkette statt der
+Summe aller Stufen.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+
+@dataclass
+class PackageUnit:
+    """Ein zu bauendes und importierendes Paket (Spalte oder Einzel-Aktivität)."""
+    index: int
+    kind: str  # "column" oder "activity"
+    title: str
+    activities: list[dict]
+    keys: list[Hashable]  # Content-Keys, die vor dem Build fertig sein müssen
+    column: dict | None = None
+
+
+@dataclass
+class PipelineRun:
+    """Ergebnis eines pipelined Laufs."""
+    learning_path: dict
+    contents: list[dict] = field(default_factory=list)  # in Plan-Reihenfolge
+    results: list[dict] = field(default_factory=list)  # in Import-Reihenfolge
+
+
+def activity_key(activity: dict, position: int) -> Hashable:
+    """Content-Key einer Aktivität: ihre order, sonst die Position im Plan."""
+    order = activity.get("order")
+    return order if order is not None else f"#{position}"
+
+
+def plan_units(learning_path: dict, keys: list[Hashable]) -> list[PackageUnit]:
+    """
+    Zerlege den Lernpfad in Pakete.
+
+    Mit "columns" wird jede Spalte ein Paket (Content per order), sonst wird
+    jede Aktivität aus "learning_path" ein eigenes Paket.
+    """
+    activities = learning_path.get("learning_path", [])
+    columns = learning_path.get("columns", [])
+
+    if columns:
+        known = set(keys)
+        return [
+            PackageUnit(
+                index=i,
+                kind="column",
+                title=column.get("title", f"Teil {i + 1}"),
+                activities=column.get("activities", []),
+                keys=[a.get("order") for a in column.get("activities", []) if a.get("order") in known],
+                column=column
+            )
+            for i, column in enumerate(columns)
+        ]
+
+    return [
+        PackageUnit(
+            index=i,
+            kind="activity",
+            title=activity.get("brief", activity.get("content_type", "")),
+            activities=[activity],
+            keys=[key]
+        )
+        for i, (activity, key) in enumerate(zip(activities, keys))
+    ]
+
+
+class PipelinedExecutor:
+    """
+    Verbindet Planung, Generierung, Build und Import über Queues.
+
+    Args:
+        generate: async (activity) -> content; Fehler werden wie in
+            generate_all_content als {"_error", "_activity"} erfasst
+        build: sync (unit, contents_by_key) -> Ergebnis-Dict mit "h5p_path",
+            Dict mit "error" (wird nicht importiert) oder None (übersprungen);
+            läuft in einem Thread
+        import_package: async (unit, built) -> finales Ergebnis-Dict
+        max_concurrency: Maximale Anzahl gleichzeitiger Generierungen
+        generate_batch: Optional async (activities) -> contents (gleiche
+            Reihenfolge) für mehrere Aktivitäten einer Spalte
+        batch_size: Maximale Gruppengröße für generate_batch (1 = aus)
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[dict], Awaitable[dict]],
+        build: Callable[[PackageUnit, dict], dict | None],
+        import_package: Callable[[PackageUnit, dict], Awaitable[dict]],
+        max_concurrency: int = 4,
+        generate_batch: Callable[[list[dict]], Awaitable[list[dict]]] | None = None,
+        batch_size: int = 1
+    ):
+        self.generate = generate
+        self.build = build
+        self.import_package = import_package
+        self.max_concurrency = max(1, max_concurrency)
+        self.generate_batch = generate_batch
+        self.batch_size = max(1, batch_size) if generate_batch is not None else 1
+
+    async def run(
+        self,
+        plan: Callable[[Callable[[dict], None]], Awaitable[dict]]
+    ) -> PipelineRun:
+        """
+        Führe einen Lauf aus.
+
+        Args:
+            plan: async (on_activity) -> learning_path; ruft on_activity für
+                jede Aktivität auf, sobald sie geplant ist. Im Batch-Modus wird
+                plan(on_activity, on_column=...) aufgerufen und on_column mit
+                jeder fertig geplanten Spalte
+
+        Returns:
+            PipelineRun mit Plan, Contents und Import-Ergebnissen
+        """
+        activity_queue: asyncio.Queue = asyncio.Queue()
+        build_queue: asyncio.Queue = asyncio.Queue()
+        import_queue: asyncio.Queue = asyncio.Queue()
+
+        contents: dict[Hashable, dict] = {}
+        submitted: set[Hashable] = set()
+        units: list[PackageUnit] | None = None
+        released: set[int] = set()
+        results: list[dict] = []
+
+        def submit(group: list[tuple[Hashable, dict]]):
+            group = [(key, activity) for key, activity in group if key not in submitted]
+            submitted.update(key for key, _ in group)
+            if group:
+                activity_queue.put_nowait(group)
+
+        def on_activity(activity: dict):
+            # Nur Aktivitäten mit order sind schon eindeutig zuordenbar;
+            # im Batch-Modus werden sie spaltenweise über on_column eingeplant
+            if activity.get("order") is not None and self.batch_size == 1:
+                submit([(activity["order"], activity)])
+
+        def on_column(column: dict):
+            ready = [(a["order"], a) for a in column.get("activities", []) if a.get("order") is not None]
+            for i in range(0, len(ready), self.batch_size):
+                submit(ready[i:i + self.batch_size])
+
+        def release_ready_units():
+            if units is None or len(released) == len(units):
+                return
+            for unit in units:
+                if unit.index not in released and all(k in contents for k in unit.keys):
+                    released.add(unit.index)
+                    build_queue.put_nowait(unit)
+            if len(released) == len(units):
+                build_queue.put_nowait(None)
+
+        async def generate_worker():
+            while (group := await activity_queue.get()) is not None:
+                try:
+                    if len(group) == 1:
+                        generated = [await self.generate(group[0][1])]
+                    else:
+                        generated = await self.generate_batch([activity for _, activity in group])
+                        if len(generated) != len(group):
+                            raise ValueError(f"Batch returned {len(generated)} contents for {len(group)} activities")
+                except Exception as e:
+                    print(f"ERROR generating content for activities {[key for key, _ in group]}: {e}")
+                    generated = [{"_error": str(e), "_activity": activity} for _, activity in group]
+                for (key, _), content in zip(group, generated):
+                    contents[key] = content
+                release_ready_units()
+
+        async def build_worker():
+            while (unit := await build_queue.get()) is not None:
+                try:
+                    built = await asyncio.to_thread(self.build, unit, contents)
+                except Exception as e:
+                    built = {"title": unit.title, "error": str(e)}
+                import_queue.put_nowait((unit.index, unit, built))
+            import_queue.put_nowait(None)
+
+        async def import_worker():
+            pending: dict[int, tuple] = {}
+            next_index = 0
+            while (item := await import_queue.get()) is not None:
+                pending[item[0]] = item
+                while next_index in pending:
+                    _, unit, built = pending.pop(next_index)
+                    next_index += 1
+                    if built is None:
+                        continue
+                    if "error" in built:
+                        results.append(built)
+                        continue
+                    try:
+                        results.append(await self.import_package(unit, built))
+                    except Exception as e:
+                        results.append({**built, "error": str(e)})
+
+        workers = [asyncio.create_task(generate_worker()) for _ in range(self.max_concurrency)]
+        workers += [asyncio.create_task(build_worker()), asyncio.create_task(import_worker())]
+
+        try:
+            if self.batch_size > 1:
+                learning_path = await plan(on_activity, on_column=on_column)
+                # Spalten, deren Aktivitäten beim Streamen noch keine order hatten
+                for column in learning_path.get("columns", []):
+                    on_column(column)
+            else:
+                learning_path = await plan(on_activity)
+
+            activities = learning_path.get("learning_path", [])
+            keys = [activity_key(a, i) for i, a in enumerate(activities)]
+            for key, activity in zip(keys, activities):
+                submit([(key, activity)])
+            for _ in range(self.max_concurrency):
+                activity_queue.put_nowait(None)
+
+            units = plan_units(learning_path, keys)
+            release_ready_units()
+            if not units:
+                build_queue.put_nowait(None)
+
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            raise
+
+        return PipelineRun(
+            learning_path=learning_path,
+            contents=[contents[key] for key in keys],
+            results=results
+        )
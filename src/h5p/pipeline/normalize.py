@@ -0,0 +1,142 @@
+"""
+Transcript-Normalisierung vor Stufe 1
+
+Schneller lokaler Vorverarbeitungsschritt, damit das LLM weniger Tokens liest:
+- Entfernt Zeitstempel, Cue-Nummern und Tags aus SRT/WebVTT-Untertiteln
+- Entfernt Rolling-Caption-Duplikate (Auto-Untertitel wiederholen die
+  vorherige Zeile und hängen ein paar Wörter an)
+- Die SRT/WebVTT-Regeln greifen nur, wenn die Eingabe als Untertitel erkannt
+  wird (WEBVTT-Kopf oder "-->"-Cue-Zeiten); in Fließtext wären alleinstehende
+  Zahlen, Uhrzeiten am Zeilenanfang und Wortwiederholungen echter Inhalt
+- Entfernt deutsche (und englische) Füllwörter wie "äh", "ähm", "hm"
+- Entfernt Boilerplate wie "[Musik]" oder "Untertitel im Auftrag des ZDF"
+- Meldet die Einsparung (Zeichen und Tokens, gezählt wie das LLM-Budget)
+"""
+
+import re
+from typing import TypedDict
+
+from ..llm import count_tokens
+
+WEBVTT_HEADER = re.compile(r"^\s*(WEBVTT|Kind:|Language:|NOTE\b|STYLE\b).*$", re.IGNORECASE)
+CUE_NUMBER = re.compile(r"^\s*\d+\s*$")
+TIMESTAMP = r"(?:\d{1,2}:)?\d{1,2}:\d{2}(?:[.,]\d{1,3})?"
+CUE_TIMING = re.compile(rf"^\s*{TIMESTAMP}\s*-->\s*{TIMESTAMP}.*$")
+INLINE_TAG = re.compile(r"<[^>]{1,40}>")  # <00:00:01.234>, <c>, </c>, <i>
+BRACKET_TIMESTAMP = re.compile(rf"[\[(]\s*{TIMESTAMP}\s*[\])]")
+LEADING_TIMESTAMP = re.compile(rf"^\s*{TIMESTAMP}\s+")
+
+# [Musik], [Applaus], (Lachen), ♪ ... ♪
+ANNOTATION = re.compile(
+    r"[\[(]\s*(musik|music|applaus|applause|lachen|gelächter|laughter|beifall|"
+    r"räuspern|stille|unverständlich|inaudible|geräusch\w*|intro|outro)\s*[\])]|[♪♫]+",
+    re.IGNORECASE
+)
+BOILERPLATE = re.compile(
+    r"(untertitel\s+(im auftrag\s+)?(des|der|von)\s+(?:[\w.\-]+\s+){0,3}?[\w.\-]*"
+    r"(community|zdf|ard|funk)\b(,?\s*\d{4})?\.?|"
+    r"untertitelung\s*:?\s*(?:[\w.\-]+\s+){0,3}?[\w.\-]*(gmbh|ag)\b\.?|"
+    r"copyright\s+\w+\s+\d{4}\.?)",
+    re.IGNORECASE
+)
+
+# Füllwörter als ganze Wörter, inkl. gedehnter Varianten ("ääähm") und umgebender Kommas
+FILLER = re.compile(
+    r"(?:,\s*)?\b(ä+h*m*|ö+h*m+|e+h+m+|h+m+|u+h+m*|ahm|öh)\b,?",
+    re.IGNORECASE
+)
+
+# Kürzere Überlappungen sind eher normale Wortwiederholungen als Rolling Captions
+MIN_OVERLAP_WORDS = 2
+
+
+class NormalizationStats(TypedDict):
+    chars_before: int
+    chars_after: int
+    tokens_before: int
+    tokens_after: int
+    saved_percent: float
+
+
+def is_caption_format(transcript: str) -> bool:
+    """True für SRT/WebVTT (WEBVTT-Kopf oder Cue-Zeiten "00:01 --> 00:03")."""
+    if transcript.lstrip().upper().startswith("WEBVTT"):
+        return True
+    return any(CUE_TIMING.match(line) for line in transcript.splitlines())
+
+
+def _caption_lines(transcript: str, captions: bool) -> list[str]:
+    """Textzeilen ohne SRT/WebVTT-Verwaltungszeilen, Tags und Zeitstempel."""
+    lines = []
+    for line in transcript.splitlines():
+        if captions:
+            if WEBVTT_HEADER.match(line) or CUE_NUMBER.match(line) or CUE_TIMING.match(line):
+                continue
+            line = INLINE_TAG.sub("", line)
+        line = BRACKET_TIMESTAMP.sub(" ", line)
+        if captions:
+            line = LEADING_TIMESTAMP.sub("", line)
+        line = line.strip()
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _drop_rolling_duplicates(lines: list[str]) -> list[str]:
+    """
+    Entferne Wiederholungen aus Rolling Captions.
+
+    Beginnt eine Zeile mit dem Ende des bisherigen Textes (wortweise), wird
+    nur der neue Teil übernommen; komplett enthaltene Zeilen entfallen.
+    """
+    words: list[str] = []
+    for line in lines:
+        new = line.split()
+        # Längste Überlappung: Ende des bisherigen Textes == Anfang der Zeile
+        max_overlap = min(len(words), len(new))
+        overlap = 0
+        for size in range(max_overlap, 0, -1):
+            if size < MIN_OVERLAP_WORDS and size < len(new):
+                break
+            if [w.lower() for w in words[-size:]] == [w.lower() for w in new[:size]]:
+                overlap = size
+                break
+        words.extend(new[overlap:])
+    return words
+
+
+def normalize_transcript(transcript: str) -> tuple[str, NormalizationStats]:
+    """
+    Normalisiere rohe Untertitel für Stufe 1.
+
+    Args:
+        transcript: Rohe Untertitel (Fließtext, SRT oder WebVTT)
+
+    Returns:
+        (normalisierter Text, Statistik mit Einsparung)
+    """
+    captions = is_caption_format(transcript)
+    lines = _caption_lines(transcript, captions)
+    words = _drop_rolling_duplicates(lines) if captions else " ".join(lines).split()
+    text = " ".join(words)
+
+    text = ANNOTATION.sub(" ", text)
+    text = BOILERPLATE.sub(" ", text)
+    text = FILLER.sub(" ", text)
+
+    # Aufräumen: Leerzeichen vor Satzzeichen, doppelte Satzzeichen/Leerzeichen
+    text = re.sub(r"\s+([,.!?;:])", r"\1", text)
+    text = re.sub(r",\s*([,.!?])", r"\1", text)
+    text = re.sub(r"([.!?])(\s*\.)+", r"\1", text)
+    text = re.sub(r"\s{2,}", " ", text).strip()
+
+    tokens_before = count_tokens(transcript)
+    tokens_after = count_tokens(text)
+    stats: NormalizationStats = {
+        "chars_before": len(transcript),
+        "chars_after": len(text),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "saved_percent": round(100 * (1 - tokens_after / tokens_before), 1) if tokens_before else 0.0,
+    }
+    return text, stats
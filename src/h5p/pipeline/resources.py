@@ -0,0 +1,50 @@
+"""
+Globale Ressourcen-Limits
+
+Begrenzt gleichzeitige Zugriffe auf geteilte Ressourcen (LLM, Supabase,
+Moodle-Import), wenn mehrere Pipeline-Läufe in einem Event-Loop laufen.
+Ohne Konfiguration gibt es kein Limit (Einzel-Lauf verhält sich wie bisher).
+"""
+
+import asyncio
+import contextlib
+
+# Bekannte Ressourcen
+RESOURCES = ("llm", "supabase", "moodle")
+
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def configure_limits(**limits: int | None) -> None:
+    """
+    Setze Limits pro Ressource, z.B. configure_limits(llm=8, moodle=1).
+
+    Muss innerhalb des Event-Loops aufgerufen werden, der die Läufe ausführt.
+    None oder <= 0 entfernt das Limit.
+    """
+    for name, limit in limits.items():
+        if name not in RESOURCES:
+            raise ValueError(f"Unknown resource '{name}'. Available: {', '.join(RESOURCES)}")
+        if limit and limit > 0:
+            _semaphores[name] = asyncio.Semaphore(limit)
+        else:
+            _semaphores.pop(name, None)
+
+
+def reset_limits() -> None:
+    """Entferne alle Limits."""
+    _semaphores.clear()
+
+
+def resource_slot(name: str) -> contextlib.AbstractAsyncContextManager:
+    """
+    Async Context Manager für einen Slot der Ressource.
+
+    Usage:
+        async with resource_slot("llm"):
+            await call_openai(...)
+    """
+    semaphore = _semaphores.get(name)
+    if semaphore is None:
+        return contextlib.nullcontext()
+    return semaphore
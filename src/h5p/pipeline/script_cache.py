@@ -0,0 +1,222 @@
+"""
+Stage 1 Cache: lokale Stufen vor Supabase structured_scripts
+
+Schlüssel ist (youtube_url_id, transcript_hash).
+- Stufe 1: In-Process LRU (OrderedDict), kein I/O
+- Stufe 2: SQLite auf Platte, LRU nach letztem Zugriff
+- Supabase bleibt die geteilte Quelle: Treffer von dort werden lokal
+  übernommen, neue Skripte werden im Hintergrund hochgeladen (write-behind)
+- Fehlgeschlagene Uploads bleiben als "dirty" markiert und werden bei
+  flush() erneut versucht - auch in späteren Läufen
+
+Ein gecachter Stufe-1-Lauf braucht so keinen einzigen Netzwerk-Roundtrip
+und funktioniert auch, wenn Supabase langsam oder nicht erreichbar ist.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+DEFAULT_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR") or Path.home() / ".cache" / "h5p_pipeline")
+DEFAULT_CACHE_PATH = Path(os.getenv("STAGE1_CACHE_PATH") or DEFAULT_CACHE_DIR / "structured_scripts.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("STAGE1_CACHE_MAX_ENTRIES") or 2000)
+MEMORY_ENTRIES = 128
+
+# async (youtube_url_id, transcript_hash, script) -> True wenn gespeichert
+Uploader = Callable[[int, str, dict], Awaitable[bool]]
+
+
+class ScriptCache:
+    """Zweistufiger lokaler Cache (Speicher + SQLite) für strukturierte Skripte."""
+
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        memory_entries: int = MEMORY_ENTRIES
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory: OrderedDict[tuple[int, str], dict] = OrderedDict()
+        self._pending: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scripts (
+                youtube_url_id INTEGER NOT NULL,
+                transcript_hash TEXT NOT NULL,
+                script TEXT NOT NULL,
+                dirty INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (youtube_url_id, transcript_hash)
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["ScriptCache"]:
+        """Standard-Cache, oder None wenn STAGE1_CACHE_DISABLE=1."""
+        if os.getenv("STAGE1_CACHE_DISABLE", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(DEFAULT_CACHE_PATH)
+
+    def _remember(self, key: tuple[int, str], script: dict) -> None:
+        self._memory[key] = script
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, youtube_url_id: int, transcript_hash: str) -> Optional[dict]:
+        """Skript aus Speicher oder Platte, None bei Miss."""
+        key = (youtube_url_id, transcript_hash)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT script FROM scripts WHERE youtube_url_id = ? AND transcript_hash = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE scripts SET last_access = ? WHERE youtube_url_id = ? AND transcript_hash = ?",
+                (time.time(), *key)
+            )
+            self._conn.commit()
+            script = json.loads(row[0])
+            self._remember(key, script)
+            self.disk_hits += 1
+            return script
+
+    def put(self, youtube_url_id: int, transcript_hash: str, script: dict, dirty: bool = False) -> None:
+        """Speichere ein Skript in beiden Stufen (dirty = noch nicht in Supabase)."""
+        key = (youtube_url_id, transcript_hash)
+        with self._lock:
+            self._remember(key, script)
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO scripts (youtube_url_id, transcript_hash, script, dirty, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (*key, json.dumps(script, ensure_ascii=False), int(dirty), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Noch nicht hochgeladene Einträge werden nie verdrängt
+        count = self._conn.execute("SELECT COUNT(*) FROM scripts").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self._conn.execute(
+            """
+            DELETE FROM scripts WHERE rowid IN (
+                SELECT rowid FROM scripts WHERE dirty = 0 ORDER BY last_access ASC LIMIT ?
+            )
+            """,
+            (count - self.max_entries,)
+        )
+
+    def mark_clean(self, youtube_url_id: int, transcript_hash: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE scripts SET dirty = 0 WHERE youtube_url_id = ? AND transcript_hash = ?",
+                (youtube_url_id, transcript_hash)
+            )
+            self._conn.commit()
+
+    def dirty_entries(self) -> list[tuple[int, str, dict]]:
+        """Einträge, deren Upload nach Supabase noch aussteht."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT youtube_url_id, transcript_hash, script FROM scripts WHERE dirty = 1"
+            ).fetchall()
+        return [(youtube_url_id, transcript_hash, json.loads(script)) for youtube_url_id, transcript_hash, script in rows]
+
+    async def _upload(self, upload: Uploader, youtube_url_id: int, transcript_hash: str, script: dict) -> bool:
+        try:
+            success = await upload(youtube_url_id, transcript_hash, script)
+        except Exception as e:
+            print(f"Cache upload failed: {e}")
+            success = False
+        if success:
+            self.mark_clean(youtube_url_id, transcript_hash)
+        return success
+
+    def write_behind(self, youtube_url_id: int, transcript_hash: str, script: dict, upload: Uploader) -> None:
+        """
+        Speichere lokal (dirty) und lade im Hintergrund nach Supabase hoch.
+
+        Muss im Event-Loop aufgerufen werden; flush() wartet auf ausstehende Uploads.
+        """
+        self.put(youtube_url_id, transcript_hash, script, dirty=True)
+        task = asyncio.create_task(self._upload(upload, youtube_url_id, transcript_hash, script))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def flush(self, upload: Uploader) -> int:
+        """
+        Warte auf laufende Uploads und versuche liegengebliebene erneut.
+
+        Returns:
+            Anzahl der Einträge, die weiterhin nicht hochgeladen sind
+        """
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+        remaining = 0
+        for youtube_url_id, transcript_hash, script in self.dirty_entries():
+            if not await self._upload(upload, youtube_url_id, transcript_hash, script):
+                remaining += 1
+        return remaining
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            entries, dirty = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(dirty), 0) FROM scripts"
+            ).fetchone()
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": entries,
+            "pending_uploads": dirty,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[ScriptCache] = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def get_script_cache() -> Optional[ScriptCache]:
+    """Prozessweiter Stufe-1-Cache (None wenn deaktiviert)."""
+    global _cache, _cache_loaded
+    with _cache_lock:
+        if not _cache_loaded:
+            _cache = ScriptCache.from_env()
+            _cache_loaded = True
+        return _cache
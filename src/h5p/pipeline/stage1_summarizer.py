@@ -2,22 +2,45 @@
 Stage 1: Transcript Summarizer
 
 Wandelt rohe YouTube-Untertitel in ein strukturiertes Lern-Skript um.
-- Entfernt Füllwörter und Wiederholungen
+- Entfernt Füllwörter und Wiederholungen (lokal vorab per normalize, Rest im Prompt)
 - Identifiziert Kernkonzepte mit Tags
 - Strukturiert in logische Abschnitte
-- Cached Ergebnisse in Supabase
+- Lange Transcripts: Map-Reduce über überlappende Fenster statt Kürzung
+- Cached Ergebnisse lokal (Speicher + Platte) und in Supabase (write-behind),
+  siehe script_cache
 """
 
+import asyncio
 import hashlib
 import json
 import os
-from typing import TypedDict
+import re
+from typing import Any, Callable, TypedDict
 
 import httpx
 
+from ..llm import chars_for_tokens, count_tokens, get_llm_client, scaled_max_tokens
+from .resources import resource_slot
+from .script_cache import get_script_cache
+from .normalize import normalize_transcript
+
 # Supabase Config
 SUPABASE_URL = os.getenv("SUPABASE_URL", "http://148.230.71.150:8000")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY", "")
+# Kurzer Timeout: bei langsamem Supabase lieber neu generieren
+SUPABASE_TIMEOUT = 5.0
+
+# Map-Reduce: Fenstergröße (Tokens, höchstens WINDOW_CHARS Zeichen) und Überlappung in Zeichen
+WINDOW_TOKENS = 5000
+WINDOW_CHARS = 18000
+WINDOW_OVERLAP_CHARS = 1500
+# Zusätzliche Versuche für fehlgeschlagene Fenster (HTTP-Retries macht schon der LLM-Client)
+WINDOW_RETRIES = 1
+
+# max_tokens proportional zur Eingabe statt pauschal
+SUMMARY_TOKEN_RATIO = 0.6
+SUMMARY_MIN_TOKENS = 1200
+SUMMARY_MAX_TOKENS = 3000
 
 
 class Concept(TypedDict):
@@ -113,6 +136,56 @@ REGELN:
 TRANSCRIPT:
 """
 
+WINDOW_NOTE = """
+HINWEIS: Dies ist Teil {index} von {total} eines langen Transcripts.
+Beschreibe nur die Inhalte dieses Teils; Titel und Zusammenfassung beziehen sich auf diesen Teil.
+"""
+
+REDUCE_PROMPT = """
+Du erhältst Titel, Zusammenfassungen und Abschnitte aufeinanderfolgender Teile
+eines langen Video-Transcripts.
+
+AUFGABE:
+Erstelle einen gemeinsamen Titel und eine Zusammenfassung für das gesamte Video.
+
+OUTPUT FORMAT (JSON):
+{
+  "title": "Prägnanter Titel des Themas",
+  "summary": "2-3 Sätze Zusammenfassung des Kerninhalts"
+}
+
+TEILE:
+"""
+
+# "Abschnitt 2: ..." - Nummerierung wird beim Zusammenführen neu vergeben
+SECTION_NUMBER_PATTERN = re.compile(r"^\s*(abschnitt|teil|section)\s*\d+\s*[:.\-–]\s*", re.IGNORECASE)
+
+
+_supabase_client: httpx.AsyncClient | None = None
+_supabase_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_supabase_client() -> httpx.AsyncClient:
+    """Geteilter Client pro Event-Loop (Connection-Reuse statt neuem Client je Call)."""
+    global _supabase_client, _supabase_loop
+    loop = asyncio.get_running_loop()
+    if _supabase_client is None or _supabase_loop is not loop:
+        if _supabase_client is not None and _supabase_loop.is_running():
+            # Client eines Loops in einem anderen Thread, dort schließen
+            asyncio.run_coroutine_threadsafe(_supabase_client.aclose(), _supabase_loop)
+        _supabase_client = httpx.AsyncClient()
+        _supabase_loop = loop
+    return _supabase_client
+
+
+async def close_supabase_client() -> None:
+    """Schließe den geteilten Supabase-Client (vor dem Ende des Event-Loops)."""
+    global _supabase_client, _supabase_loop
+    if _supabase_client is not None:
+        await _supabase_client.aclose()
+        _supabase_client = None
+        _supabase_loop = None
+
 
 def compute_transcript_hash(transcript: str) -> str:
     """Berechne SHA256 Hash des Transcripts für Cache-Invalidierung"""
@@ -134,8 +207,8 @@ async def get_cached_script(youtube_url_id: int, transcript_hash: str) -> Struct
         return None
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
+        async with resource_slot("supabase"):
+            response = await _get_supabase_client().get(
                 f"{SUPABASE_URL}/rest/v1/structured_scripts",
                 params={
                     "youtube_url_id": f"eq.{youtube_url_id}",
@@ -146,7 +219,7 @@ async def get_cached_script(youtube_url_id: int, transcript_hash: str) -> Struct
                     "apikey": SUPABASE_KEY,
                     "Authorization": f"Bearer {SUPABASE_KEY}"
                 },
-                timeout=10.0
+                timeout=SUPABASE_TIMEOUT
             )
 
             if response.status_code == 200:
@@ -179,8 +252,8 @@ async def cache_script(
         return False
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        async with resource_slot("supabase"):
+            response = await _get_supabase_client().post(
                 f"{SUPABASE_URL}/rest/v1/structured_scripts",
                 json={
                     "youtube_url_id": youtube_url_id,
@@ -194,7 +267,7 @@ async def cache_script(
                     "Content-Type": "application/json",
                     "Prefer": "return=minimal"
                 },
-                timeout=10.0
+                timeout=SUPABASE_TIMEOUT
             )
 
             return response.status_code in (200, 201)
@@ -203,65 +276,245 @@ async def cache_script(
         return False
 
 
-async def call_openai(prompt: str, content: str) -> dict:
+async def call_openai(
+    prompt: str,
+    content: str,
+    on_item: Callable[[str, Any], None] | None = None
+) -> dict:
     """
     OpenAI API Call für Transcript-Zusammenfassung.
 
     Args:
         prompt: System/User Prompt
         content: Das Transcript
+        on_item: Optional - aktiviert Streaming, wird mit (array_key, element)
+            für jedes fertige Element eines Top-Level-Arrays aufgerufen
 
     Returns:
         Parsed JSON Response
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set")
-
-    # Transcript kürzen wenn zu lang
-    max_chars = 18000
-    if len(content) > max_chars:
-        content = content[:max_chars] + "\n\n[... gekürzt ...]"
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4o-mini",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Du antwortest ausschliesslich mit validem JSON. Keine Markdown-Codeblöcke."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt + content
-                    }
-                ],
-                "max_tokens": 3000,
-                "temperature": 0.5,  # Niedrigere Temperatur für konsistentere Struktur
-                "response_format": {"type": "json_object"}
-            },
-            timeout=60.0
-        )
+    client = get_llm_client()
+    options = dict(
+        max_tokens=scaled_max_tokens(
+            count_tokens(content), SUMMARY_TOKEN_RATIO, SUMMARY_MIN_TOKENS, SUMMARY_MAX_TOKENS
+        ),
+        temperature=0.5,  # Niedrigere Temperatur für konsistentere Struktur
+        timeout=60.0,
+        stage="stage1"
+    )
+    async with resource_slot("llm"):
+        if on_item is not None:
+            return await client.chat_json_stream(prompt + content, on_item=on_item, **options)
+        return await client.chat_json(prompt + content, **options)
+
+
+def split_transcript(
+    transcript: str,
+    window_chars: int | None = None,
+    overlap_chars: int | None = None
+) -> list[str]:
+    """
+    Teile ein Transcript in überlappende Fenster.
+
+    Die Fenstergröße richtet sich nach WINDOW_TOKENS (umgerechnet mit dem
+    Zeichen/Token-Verhältnis des Transcripts), höchstens WINDOW_CHARS.
+    Fenster enden bevorzugt an Zeilen- oder Satzgrenzen im letzten Fünftel,
+    das nächste Fenster beginnt overlap_chars davor an einer Wortgrenze.
+
+    Returns:
+        Liste der Fenster (ein Element, wenn das Transcript kurz genug ist)
+    """
+    window_chars = window_chars or min(WINDOW_CHARS, chars_for_tokens(transcript, WINDOW_TOKENS)) or WINDOW_CHARS
+    overlap_chars = overlap_chars or WINDOW_OVERLAP_CHARS
+
+    if len(transcript) <= window_chars:
+        return [transcript]
+
+    windows = []
+    start = 0
+    while start < len(transcript):
+        end = min(start + window_chars, len(transcript))
+        if end < len(transcript):
+            boundary = max(
+                transcript.rfind(sep, start + window_chars * 4 // 5, end)
+                for sep in ("\n", ". ", "? ", "! ")
+            )
+            if boundary > start:
+                end = boundary + 1
+
+        windows.append(transcript[start:end].strip())
+        if end >= len(transcript):
+            break
+
+        next_start = max(end - overlap_chars, start + 1)
+        space = transcript.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
 
-        if response.status_code != 200:
-            raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+    return windows
 
-        result = response.json()
-        content_str = result["choices"][0]["message"]["content"]
 
-        return json.loads(content_str)
+def _normalize(text: str) -> str:
+    return " ".join(str(text).casefold().split())
+
+
+def _dedupe(items: list) -> list:
+    """Entferne Duplikate (Groß-/Kleinschreibung egal), Reihenfolge bleibt."""
+    seen = set()
+    result = []
+    for item in items:
+        key = _normalize(item)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+
+def _concept_key(concept: dict) -> str:
+    fields = [concept.get("type", "")]
+    for field in ("term", "name", "item_a", "item_b", "statement", "example"):
+        if concept.get(field):
+            fields.append(concept[field])
+    return _normalize("|".join(str(f) for f in fields))
+
+
+def merge_scripts(
+    partials: list[dict],
+    title: str | None = None,
+    summary: str | None = None
+) -> StructuredScript:
+    """
+    Führe Teil-Skripte (Map-Ergebnisse) zu einem StructuredScript zusammen.
+
+    - Abschnitte mit gleichem Titel werden vereint, Nummerierung neu vergeben
+    - Konzepte, key_terms und visual_opportunities werden dedupliziert
+      (Überlappung der Fenster erzeugt Dubletten)
+
+    Args:
+        partials: Skripte der Fenster in Transcript-Reihenfolge
+        title: Gesamttitel (Default: Titel des ersten Teils)
+        summary: Gesamtzusammenfassung (Default: Teil-Zusammenfassungen verbunden)
+    """
+    sections: dict[str, dict] = {}
+    numbered: dict[str, bool] = {}
+    seen_concepts: dict[str, set] = {}
+
+    for partial in partials:
+        for section in partial.get("sections", []):
+            raw_title = section.get("title", "")
+            plain_title = SECTION_NUMBER_PATTERN.sub("", raw_title).strip() or raw_title
+            key = _normalize(plain_title)
+
+            if key not in sections:
+                sections[key] = {**section, "title": plain_title, "concepts": []}
+                numbered[key] = plain_title != raw_title
+                seen_concepts[key] = set()
+
+            for concept in section.get("concepts", []):
+                concept_key = _concept_key(concept)
+                if concept_key not in seen_concepts[key]:
+                    seen_concepts[key].add(concept_key)
+                    sections[key]["concepts"].append(concept)
+
+    merged_sections = []
+    for number, (key, section) in enumerate(sections.items(), start=1):
+        if numbered[key]:
+            section["title"] = f"Abschnitt {number}: {section['title']}"
+        merged_sections.append(section)
+
+    return {
+        "title": title or next((p["title"] for p in partials if p.get("title")), "Lernmodul"),
+        "summary": summary or " ".join(p.get("summary", "") for p in partials if p.get("summary")),
+        "sections": merged_sections,
+        "key_terms": _dedupe([t for p in partials for t in p.get("key_terms", [])]),
+        "visual_opportunities": _dedupe([v for p in partials for v in p.get("visual_opportunities", [])]),
+    }
+
+
+async def summarize_windows(
+    transcript: str,
+    on_section: Callable[[dict], None] | None = None
+) -> StructuredScript:
+    """
+    Map-Reduce Zusammenfassung für beliebig lange Transcripts.
+
+    Map: Jedes Fenster wird parallel zusammengefasst (begrenzt durch das
+    "llm" Ressourcen-Limit). Reduce: Abschnitte/Begriffe werden lokal
+    zusammengeführt, Titel und Zusammenfassung per kleinem LLM-Call.
+    Kurze Transcripts brauchen genau einen Call wie bisher.
+
+    Fehlgeschlagene Fenster werden bis zu WINDOW_RETRIES mal wiederholt.
+    Fehlen danach noch Fenster, enthält das Ergebnis "_missing_windows"
+    (Anzahl); summarize_transcript entfernt den Schlüssel und cached
+    das unvollständige Skript nicht.
+
+    Mit on_section wird gestreamt und jeder fertige Abschnitt gemeldet.
+    """
+    on_item = None
+    if on_section is not None:
+        def on_item(key: str, item: Any):
+            if key == "sections" and isinstance(item, dict):
+                on_section(item)
+
+    windows = split_transcript(transcript)
+    if len(windows) == 1:
+        return await call_openai(SUMMARIZER_PROMPT, transcript, on_item=on_item)
+
+    def summarize_window(i: int, on_item=None):
+        return call_openai(
+            SUMMARIZER_PROMPT + WINDOW_NOTE.format(index=i + 1, total=len(windows)),
+            windows[i],
+            on_item=on_item
+        )
+
+    print(f"Long transcript: summarizing {len(windows)} windows...")
+    results = await asyncio.gather(
+        *(summarize_window(i, on_item) for i in range(len(windows))),
+        return_exceptions=True
+    )
+
+    for _ in range(WINDOW_RETRIES):
+        failed = [i for i, r in enumerate(results) if not isinstance(r, dict)]
+        if not failed:
+            break
+        print(f"Retrying {len(failed)} of {len(windows)} windows: {results[failed[0]]}")
+        # Ohne Streaming: Abschnitte des ersten Versuchs wurden evtl. schon gemeldet
+        retried = await asyncio.gather(*(summarize_window(i) for i in failed), return_exceptions=True)
+        for i, result in zip(failed, retried):
+            results[i] = result
+
+    partials = [r for r in results if isinstance(r, dict)]
+    failed = [r for r in results if not isinstance(r, dict)]
+    if not partials:
+        raise failed[0]
+    if failed:
+        print(f"{len(failed)} of {len(windows)} windows failed, script is incomplete: {failed[0]}")
+
+    overview = [
+        {
+            "title": p.get("title", ""),
+            "summary": p.get("summary", ""),
+            "sections": [s.get("title", "") for s in p.get("sections", [])]
+        }
+        for p in partials
+    ]
+    try:
+        reduced = await call_openai(REDUCE_PROMPT, json.dumps(overview, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(f"Reduce step failed, using partial titles: {e}")
+        reduced = {}
+
+    merged = merge_scripts(partials, title=reduced.get("title"), summary=reduced.get("summary"))
+    if failed:
+        merged["_missing_windows"] = len(failed)
+    return merged
 
 
 async def summarize_transcript(
     transcript: str,
     youtube_url_id: int | None = None,
-    force: bool = False
+    force: bool = False,
+    on_section: Callable[[dict], None] | None = None,
+    normalize: bool = True
 ) -> StructuredScript:
     """
     Hauptfunktion: Wandle Transcript in strukturiertes Skript um.
@@ -270,38 +523,82 @@ async def summarize_transcript(
         transcript: Rohe YouTube-Untertitel
         youtube_url_id: Optional, für Caching in Supabase
         force: Ignoriere Cache und generiere neu
+        on_section: Optional - streamt die Antwort und meldet jeden fertigen
+            Abschnitt, sobald er generiert ist
+        normalize: Zeitstempel, Caption-Duplikate, Füllwörter und Boilerplate
+            vor dem LLM-Call lokal entfernen
 
     Returns:
         StructuredScript mit Abschnitten, Konzepten, Key Terms
     """
-    transcript_hash = compute_transcript_hash(transcript)
+    # 1. Lokale Normalisierung (spart Input-Tokens)
+    llm_input = transcript
+    if normalize:
+        llm_input, stats = normalize_transcript(transcript)
+        print(
+            f"Normalized transcript: {stats['chars_before']} -> {stats['chars_after']} chars, "
+            f"~{stats['tokens_before'] - stats['tokens_after']} tokens saved ({stats['saved_percent']}%)"
+        )
 
-    # 1. Cache prüfen (wenn nicht force)
+    # Hash über den tatsächlichen LLM-Input: normalisierte und rohe Läufe
+    # bekommen getrennte Cache-Einträge
+    transcript_hash = compute_transcript_hash(llm_input)
+    local_cache = get_script_cache()
+
+    # 2. Cache prüfen (wenn nicht force): lokal, dann Supabase
     if not force and youtube_url_id:
+        if local_cache is not None:
+            cached = local_cache.get(youtube_url_id, transcript_hash)
+            if cached:
+                print(f"Using locally cached script for youtube_url_id={youtube_url_id}")
+                return cached
+
         cached = await get_cached_script(youtube_url_id, transcript_hash)
         if cached:
             print(f"Using cached script for youtube_url_id={youtube_url_id}")
+            if local_cache is not None:
+                local_cache.put(youtube_url_id, transcript_hash, cached)
             return cached
 
-    # 2. OpenAI Call
+    # 3. OpenAI Call(s) - Map-Reduce bei langen Transcripts
     print("Calling OpenAI for transcript summarization...")
-    result = await call_openai(SUMMARIZER_PROMPT, transcript)
+    result = await summarize_windows(llm_input, on_section=on_section)
+    missing_windows = result.pop("_missing_windows", 0)
 
-    # 3. Validierung
+    # 4. Validierung
     required_fields = ["title", "summary", "sections", "key_terms"]
     for field in required_fields:
         if field not in result:
             raise ValueError(f"Missing required field in response: {field}")
 
-    # 4. Cache speichern
-    if youtube_url_id:
-        success = await cache_script(youtube_url_id, transcript_hash, result)
-        if success:
-            print(f"Cached script for youtube_url_id={youtube_url_id}")
+    # 5. Cache speichern (lokal sofort, Supabase im Hintergrund);
+    #    unvollständige Skripte nie, der nächste Lauf soll es erneut versuchen
+    if missing_windows:
+        print(f"Not caching script: {missing_windows} window(s) missing")
+    elif youtube_url_id:
+        if local_cache is not None:
+            local_cache.write_behind(youtube_url_id, transcript_hash, result, cache_script)
+        else:
+            success = await cache_script(youtube_url_id, transcript_hash, result)
+            if success:
+                print(f"Cached script for youtube_url_id={youtube_url_id}")
 
     return result
 
 
+async def flush_script_cache() -> int:
+    """
+    Warte auf ausstehende Supabase-Uploads des lokalen Caches.
+
+    Returns:
+        Anzahl der Skripte, die weiterhin nur lokal gespeichert sind
+    """
+    local_cache = get_script_cache()
+    if local_cache is None:
+        return 0
+    return await local_cache.flush(cache_script)
+
+
 # Für direkten Aufruf
 if __name__ == "__main__":
     import asyncio
@@ -8,11 +8,10 @@ Plant die didaktische Reihenfolge und whlt Content-Types basierend auf:
 """
 
 import json
-import os
-from typing import TypedDict
-
-import httpx
+from typing import Any, Callable, TypedDict
 
+from ..llm import get_llm_client
+from .resources import resource_slot
 from ..config.milestones import (
     get_milestone_config,
     format_content_types_for_prompt,
@@ -172,54 +171,29 @@ STRUKTURIERTES SKRIPT:
 """
 
 
-async def call_openai(prompt: str, content: str) -> dict:
+async def call_openai(
+    prompt: str,
+    content: str,
+    on_item: Callable[[str, Any], None] | None = None
+) -> dict:
     """
     OpenAI API Call fuer Lernpfad-Planung.
 
     Args:
         prompt: Der Planner-Prompt
         content: Das strukturierte Skript als JSON
+        on_item: Optional - aktiviert Streaming, wird mit (array_key, element)
+            fuer jedes fertige Element eines Top-Level-Arrays aufgerufen
 
     Returns:
         Parsed JSON Response mit Lernpfad
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set")
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4o-mini",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Du antwortest ausschliesslich mit validem JSON. Keine Markdown-Codeblcke."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt + content
-                    }
-                ],
-                "max_tokens": 3000,
-                "temperature": 0.6,
-                "response_format": {"type": "json_object"}
-            },
-            timeout=60.0
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
-
-        result = response.json()
-        content_str = result["choices"][0]["message"]["content"]
-
-        return json.loads(content_str)
+    client = get_llm_client()
+    options = dict(max_tokens=3000, temperature=0.6, timeout=60.0, stage="stage2")
+    async with resource_slot("llm"):
+        if on_item is not None:
+            return await client.chat_json_stream(prompt + content, on_item=on_item, **options)
+        return await client.chat_json(prompt + content, **options)
 
 
 def validate_learning_path(
@@ -280,7 +254,9 @@ def validate_learning_path(
 
 async def plan_learning_path(
     structured_script: dict,
-    milestone: str = "mvp"
+    milestone: str = "mvp",
+    on_activity: Callable[[dict], None] | None = None,
+    on_column: Callable[[dict], None] | None = None
 ) -> LearningPathPlan:
     """
     Hauptfunktion: Plane Lernpfad basierend auf strukturiertem Skript.
@@ -288,6 +264,10 @@ async def plan_learning_path(
     Args:
         structured_script: Output von Stage 1 (summarize_transcript)
         milestone: Milestone-Bezeichnung (mvp, 1.1, 1.2, 1.3)
+        on_activity: Optional - streamt die Antwort und meldet jede geplante
+            Aktivitaet, sobald sie (bzw. ihre Spalte) fertig generiert ist
+        on_column: Optional - streamt die Antwort und meldet jede Spalte,
+            sobald sie vollstaendig generiert ist
 
     Returns:
         LearningPathPlan mit geordneten Aktivitten und Content-Type Zuordnung
@@ -299,7 +279,28 @@ async def plan_learning_path(
     script_json = json.dumps(structured_script, indent=2, ensure_ascii=False)
 
     print(f"Planning learning path for milestone '{milestone}'...")
-    result = await call_openai(prompt, script_json)
+    on_item = None
+    if on_activity is not None or on_column is not None:
+        seen: set = set()
+
+        def report(activity: Any):
+            if not isinstance(activity, dict) or on_activity is None:
+                return
+            marker = activity.get("order") or json.dumps(activity, sort_keys=True)
+            if marker not in seen:
+                seen.add(marker)
+                on_activity(activity)
+
+        def on_item(key: str, item: Any):
+            if key == "learning_path":
+                report(item)
+            elif key == "columns" and isinstance(item, dict):
+                for activity in item.get("activities", []):
+                    report(activity)
+                if on_column is not None:
+                    on_column(item)
+
+    result = await call_openai(prompt, script_json, on_item=on_item)
 
     # Ensure legacy "learning_path" is present (flattened) even when LLM only returns columns
     if not result.get("learning_path") and result.get("columns"):
@@ -5,20 +5,73 @@ Generiert den konkreten H5P-Content für jede geplante Aktivität.
 - Nutzt den Brief aus Stage 2
 - Generiert type-spezifischen Content
 - Validiert gegen H5P-Schema
+- Optional: mehrere kleine Aktivitäten einer Spalte in einem Call
+  (generate_h5p_content_batch), ungültige Items werden einzeln nachgeneriert
 """
 
+import asyncio
 import json
-import os
-from typing import Any
-
-import httpx
+from typing import Any, Callable
 
+from ..llm import get_llm_client
+from .resources import resource_slot
 from ..config.content_types import (
     get_content_type_schema,
     get_llm_schema_for_prompt,
     validate_content
 )
 
+# Kleine Content-Types, die sich gut in einem gemeinsamen Call generieren lassen
+BATCHABLE_TYPES = {"truefalse", "blanks", "dragtext", "multichoice", "summary", "dialogcards"}
+BATCH_TOKENS_PER_ITEM = 900
+BATCH_MAX_TOKENS = 4000
+
+# Type-spezifische Hinweise
+TYPE_HINTS = {
+    "truefalse": """
+WICHTIG für TrueFalse:
+- "correct" muss ein boolean sein (true oder false)
+- Formuliere die Aussage so, dass sie eindeutig wahr ODER falsch ist
+- Vermeide "manchmal", "oft", "kann" - diese machen Aussagen mehrdeutig
+""",
+    "blanks": """
+WICHTIG für Blanks:
+- Markiere Lücken mit *Sternchen*, z.B.: "Das wichtigste Konzept ist *Machine Learning*"
+- 2-5 Lücken pro Text
+- Die Lücken-Wörter sollten Schlüsselbegriffe sein
+""",
+    "dragtext": """
+WICHTIG für DragText:
+- Markiere Drag-Wörter mit *Sternchen*, z.B.: "*KI* ist ein Teilbereich der *Informatik*"
+- 3-6 Drag-Wörter
+- Die Wörter werden zu Drag-Items
+""",
+    "multichoice": """
+WICHTIG für MultiChoice:
+- Genau EINE Antwort muss correct: true sein
+- 3-5 Antwortoptionen
+- Falsche Antworten sollten plausibel aber eindeutig falsch sein
+""",
+    "summary": """
+WICHTIG für Summary:
+- "statements" ist ein Array von Gruppen
+- Jede Gruppe hat genau EINE "correct" Aussage und 2-3 "wrong" Aussagen
+- Die richtige Aussage muss die wichtigste Kernaussage sein
+""",
+    "dialogcards": """
+WICHTIG für Dialogcards:
+- "front" = Begriff oder Frage (kurz)
+- "back" = Definition oder Antwort (kann länger sein)
+- 3-8 Karten
+""",
+    "accordion": """
+WICHTIG für Accordion:
+- "panels" = aufklappbare Abschnitte
+- Jedes Panel hat "title" und "content" (HTML erlaubt)
+- 2-6 Panels
+"""
+}
+
 
 def extract_relevant_concepts(
     structured_script: dict,
@@ -71,53 +124,7 @@ def get_generator_prompt(content_type: str, activity_brief: str) -> str:
     schema = get_llm_schema_for_prompt(content_type)
     schema_obj = get_content_type_schema(content_type)
 
-    # Type-spezifische Hinweise
-    type_hints = {
-        "truefalse": """
-WICHTIG für TrueFalse:
-- "correct" muss ein boolean sein (true oder false)
-- Formuliere die Aussage so, dass sie eindeutig wahr ODER falsch ist
-- Vermeide "manchmal", "oft", "kann" - diese machen Aussagen mehrdeutig
-""",
-        "blanks": """
-WICHTIG für Blanks:
-- Markiere Lücken mit *Sternchen*, z.B.: "Das wichtigste Konzept ist *Machine Learning*"
-- 2-5 Lücken pro Text
-- Die Lücken-Wörter sollten Schlüsselbegriffe sein
-""",
-        "dragtext": """
-WICHTIG für DragText:
-- Markiere Drag-Wörter mit *Sternchen*, z.B.: "*KI* ist ein Teilbereich der *Informatik*"
-- 3-6 Drag-Wörter
-- Die Wörter werden zu Drag-Items
-""",
-        "multichoice": """
-WICHTIG für MultiChoice:
-- Genau EINE Antwort muss correct: true sein
-- 3-5 Antwortoptionen
-- Falsche Antworten sollten plausibel aber eindeutig falsch sein
-""",
-        "summary": """
-WICHTIG für Summary:
-- "statements" ist ein Array von Gruppen
-- Jede Gruppe hat genau EINE "correct" Aussage und 2-3 "wrong" Aussagen
-- Die richtige Aussage muss die wichtigste Kernaussage sein
-""",
-        "dialogcards": """
-WICHTIG für Dialogcards:
-- "front" = Begriff oder Frage (kurz)
-- "back" = Definition oder Antwort (kann länger sein)
-- 3-8 Karten
-""",
-        "accordion": """
-WICHTIG für Accordion:
-- "panels" = aufklappbare Abschnitte
-- Jedes Panel hat "title" und "content" (HTML erlaubt)
-- 2-6 Panels
-"""
-    }
-
-    hint = type_hints.get(content_type, "")
+    hint = TYPE_HINTS.get(content_type, "")
 
     return f"""
 Generiere H5P-Content für den Typ: {content_type}
@@ -140,59 +147,37 @@ KONZEPTE AUS DEM SKRIPT:
 """
 
 
-async def call_openai(prompt: str, concepts_json: str) -> dict:
+async def call_openai(
+    prompt: str,
+    concepts_json: str,
+    on_item: Callable[[str, Any], None] | None = None,
+    max_tokens: int = 2000
+) -> dict:
     """
     OpenAI API Call für Content-Generierung.
 
     Args:
         prompt: Der Generator-Prompt
         concepts_json: Relevante Konzepte als JSON
+        on_item: Optional - aktiviert Streaming, wird mit (array_key, element)
+            für jedes fertige Element eines Top-Level-Arrays aufgerufen
+        max_tokens: Completion-Limit (Batch-Calls brauchen mehr)
 
     Returns:
         Parsed JSON Response mit H5P Content
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set")
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4o-mini",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Du antwortest ausschliesslich mit validem JSON. Keine Markdown-Codeblöcke."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt + concepts_json
-                    }
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.7,
-                "response_format": {"type": "json_object"}
-            },
-            timeout=45.0
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
-
-        result = response.json()
-        content_str = result["choices"][0]["message"]["content"]
-
-        return json.loads(content_str)
+    client = get_llm_client()
+    options = dict(max_tokens=max_tokens, temperature=0.7, timeout=45.0, stage="stage3")
+    async with resource_slot("llm"):
+        if on_item is not None:
+            return await client.chat_json_stream(prompt + concepts_json, on_item=on_item, **options)
+        return await client.chat_json(prompt + concepts_json, **options)
 
 
 async def generate_h5p_content(
     activity: dict,
-    structured_script: dict
+    structured_script: dict,
+    on_item: Callable[[str, Any], None] | None = None
 ) -> dict:
     """
     Hauptfunktion: Generiere H5P-Content für eine Aktivität.
@@ -200,20 +185,17 @@ async def generate_h5p_content(
     Args:
         activity: Eine Aktivität aus dem Lernpfad-Plan (Stage 2 Output)
         structured_script: Das strukturierte Skript (Stage 1 Output)
+        on_item: Optional - streamt die Antwort und meldet jedes fertige
+            Element (z.B. eine Frage) als (array_key, element)
 
     Returns:
         H5P-fähiger Content für den spezifischen Content-Type
     """
     content_type = activity["content_type"]
     brief = activity.get("brief", "")
-    concept_refs = activity.get("concept_refs", [])
 
     # 1. Extrahiere relevante Konzepte
-    concepts = extract_relevant_concepts(structured_script, concept_refs)
-
-    # Fallback: Wenn keine Konzepte gefunden, nutze key_terms
-    if not concepts:
-        concepts = [{"term": term} for term in structured_script.get("key_terms", [])]
+    concepts = activity_concepts(activity, structured_script)
 
     # 2. Generiere Prompt
     prompt = get_generator_prompt(content_type, brief)
@@ -221,7 +203,7 @@ async def generate_h5p_content(
 
     # 3. OpenAI Call
     print(f"Generating content for '{content_type}': {activity.get('order', '?')}...")
-    result = await call_openai(prompt, concepts_json)
+    result = await call_openai(prompt, concepts_json, on_item=on_item)
 
     # 4. Validierung
     is_valid, errors = validate_content(content_type, result)
@@ -231,44 +213,218 @@ async def generate_h5p_content(
             print(f"  - {error}")
 
     # 5. Füge Metadaten hinzu
+    return _with_meta(result, activity)
+
+
+def _with_meta(result: dict, activity: dict) -> dict:
     result["_meta"] = {
-        "content_type": content_type,
+        "content_type": activity["content_type"],
         "order": activity.get("order"),
-        "concept_refs": concept_refs,
+        "concept_refs": activity.get("concept_refs", []),
         "rationale": activity.get("rationale", "")
     }
-
     return result
 
 
+def activity_concepts(activity: dict, structured_script: dict) -> list[dict]:
+    """Relevante Konzepte einer Aktivität, Fallback auf die key_terms."""
+    concepts = extract_relevant_concepts(structured_script, activity.get("concept_refs", []))
+    if not concepts:
+        concepts = [{"term": term} for term in structured_script.get("key_terms", [])]
+    return concepts
+
+
+def get_batch_prompt(activities: list[dict]) -> str:
+    """
+    Prompt für mehrere Aktivitäten in einem Call.
+
+    Die Konzepte aller Aktivitäten werden einmal gemeinsam angehängt, die
+    Antwort enthält ein Item pro Aktivität (über "index" zugeordnet).
+    """
+    tasks = []
+    for index, activity in enumerate(activities):
+        content_type = activity["content_type"]
+        schema_obj = get_content_type_schema(content_type)
+        tasks.append(f"""
+### AKTIVITÄT {index}: {content_type}
+{schema_obj['description']}
+
+AUFGABE:
+{activity.get("brief", "")}
+
+OUTPUT SCHEMA (content):
+{get_llm_schema_for_prompt(content_type)}
+{TYPE_HINTS.get(content_type, "")}""")
+
+    return f"""
+Generiere H5P-Content für {len(activities)} Aktivitäten.
+{"".join(tasks)}
+OUTPUT FORMAT:
+{{"items": [{{"index": 0, "content": {{...}}}}, {{"index": 1, "content": {{...}}}}]}}
+- Genau ein Item pro Aktivität, "index" wie oben angegeben
+- "content" folgt exakt dem Schema der jeweiligen Aktivität
+
+REGELN:
+- Deutsche Sprache
+- Keine Emojis
+- Korrekte Antworten müssen eindeutig sein
+- Die Aktivitäten sollen sich inhaltlich nicht wiederholen
+
+KONZEPTE AUS DEM SKRIPT:
+"""
+
+
+async def generate_h5p_content_batch(
+    activities: list[dict],
+    structured_script: dict
+) -> list[dict]:
+    """
+    Generiere Content für mehrere Aktivitäten (einer Spalte) in einem LLM-Call.
+
+    Spart den wiederholten Prompt-Kopf und Konzept-Kontext pro Aktivität.
+    Nicht bündelbare Typen sowie Items, die fehlen oder validate_content nicht
+    bestehen, werden einzeln per generate_h5p_content generiert - nacheinander,
+    denn der Aufrufer hält für den ganzen Batch nur einen Concurrency-Slot.
+
+    Args:
+        activities: Aktivitäten aus dem Lernpfad-Plan (Stage 2 Output)
+        structured_script: Das strukturierte Skript (Stage 1 Output)
+
+    Returns:
+        Content pro Aktivität in gleicher Reihenfolge; Fehler einzelner
+        Aktivitäten als {"_error", "_activity"}
+    """
+    results: list[dict | None] = [None] * len(activities)
+    positions = [i for i, a in enumerate(activities) if a.get("content_type") in BATCHABLE_TYPES]
+
+    if len(positions) > 1:
+        group = [activities[i] for i in positions]
+        concepts: list[dict] = []
+        for activity in group:
+            for concept in activity_concepts(activity, structured_script):
+                if concept not in concepts:
+                    concepts.append(concept)
+
+        print(f"Generating batched content for orders {[a.get('order', '?') for a in group]}...")
+        try:
+            response = await call_openai(
+                get_batch_prompt(group),
+                json.dumps(concepts, indent=2, ensure_ascii=False),
+                max_tokens=min(BATCH_MAX_TOKENS, BATCH_TOKENS_PER_ITEM * len(group))
+            )
+            items = response.get("items", [])
+        except Exception as e:
+            print(f"WARNING: Batched generation failed, falling back to single calls: {e}")
+            items = []
+
+        for position, item in enumerate(items if isinstance(items, list) else []):
+            if not isinstance(item, dict) or not isinstance(item.get("content"), dict):
+                continue
+            index = item.get("index", position)
+            if not isinstance(index, int) or not 0 <= index < len(group) or results[positions[index]] is not None:
+                continue
+            activity = group[index]
+            is_valid, errors = validate_content(activity["content_type"], item["content"])
+            if is_valid:
+                results[positions[index]] = _with_meta(item["content"], activity)
+            else:
+                print(f"WARNING: Batched {activity['content_type']} {activity.get('order')} invalid, regenerating: {errors}")
+
+    async def _single(activity: dict) -> dict:
+        try:
+            return await generate_h5p_content(activity, structured_script)
+        except Exception as e:
+            print(f"ERROR generating content for activity {activity.get('order')}: {e}")
+            return {"_error": str(e), "_activity": activity}
+
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = await _single(activities[i])
+    return results
+
+
+def batch_groups(learning_path: dict, batch_size: int) -> list[list[int]]:
+    """
+    Positionen (in "learning_path") der gemeinsam zu generierenden Aktivitäten.
+
+    Gruppiert wird nur innerhalb einer Spalte, in Plan-Reihenfolge zu je
+    höchstens batch_size; alles andere bleibt eine Einzelgruppe.
+    """
+    activities = learning_path.get("learning_path", [])
+    if batch_size <= 1:
+        return [[i] for i in range(len(activities))]
+
+    position = {a.get("order"): i for i, a in enumerate(activities) if a.get("order") is not None}
+    groups: list[list[int]] = []
+    grouped: set[int] = set()
+    for column in learning_path.get("columns", []):
+        members = [position[a.get("order")] for a in column.get("activities", []) if a.get("order") in position]
+        members = [i for i in dict.fromkeys(members) if i not in grouped]
+        for start in range(0, len(members), batch_size):
+            groups.append(members[start:start + batch_size])
+        grouped.update(members)
+    groups += [[i] for i in range(len(activities)) if i not in grouped]
+    return sorted(groups, key=lambda group: group[0])
+
+
 async def generate_all_content(
     learning_path: dict,
-    structured_script: dict
+    structured_script: dict,
+    max_concurrency: int = 1,
+    on_item: Callable[[dict, str, Any], None] | None = None,
+    batch_size: int = 1
 ) -> list[dict]:
     """
     Generiere Content für alle Aktivitäten im Lernpfad.
 
+    Die Aktivitäten werden parallel generiert, begrenzt durch max_concurrency.
+    Die Reihenfolge der Ergebnisse entspricht immer der Reihenfolge im Plan.
+
     Args:
         learning_path: Output von Stage 2 (plan_learning_path)
         structured_script: Output von Stage 1 (summarize_transcript)
+        max_concurrency: Maximale Anzahl gleichzeitiger LLM-Calls (1 = sequentiell)
+        on_item: Optional - streamt die Antworten, wird mit
+            (activity, array_key, element) für jedes fertige Element aufgerufen
+            (nur Einzel-Calls, gebündelte Calls werden nicht gestreamt)
+        batch_size: Bis zu so viele Aktivitäten einer Spalte in einem Call
+            generieren (1 = jede Aktivität einzeln)
 
     Returns:
         Liste von H5P-Content Objekten
     """
     activities = learning_path.get("learning_path", [])
-    results = []
-
-    for activity in activities:
-        try:
-            content = await generate_h5p_content(activity, structured_script)
-            results.append(content)
-        except Exception as e:
-            print(f"ERROR generating content for activity {activity.get('order')}: {e}")
-            results.append({
-                "_error": str(e),
-                "_activity": activity
-            })
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _generate(activity: dict) -> dict:
+        async with semaphore:
+            try:
+                if on_item is None:
+                    return await generate_h5p_content(activity, structured_script)
+                return await generate_h5p_content(
+                    activity,
+                    structured_script,
+                    on_item=lambda key, item: on_item(activity, key, item)
+                )
+            except Exception as e:
+                print(f"ERROR generating content for activity {activity.get('order')}: {e}")
+                return {
+                    "_error": str(e),
+                    "_activity": activity
+                }
 
+    async def _generate_group(group: list[int]) -> list[dict]:
+        if len(group) == 1:
+            return [await _generate(activities[group[0]])]
+        async with semaphore:
+            return await generate_h5p_content_batch([activities[i] for i in group], structured_script)
+
+    # Ergebnisse zurück in Plan-Reihenfolge
+    groups = batch_groups(learning_path, batch_size)
+    results: list[dict] = [{}] * len(activities)
+    for group, contents in zip(groups, await asyncio.gather(*(_generate_group(g) for g in groups))):
+        for i, content in zip(group, contents):
+            results[i] = content
     return results
 
 
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Batch H5P Learning Path Pipeline
+
+Runs many 3-stage pipelines (run_full_pipeline) in one process and event loop:
+- Video IDs from --ids, --id-range or a Supabase PostgREST filter (--query)
+- Global concurrency caps per resource (LLM, Supabase, Moodle import)
+- One JSON line per finished video, written as soon as it completes
+
+Usage:
+    python src/h5p/run_batch.py --id-range 100-150 --videos 4 --results-file results.jsonl
+    python src/h5p/run_batch.py --query "title=ilike.*KI*" --limit 50
+"""
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional, TextIO
+
+import click
+import httpx
+from dotenv import load_dotenv
+
+# Load environment early
+load_dotenv()
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.h5p.run_pipeline import close_async_clients, run_full_pipeline, log_info, log_progress, report_llm_usage
+from src.h5p.config.milestones import MILESTONE_CONFIGS
+from src.h5p.pipeline.resources import configure_limits, resource_slot
+from src.h5p.moodle_import import configure_import_pool
+from src.h5p.builders import get_build_cache
+from src.h5p.transcript_store import fetch_youtube_rows_async, get_transcript_store
+from src.h5p.pipeline.script_cache import get_script_cache
+from src.h5p.tracing import configure_tracing, get_tracer
+
+
+def parse_ids(ids: Optional[str], id_range: Optional[str]) -> list[int]:
+    """
+    Parse --ids ("1,2,3") and --id-range ("100-150", inclusive) into a sorted ID list.
+    """
+    result: set[int] = set()
+
+    if ids:
+        for part in ids.split(","):
+            part = part.strip()
+            if part:
+                result.add(int(part))
+
+    if id_range:
+        start, _, end = id_range.partition("-")
+        if not end:
+            raise click.BadParameter("Expected format START-END", param_hint="--id-range")
+        result.update(range(int(start), int(end) + 1))
+
+    return sorted(result)
+
+
+async def fetch_youtube_url_ids(query: str, limit: Optional[int] = None) -> list[int]:
+    """
+    Resolve a PostgREST filter on youtube_urls to a list of IDs.
+
+    Args:
+        query: Raw PostgREST filter, e.g. "title=ilike.*KI*&created_at=gte.2025-01-01"
+        limit: Optional maximum number of IDs
+
+    Returns:
+        IDs ordered ascending; only rows with subtitles are returned
+    """
+    supabase_url = os.environ.get("SUPABASE_URL", "http://148.230.71.150:8000")
+    supabase_key = os.environ.get("SUPABASE_SERVICE_KEY", os.environ.get("SUPABASE_ANON_KEY", ""))
+
+    url = f"{supabase_url}/rest/v1/youtube_urls?select=id&subtitles=not.is.null&order=id.asc"
+    if query:
+        url += f"&{query.lstrip('&?')}"
+    if limit:
+        url += f"&limit={limit}"
+
+    headers = {
+        "apikey": supabase_key,
+        "Authorization": f"Bearer {supabase_key}"
+    }
+
+    async with resource_slot("supabase"), httpx.AsyncClient() as client:
+        resp = await client.get(url, headers=headers, timeout=30.0)
+        resp.raise_for_status()
+        data = resp.json()
+
+    return [row["id"] for row in data]
+
+
+async def prefetch_youtube_rows(youtube_url_ids: list[int]) -> dict[int, dict]:
+    """
+    Bulk-fetch the youtube_urls rows of all videos (id=in.(...) pages).
+
+    Rows go through the local transcript store, so unchanged transcripts are
+    not downloaded again.
+    """
+    supabase_url = os.environ.get("SUPABASE_URL", "http://148.230.71.150:8000")
+    supabase_key = os.environ.get("SUPABASE_SERVICE_KEY", os.environ.get("SUPABASE_ANON_KEY", ""))
+
+    async with resource_slot("supabase"):
+        return await fetch_youtube_rows_async(youtube_url_ids, supabase_url, supabase_key)
+
+
+async def run_batch(
+    youtube_url_ids: list[int],
+    results_stream: TextIO,
+    milestone: str = "mvp",
+    video_concurrency: int = 4,
+    llm_concurrency: int = 8,
+    supabase_concurrency: int = 4,
+    moodle_concurrency: int = 1,
+    stage3_concurrency: int = 4,
+    stage3_batch_size: int = 1,
+    skip_cache: bool = False,
+    output_dir: str = "/tmp/h5p_pipeline"
+) -> dict:
+    """
+    Run the full pipeline for many videos in one event loop.
+
+    Args:
+        youtube_url_ids: Supabase IDs of the videos
+        results_stream: Writable text stream for the per-video JSON lines
+        milestone: Milestone config to use for every video
+        video_concurrency: Max pipelines running at the same time
+        llm_concurrency: Max LLM calls in flight across all pipelines
+        supabase_concurrency: Max Supabase requests in flight
+        moodle_concurrency: Max Moodle imports in flight
+        stage3_concurrency: Max parallel Stage 3 calls per pipeline
+        stage3_batch_size: Activities of a column generated per LLM call (1 = off)
+        skip_cache: Ignore cached structured scripts
+        output_dir: Base directory; each video gets its own subdirectory
+
+    Returns:
+        Summary dict with counts and total duration
+    """
+    configure_limits(
+        llm=llm_concurrency,
+        supabase=supabase_concurrency,
+        moodle=moodle_concurrency
+    )
+    configure_import_pool(moodle_concurrency)
+    video_slots = asyncio.Semaphore(max(1, video_concurrency))
+    batch_start = time.monotonic()
+
+    # One bulk fetch instead of one Supabase request per video
+    try:
+        with get_tracer().span("fetch.bulk", requested=len(youtube_url_ids)) as span:
+            rows = await prefetch_youtube_rows(youtube_url_ids)
+            span.set(found=len(rows))
+        log_progress("Prefetched transcripts", requested=len(youtube_url_ids), found=len(rows))
+    except Exception as e:
+        log_info(f"Bulk transcript fetch failed, fetching per video: {e}")
+        rows = {}
+
+    async def _run_one(youtube_url_id: int) -> dict:
+        async with video_slots:
+            start = time.monotonic()
+            try:
+                result = await run_full_pipeline(
+                    youtube_url_id=youtube_url_id,
+                    milestone=milestone,
+                    courseid=None,
+                    create_course=True,
+                    skip_cache=skip_cache,
+                    output_dir=os.path.join(output_dir, str(youtube_url_id)),
+                    stage3_concurrency=stage3_concurrency,
+                    stage3_batch_size=stage3_batch_size,
+                    yt_data=rows.get(youtube_url_id)
+                )
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+
+            return {
+                "youtube_url_id": youtube_url_id,
+                "status": result.get("status", "error"),
+                "duration_s": round(time.monotonic() - start, 2),
+                "result": result
+            }
+
+    tasks = [asyncio.create_task(_run_one(yid)) for yid in youtube_url_ids]
+    successful = 0
+    done = 0
+
+    for finished in asyncio.as_completed(tasks):
+        record = await finished
+        done += 1
+        if record["status"] == "success":
+            successful += 1
+
+        results_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        results_stream.flush()
+
+        log_progress(
+            f"Finished youtube_url_id={record['youtube_url_id']}",
+            status=record["status"],
+            duration_s=record["duration_s"],
+            done=done,
+            total=len(youtube_url_ids)
+        )
+
+    return {
+        "total": len(youtube_url_ids),
+        "successful": successful,
+        "failed": len(youtube_url_ids) - successful,
+        "duration_s": round(time.monotonic() - batch_start, 2)
+    }
+
+
+@click.command()
+@click.option("--ids", default=None, help="Comma-separated youtube_urls.id list")
+@click.option("--id-range", default=None, help="Inclusive ID range, e.g. 100-150")
+@click.option("--query", default=None, help="PostgREST filter on youtube_urls, e.g. 'title=ilike.*KI*'")
+@click.option("--limit", type=int, default=None, help="Max IDs to take from --query")
+@click.option(
+    "--milestone",
+    type=click.Choice(list(MILESTONE_CONFIGS.keys())),
+    default="mvp",
+    help="Milestone configuration to use"
+)
+@click.option("--videos", "video_concurrency", type=int, default=4, help="Max pipelines running in parallel")
+@click.option("--llm-concurrency", type=int, default=8, help="Max LLM calls in flight across all videos")
+@click.option("--supabase-concurrency", type=int, default=4, help="Max Supabase requests in flight")
+@click.option("--moodle-concurrency", type=int, default=1, help="Max parallel Moodle imports (one import worker each)")
+@click.option("--stage3-concurrency", type=int, default=4, help="Max parallel LLM calls in Stage 3 per video")
+@click.option("--stage3-batch-size", type=int, default=1, help="Generate up to N activities of a column in one LLM call (1 = off)")
+@click.option("--skip-cache", is_flag=True, help="Ignore cached structured scripts")
+@click.option("--output-dir", default="/tmp/h5p_pipeline", help="Base output directory for H5P files")
+@click.option("--results-file", default="-", help="JSON lines output file ('-' = stdout)")
+@click.option("--usage-report", default=None, help="Write per-call LLM token usage and latency to this JSON file")
+@click.option("--trace-file", default=None, help="Append tracing spans (fetch, stages, LLM calls, builds, imports) as JSON lines")
+@click.option("--trace-otlp-file", default=None, help="Append tracing spans in OpenTelemetry OTLP/JSON format")
+def main(
+    ids: Optional[str],
+    id_range: Optional[str],
+    query: Optional[str],
+    limit: Optional[int],
+    milestone: str,
+    video_concurrency: int,
+    llm_concurrency: int,
+    supabase_concurrency: int,
+    moodle_concurrency: int,
+    stage3_concurrency: int,
+    stage3_batch_size: int,
+    skip_cache: bool,
+    output_dir: str,
+    results_file: str,
+    usage_report: Optional[str],
+    trace_file: Optional[str],
+    trace_otlp_file: Optional[str]
+):
+    """
+    Batch mode for the 3-Stage H5P Learning Path Pipeline.
+
+    Writes one JSON line per video to --results-file and a summary to stderr.
+    """
+    configure_tracing(trace_file, otlp_path=trace_otlp_file)
+    # Stages print plain-text progress; keep the real stdout for results only
+    results_stdout = sys.stdout
+
+    async def _batch():
+        youtube_url_ids = parse_ids(ids, id_range)
+        if query:
+            youtube_url_ids = sorted(set(youtube_url_ids) | set(await fetch_youtube_url_ids(query, limit)))
+
+        if not youtube_url_ids:
+            raise click.UsageError("Provide --ids, --id-range or --query")
+
+        log_info(f"Batch: {len(youtube_url_ids)} videos, {video_concurrency} in parallel")
+
+        if results_file == "-":
+            return await run_batch(
+                youtube_url_ids,
+                results_stdout,
+                milestone=milestone,
+                video_concurrency=video_concurrency,
+                llm_concurrency=llm_concurrency,
+                supabase_concurrency=supabase_concurrency,
+                moodle_concurrency=moodle_concurrency,
+                stage3_concurrency=stage3_concurrency,
+                stage3_batch_size=stage3_batch_size,
+                skip_cache=skip_cache,
+                output_dir=output_dir
+            )
+
+        with open(results_file, "a", encoding="utf-8") as stream:
+            return await run_batch(
+                youtube_url_ids,
+                stream,
+                milestone=milestone,
+                video_concurrency=video_concurrency,
+                llm_concurrency=llm_concurrency,
+                supabase_concurrency=supabase_concurrency,
+                moodle_concurrency=moodle_concurrency,
+                stage3_concurrency=stage3_concurrency,
+                stage3_batch_size=stage3_batch_size,
+                skip_cache=skip_cache,
+                output_dir=output_dir
+            )
+
+    async def _run():
+        try:
+            return await _batch()
+        finally:
+            await close_async_clients()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        summary = asyncio.run(_run())
+    log_progress("Batch complete", **summary)
+
+    build_cache = get_build_cache()
+    if build_cache is not None:
+        log_progress("Build cache", **build_cache.stats())
+    transcript_store = get_transcript_store()
+    if transcript_store is not None:
+        log_progress("Transcript store", **transcript_store.stats())
+    script_cache = get_script_cache()
+    if script_cache is not None:
+        log_progress("Stage 1 cache", **script_cache.stats())
+    report_llm_usage(usage_report)
+    get_tracer().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Offline End-to-End Benchmark
+
+Drives run_full_pipeline (dry run: no Moodle import) over N synthetic videos
+and reports latency per stage (p50/p95/max) and throughput:
+- LLM calls go to the local mock server (started in-process, see
+  llm.mock_server) or to --base-url
+- Synthetic videos have no Supabase ID, so neither Supabase nor the Stage 1
+  script cache is involved
+- Cold by default: no LLM response cache, build cache bypassed (--warm keeps
+  both)
+
+Usage:
+    python src/h5p/run_benchmark.py --videos 20 --parallel 4 --latency-ms 400 --ms-per-token 5
+    python src/h5p/run_benchmark.py --videos 20 --stage3-batch-size 3 --rate-limit-rate 0.05 --report bench.json
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import click
+from dotenv import load_dotenv
+
+# Load environment early
+load_dotenv()
+
+# Add parent to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.h5p.run_pipeline import close_async_clients, run_full_pipeline, log_info, log_progress, report_llm_usage
+from src.h5p.config.milestones import MILESTONE_CONFIGS
+from src.h5p.pipeline.resources import configure_limits
+from src.h5p.builders import get_build_cache
+from src.h5p.llm import get_llm_client
+from src.h5p.llm.mock_server import MockLLMServer, load_fixtures
+from src.h5p.llm.usage import percentile
+from src.h5p.tracing import configure_tracing, get_tracer
+
+
+SENTENCES = [
+    "Machine Learning ist ein Teilbereich der künstlichen Intelligenz.",
+    "Ein Algorithmus lernt dabei Muster aus Trainingsdaten.",
+    "Zuerst werden Daten gesammelt und bereinigt.",
+    "Dann wird ein Modell auf diesen Daten trainiert.",
+    "Schließlich trifft das Modell Vorhersagen für neue Eingaben.",
+    "Im Gegensatz zur klassischen Programmierung werden die Regeln nicht von Hand geschrieben.",
+    "Ein bekanntes Beispiel ist die Spam-Erkennung in E-Mails.",
+    "Überwachtes Lernen nutzt Beispiele mit bekannten Antworten.",
+    "Beim unüberwachten Lernen sucht das Modell selbst nach Strukturen.",
+    "Die Qualität der Daten bestimmt die Qualität des Modells.",
+]
+
+
+def synthetic_video(index: int, chars: int) -> dict:
+    """A youtube_urls-like row with a deterministic synthetic transcript."""
+    rng = random.Random(index)
+    parts: list[str] = []
+    while sum(len(p) + 1 for p in parts) < chars:
+        parts.append(rng.choice(SENTENCES))
+    return {
+        "id": 0,
+        "title": f"Benchmark-Video {index + 1}",
+        "subtitles": " ".join(parts),
+        "url": f"https://www.youtube.com/watch?v=benchmark{index + 1}",
+    }
+
+
+def summarize_timings(values: list[float]) -> dict:
+    """Count, p50, p95 and max of a list of durations (seconds)."""
+    return {
+        "count": len(values),
+        "p50_s": round(percentile(values, 50), 3),
+        "p95_s": round(percentile(values, 95), 3),
+        "max_s": round(max(values), 3) if values else 0.0,
+    }
+
+
+async def run_benchmark(
+    videos: int,
+    parallel: int = 4,
+    milestone: str = "mvp",
+    stage3_concurrency: int = 4,
+    stage3_batch_size: int = 1,
+    llm_concurrency: Optional[int] = None,
+    transcript_chars: int = 6000,
+    stream: bool = False,
+    output_dir: Optional[str] = None
+) -> dict:
+    """
+    Run N synthetic videos through the pipeline (dry run) and aggregate timings.
+
+    The LLM endpoint must already be configured (LLM_BASE_URL / mock server).
+
+    Returns:
+        Report with per-stage latency, throughput and per-video results
+    """
+    configure_limits(llm=llm_concurrency)
+    output_dir = output_dir or tempfile.mkdtemp(prefix="h5p_benchmark_")
+    slots = asyncio.Semaphore(max(1, parallel))
+
+    async def _run_one(index: int) -> dict:
+        async with slots:
+            started = time.monotonic()
+            try:
+                result = await run_full_pipeline(
+                    youtube_url_id=0,
+                    milestone=milestone,
+                    courseid=None,
+                    create_course=False,
+                    skip_cache=True,
+                    output_dir=os.path.join(output_dir, str(index + 1)),
+                    stage3_concurrency=stage3_concurrency,
+                    stage3_batch_size=stage3_batch_size,
+                    stream=stream,
+                    yt_data=synthetic_video(index, transcript_chars),
+                    dry_run=True
+                )
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            return {**result, "duration_s": round(time.monotonic() - started, 3)}
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(_run_one(i) for i in range(videos)))
+    wall_s = time.monotonic() - started
+
+    stages: dict[str, list[float]] = {}
+    for result in results:
+        for stage, values in result.get("timings", {}).items():
+            stages.setdefault(stage, []).extend(values)
+
+    activities = sum(result.get("total_activities", 0) for result in results)
+    packages = sum(1 for result in results for a in result.get("activities", []) if a.get("h5p_path"))
+    successful = sum(1 for result in results if result.get("status") == "success")
+
+    return {
+        "videos": videos,
+        "successful": successful,
+        "failed": videos - successful,
+        "wall_s": round(wall_s, 3),
+        "throughput": {
+            "videos_per_min": round(videos / wall_s * 60, 2) if wall_s else 0.0,
+            "activities_per_s": round(activities / wall_s, 2) if wall_s else 0.0,
+            "packages_per_s": round(packages / wall_s, 2) if wall_s else 0.0,
+        },
+        "stages": {stage: summarize_timings(values) for stage, values in sorted(stages.items())},
+        "errors": [result.get("message") for result in results if result.get("status") != "success"],
+    }
+
+
+@click.command()
+@click.option("--videos", type=int, default=10, help="Number of synthetic videos")
+@click.option("--parallel", type=int, default=4, help="Videos running in parallel")
+@click.option(
+    "--milestone",
+    type=click.Choice(list(MILESTONE_CONFIGS.keys())),
+    default="mvp",
+    help="Milestone configuration to use"
+)
+@click.option("--stage3-concurrency", type=int, default=4, help="Max parallel LLM calls in Stage 3 per video")
+@click.option("--stage3-batch-size", type=int, default=1, help="Generate up to N activities of a column in one LLM call (1 = off)")
+@click.option("--llm-concurrency", type=int, default=None, help="Max LLM calls in flight across all videos")
+@click.option("--transcript-chars", type=int, default=6000, help="Length of each synthetic transcript")
+@click.option("--stream", is_flag=True, help="Use streaming LLM responses")
+@click.option("--warm", is_flag=True, help="Keep the LLM response cache and build cache enabled")
+@click.option("--base-url", default=None, help="Use this LLM endpoint instead of the in-process mock server")
+@click.option("--latency-ms", type=float, default=300.0, help="Mock: fixed latency per request")
+@click.option("--ms-per-token", type=float, default=2.0, help="Mock: additional latency per completion token")
+@click.option("--jitter", type=float, default=0.2, help="Mock: relative latency jitter")
+@click.option("--rate-limit-rate", type=float, default=0.0, help="Mock: share of requests answered with 429")
+@click.option("--error-rate", type=float, default=0.0, help="Mock: share of requests answered with 503")
+@click.option("--fixtures", "fixtures_path", default=None, help="Mock: JSON file with extra fixture rules")
+@click.option("--output-dir", default=None, help="Directory for the built packages (default: temp dir)")
+@click.option("--report", "report_path", default=None, help="Write the benchmark report to this JSON file")
+@click.option("--trace-file", default=None, help="Append tracing spans of every run as JSON lines")
+@click.option("--trace-otlp-file", default=None, help="Append tracing spans in OpenTelemetry OTLP/JSON format")
+def main(
+    videos: int,
+    parallel: int,
+    milestone: str,
+    stage3_concurrency: int,
+    stage3_batch_size: int,
+    llm_concurrency: Optional[int],
+    transcript_chars: int,
+    stream: bool,
+    warm: bool,
+    base_url: Optional[str],
+    latency_ms: float,
+    ms_per_token: float,
+    jitter: float,
+    rate_limit_rate: float,
+    error_rate: float,
+    fixtures_path: Optional[str],
+    output_dir: Optional[str],
+    report_path: Optional[str],
+    trace_file: Optional[str],
+    trace_otlp_file: Optional[str]
+):
+    """
+    Offline benchmark of the 3-stage pipeline against a mock LLM server.
+
+    Logs per-stage p50/p95 latency and throughput to stderr.
+    """
+    client = get_llm_client()
+    build_cache = get_build_cache()
+    if not warm:
+        # Mock responses must never end up in the real response cache
+        client.cache = None
+        if build_cache is not None:
+            build_cache.bypass = True
+    configure_tracing(trace_file, otlp_path=trace_otlp_file)
+
+    server = None
+    if base_url is None:
+        server = MockLLMServer(
+            fixtures=load_fixtures(fixtures_path) if fixtures_path else None,
+            latency_ms=latency_ms,
+            ms_per_token=ms_per_token,
+            jitter=jitter,
+            rate_limit_rate=rate_limit_rate,
+            error_rate=error_rate
+        ).start()
+        base_url = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["LLM_BASE_URL"] = base_url
+    log_info(f"Benchmark: {videos} videos, {parallel} in parallel, LLM endpoint {base_url}")
+
+    async def _run() -> dict[str, Any]:
+        try:
+            return await run_benchmark(
+                videos,
+                parallel=parallel,
+                milestone=milestone,
+                stage3_concurrency=stage3_concurrency,
+                stage3_batch_size=stage3_batch_size,
+                llm_concurrency=llm_concurrency,
+                transcript_chars=transcript_chars,
+                stream=stream,
+                output_dir=output_dir
+            )
+        finally:
+            await close_async_clients()
+
+    try:
+        report: dict[str, Any] = asyncio.run(_run())
+    finally:
+        if server is not None:
+            server.stop()
+
+    if server is not None:
+        report["mock_server"] = server.stats()
+    report["llm"] = report_llm_usage()
+    log_progress("Benchmark complete", **{k: v for k, v in report.items() if k != "llm"})
+    get_tracer().close()
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
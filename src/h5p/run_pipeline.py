@@ -8,16 +8,18 @@ CLI entry point for the new modular pipeline:
 - Stage 3: Plan → H5P Content + Moodle Import
 """
 import asyncio
+import hashlib
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import subprocess
 import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 
 import click
-import httpx
 from dotenv import load_dotenv
 
 # Load environment early
@@ -26,26 +28,108 @@ load_dotenv()
 # Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from src.h5p.pipeline.stage1_summarizer import summarize_transcript
+from src.h5p.pipeline.stage1_summarizer import close_supabase_client, flush_script_cache, summarize_transcript
+from src.h5p.pipeline.script_cache import get_script_cache
 from src.h5p.pipeline.stage2_planner import plan_learning_path, validate_learning_path
-from src.h5p.pipeline.stage3_generator import generate_all_content
+from src.h5p.pipeline.stage3_generator import generate_h5p_content, generate_h5p_content_batch
+from src.h5p.pipeline.executor import PackageUnit, PipelinedExecutor
 from src.h5p.config.milestones import get_milestone_config, MILESTONE_CONFIGS
-from src.h5p.builders import build_h5p, build_column_h5p, prepare_activity_for_column, BUILDERS
+from src.h5p.builders import build_h5p, prepare_activity_for_column, get_build_cache, BUILDERS
+from src.h5p.llm import get_llm_client, get_rate_limiter, get_usage_tracker
+from src.h5p.moodle_import import import_h5p_tracked
+from src.h5p.transcript_store import fetch_youtube_row_async, get_transcript_store
+from src.h5p.pipeline.resources import resource_slot
+from src.h5p.tracing import configure_tracing, current_span, get_tracer, traced
+
+
+def log_timestamp() -> str:
+    """UTC timestamp (milliseconds) for log lines."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+async def close_async_clients():
+    """Close the pooled LLM and Supabase clients; call before the event loop ends."""
+    await get_llm_client().aclose()
+    await close_supabase_client()
 
 
 def log_info(msg: str):
     """Print info message to stderr as JSON."""
-    print(json.dumps({"status": "info", "message": msg}), file=sys.stderr)
+    print(json.dumps({"status": "info", "ts": log_timestamp(), "message": msg}), file=sys.stderr)
 
 
 def log_progress(msg: str, **extra):
     """Print progress message to stderr as JSON."""
-    print(json.dumps({"status": "progress", "message": msg, **extra}), file=sys.stderr)
+    print(json.dumps({"status": "progress", "ts": log_timestamp(), "message": msg, **extra}), file=sys.stderr)
 
 
 def log_error(msg: str):
     """Print error message to stderr as JSON."""
-    print(json.dumps({"status": "error", "message": msg}), file=sys.stderr)
+    print(json.dumps({"status": "error", "ts": log_timestamp(), "message": msg}), file=sys.stderr)
+
+
+def report_llm_usage(report_path: Optional[str] = None) -> dict:
+    """Log per-stage LLM token usage, latency and throttling; optionally write it as JSON."""
+    tracker = get_usage_tracker()
+    report = {**tracker.report(), "rate_limit": get_rate_limiter().stats()}
+    log_progress("LLM usage", **report)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({**report, "calls": tracker.export()}, f, indent=2, ensure_ascii=False)
+    return report
+
+
+@contextmanager
+def timed_span(timings: dict, stage: str, name: Optional[str] = None, **attributes):
+    """
+    Run the block in a tracing span and append its seconds to timings[stage].
+
+    Yields the span, so the block can attach bytes, tokens or counts.
+    """
+    with get_tracer().span(name or stage, **attributes) as span:
+        try:
+            yield span
+        finally:
+            timings.setdefault(stage, []).append(round(span.elapsed(), 3))
+
+
+def summarize_timings(timings: dict) -> dict:
+    """Calls, total and max seconds per stage."""
+    return {
+        stage: {"calls": len(values), "total_s": round(sum(values), 3), "max_s": max(values)}
+        for stage, values in timings.items() if values
+    }
+
+
+def write_build_manifest(path: str, run_info: dict, results: list[dict]) -> dict:
+    """
+    Write a JSON manifest of the packages built in a dry run.
+
+    Each package records its file, size, sha256 and the key the tracked
+    import would use, so the packages can be imported later without
+    regenerating them.
+    """
+    packages = []
+    for result in results:
+        h5p_path = result.get("h5p_path")
+        if not h5p_path:
+            continue
+        data = Path(h5p_path).read_bytes()
+        packages.append({
+            **{k: v for k, v in result.items() if k != "dry_run"},
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()
+        })
+
+    manifest = {
+        **run_info,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "packages": packages,
+        "errors": [r for r in results if "error" in r]
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
 
 
 def delete_moodle_course(courseid: int) -> dict:
@@ -67,70 +151,24 @@ def delete_moodle_course(courseid: int) -> dict:
 
 
 async def fetch_youtube_data(youtube_url_id: int) -> dict:
-    """Fetch YouTube data from Supabase by ID."""
+    """Fetch YouTube data from Supabase by ID (revalidated local copy if available)."""
     supabase_url = os.environ.get("SUPABASE_URL", "http://148.230.71.150:8000")
     supabase_key = os.environ.get("SUPABASE_SERVICE_KEY", os.environ.get("SUPABASE_ANON_KEY", ""))
 
-    url = f"{supabase_url}/rest/v1/youtube_urls?id=eq.{youtube_url_id}&select=id,title,subtitles,url"
-    headers = {
-        "apikey": supabase_key,
-        "Authorization": f"Bearer {supabase_key}"
-    }
+    async with resource_slot("supabase"):
+        return await fetch_youtube_row_async(youtube_url_id, supabase_url, supabase_key)
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=headers, timeout=30.0)
-        resp.raise_for_status()
-        data = resp.json()
 
-    if not data:
-        raise ValueError(f"YouTube URL with ID {youtube_url_id} not found in Supabase")
+async def import_h5p_tracked_async(*args, **kwargs) -> dict:
+    """Run import_h5p_tracked off the event loop, bounded by the 'moodle' limit."""
+    async with resource_slot("moodle"):
+        return await asyncio.to_thread(import_h5p_tracked, *args, **kwargs)
 
-    return data[0]
 
-
-def import_h5p_to_moodle(
-    h5p_path: str,
-    courseid: Optional[int],
-    title: str,
-    *,
-    create_course: bool = False,
-    course_name: Optional[str] = None,
-    section: int = 0
-) -> dict:
-    """Import H5P to Moodle via PHP script."""
-    try:
-        # Copy file to container
-        subprocess.run(
-            ["docker", "cp", h5p_path, "moodle-app:/tmp/generated.h5p"],
-            check=True, capture_output=True
-        )
-
-        # Run import script
-        cmd = [
-            "docker", "exec", "moodle-app", "php",
-            "/opt/bitnami/moodle/local/import_h5p.php",
-            f"--file=/tmp/generated.h5p",
-            f"--title={title}",
-            f"--section={section}"
-        ]
-        if create_course:
-            cmd.append("--createcourse")
-            if course_name:
-                cmd.append(f"--coursename={course_name}")
-        else:
-            cmd.append(f"--courseid={courseid}")
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        # Parse JSON result
-        for line in result.stdout.split("\n"):
-            if line.startswith("{"):
-                return json.loads(line)
-
-        return {"status": "error", "message": result.stderr or result.stdout}
-
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+async def delete_moodle_course_async(courseid: int) -> dict:
+    """Run delete_moodle_course off the event loop, bounded by the 'moodle' limit."""
+    async with resource_slot("moodle"):
+        return await asyncio.to_thread(delete_moodle_course, courseid)
 
 
 def validate_mix(learning_path: dict, milestone: str) -> dict:
@@ -167,6 +205,7 @@ def validate_mix(learning_path: dict, milestone: str) -> dict:
     }
 
 
+@traced("pipeline")
 async def run_full_pipeline(
     youtube_url_id: int,
     milestone: str,
@@ -176,11 +215,24 @@ async def run_full_pipeline(
     delete_old_courseid: Optional[int] = None,
     target_section: int = 0,
     skip_cache: bool = False,
-    output_dir: str = "/tmp/h5p_pipeline"
+    output_dir: str = "/tmp/h5p_pipeline",
+    stage3_concurrency: int = 4,
+    stage3_batch_size: int = 1,
+    incremental: bool = False,
+    update_in_place: bool = True,
+    stream: bool = False,
+    yt_data: Optional[dict] = None,
+    normalize: bool = True,
+    dry_run: bool = False
 ) -> dict:
     """
     Run the complete 3-stage pipeline.
 
+    Stage 2, Stage 3, building and importing are pipelined (see
+    pipeline.executor): activities are generated as soon as they are planned,
+    columns are built as soon as their content is complete and imported while
+    the rest is still being generated.
+
     Args:
         youtube_url_id: Supabase ID of the YouTube URL
         milestone: Milestone config to use (mvp, 1.1, 1.2, 1.3)
@@ -191,15 +243,43 @@ async def run_full_pipeline(
         target_section: Moodle section number to place activities (0 = General)
         skip_cache: If True, ignore cached structured script
         output_dir: Directory for H5P files
+        stage3_concurrency: Max parallel LLM calls in Stage 3 (1 = sequential)
+        stage3_batch_size: Generate up to this many activities of a column in
+            one LLM call; invalid items fall back to single calls (1 = off)
+        incremental: Re-import only activities whose package changed since the
+            last run into courseid (implies create_course=False)
+        update_in_place: Replace the package of changed activities instead of
+            deleting and re-creating them (incremental mode only)
+        stream: Stream LLM responses and log every section, planned activity
+            and generated item as soon as it is complete
+        yt_data: Pre-fetched youtube_urls row (e.g. from a bulk fetch);
+            fetched from Supabase if None
+        normalize: Strip timestamps, caption duplicates, fillers and
+            boilerplate from the transcript before Stage 1
+        dry_run: Generate and build all packages but skip the Moodle import
+            and course deletion
 
     Returns:
-        Dict with results
+        Dict with results; "timings" holds the seconds per stage (lists, one
+        entry per call / package). The same stages are recorded as tracing
+        spans (see tracing) below a "pipeline" span.
     """
+    if incremental:
+        if not courseid:
+            return {"status": "error", "message": "Incremental mode needs --courseid"}
+        create_course = False
+
     os.makedirs(output_dir, exist_ok=True)
+    run_started = time.monotonic()
+    timings: dict = {}
+    current_span().set(youtube_url_id=youtube_url_id, milestone=milestone, dry_run=dry_run)
 
     # 1. Fetch transcript from Supabase
-    log_info(f"Fetching transcript for youtube_url_id={youtube_url_id}")
-    yt_data = await fetch_youtube_data(youtube_url_id)
+    if yt_data is None:
+        log_info(f"Fetching transcript for youtube_url_id={youtube_url_id}")
+        with timed_span(timings, "fetch", youtube_url_id=youtube_url_id) as span:
+            yt_data = await fetch_youtube_data(youtube_url_id)
+            span.set(bytes=len((yt_data.get("subtitles") or "").encode("utf-8")))
     transcript = yt_data.get("subtitles", "")
     title = yt_data.get("title", "Lernmodul")
     video_url = yt_data.get("url", "")
@@ -211,224 +291,304 @@ async def run_full_pipeline(
 
     # 2. Stage 1: Transcript → Structured Script
     log_info("Stage 1: Summarizing transcript...")
-    structured_script = await summarize_transcript(
-        transcript,
-        youtube_url_id=youtube_url_id,
-        force=skip_cache
-    )
+    with timed_span(timings, "stage1", bytes=len(transcript.encode("utf-8"))) as span:
+        structured_script = await summarize_transcript(
+            transcript,
+            youtube_url_id=youtube_url_id,
+            force=skip_cache,
+            normalize=normalize,
+            on_section=(
+                (lambda section: log_progress("Stage 1 section ready", title=section.get("title")))
+                if stream else None
+            )
+        )
+        span.set(sections=len(structured_script.get("sections", [])))
     log_progress(
         "Stage 1 complete",
         sections=len(structured_script.get("sections", [])),
         key_terms=len(structured_script.get("key_terms", []))
     )
 
-    # 3. Stage 2: Script → Learning Path Plan
-    log_info(f"Stage 2: Planning learning path (milestone={milestone})...")
-    learning_path = await plan_learning_path(structured_script, milestone=milestone)
-    activities = learning_path.get("learning_path", [])
-    log_progress(
-        "Stage 2 complete",
-        activities=len(activities),
-        types=[a.get("content_type") for a in activities]
-    )
-
-    # 4. Validate mix
-    validation = validate_mix(learning_path, milestone)
-    if not validation["all_ok"]:
-        log_info(f"Mix validation warnings: {validation['errors']}")
-    log_progress(
-        "Mix validation",
-        distribution=validation["percentages"]
-    )
+    # Determine course handling
+    current_courseid = courseid if (courseid and not create_course) else None
+    course_title = course_name or f"{title or 'Lernmodul'} {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}"
 
-    # 5. Stage 3: Plan → H5P Content
-    log_info("Stage 3: Generating H5P content...")
-    h5p_contents = await generate_all_content(learning_path, structured_script)
-    log_progress("Stage 3 complete", generated=len(h5p_contents))
+    if not dry_run and not create_course and current_courseid is None:
+        return {"status": "error", "message": "Provide --courseid or enable --create-course"}
 
-    # 6. Build H5P packages and import to Moodle
     config = get_milestone_config(milestone)
     auto_check = config.get("rules", {}).get("auto_advance_on_correct", True)
     if auto_check:
         log_info("Auto-check enabled (default)")
 
-    # Determine course handling
-    current_courseid = courseid if (courseid and not create_course) else None
-    course_title = course_name or f"{title or 'Lernmodul'} {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}"
-
-    if not create_course and current_courseid is None:
-        return {"status": "error", "message": "Provide --courseid or enable --create-course"}
-
-    results = []
+    validation: dict = {}
 
-    # Map generated content by activity order for quick lookup
-    content_by_order = {}
-    for activity, content in zip(activities, h5p_contents):
-        order = activity.get("order")
-        if order is not None:
-            content_by_order[order] = content
+    # 3. Stage 2: Script → Learning Path Plan (streamed, activities flow on to Stage 3)
+    async def plan(on_activity, on_column=None) -> dict:
+        nonlocal validation
+        log_info(f"Stage 2: Planning learning path (milestone={milestone})...")
 
-    # Check if LLM returned columns structure (new format)
-    columns = learning_path.get("columns", [])
-
-    if columns:
-        # NEW: Column-based import (3-4 Moodle entries instead of 7)
-        log_info(f"Building {len(columns)} Column packages...")
-
-        for col_idx, column in enumerate(columns):
-            col_title = column.get("title", f"Teil {col_idx + 1}")
-            col_activities = column.get("activities", [])
-
-            # Collect content for each activity in this column
-            column_activities = []
-            for activity in col_activities:
-                order = activity.get("order", 0)
-                content_type = activity.get("content_type")
-
-                content = content_by_order.get(order)
-
-                if not content:
-                    log_info(f"No generated content for order {order} ({content_type})")
-                    continue
-
-                if "_error" in content:
-                    log_info(f"Skipping activity with generation error (order={order}, type={content_type})")
-                    continue
-
-                prepared = prepare_activity_for_column(
-                    content_type,
-                    content,
-                    auto_check=auto_check
+        def planned(activity: dict):
+            if stream:
+                log_progress(
+                    "Stage 2 activity planned",
+                    order=activity.get("order"),
+                    content_type=activity.get("content_type")
                 )
-                column_activities.append(prepared)
-
-            if not column_activities:
-                log_info(f"Skipping empty column: {col_title}")
-                continue
+            on_activity(activity)
+
+        with timed_span(timings, "stage2", milestone=milestone) as span:
+            learning_path = await plan_learning_path(
+                structured_script,
+                milestone=milestone,
+                on_activity=planned,
+                on_column=on_column
+            )
+            activities = learning_path.get("learning_path", [])
+            span.set(activities=len(activities))
+        log_progress(
+            "Stage 2 complete",
+            activities=len(activities),
+            types=[a.get("content_type") for a in activities]
+        )
 
-            # Build Column H5P
-            h5p_path = os.path.join(output_dir, f"column_{col_idx + 1}_{col_title[:20]}.h5p")
-            column_data = {
-                "title": col_title,
-                "activities": column_activities
-            }
-
-            try:
-                build_column_h5p(column_data, h5p_path)
-                moodle_result = import_h5p_to_moodle(
-                    h5p_path,
-                    current_courseid,
-                    col_title,
-                    create_course=create_course and current_courseid is None,
-                    course_name=course_title,
-                    section=target_section
+        # 4. Validate mix
+        validation = validate_mix(learning_path, milestone)
+        if not validation["all_ok"]:
+            log_info(f"Mix validation warnings: {validation['errors']}")
+        log_progress(
+            "Mix validation",
+            distribution=validation["percentages"]
+        )
+        log_info("Stage 3: Generating H5P content...")
+        return learning_path
+
+    # 5. Stage 3: Activity → H5P Content
+    async def generate(activity: dict) -> dict:
+        with timed_span(
+            timings,
+            "stage3",
+            order=activity.get("order"),
+            content_type=activity.get("content_type")
+        ):
+            if not stream:
+                return await generate_h5p_content(activity, structured_script)
+            return await generate_h5p_content(
+                activity,
+                structured_script,
+                on_item=lambda key, item: log_progress(
+                    "Stage 3 item ready",
+                    order=activity.get("order"),
+                    content_type=activity.get("content_type"),
+                    key=key
                 )
+            )
+
+    async def generate_batch(activities: list[dict]) -> list[dict]:
+        with timed_span(
+            timings,
+            "stage3",
+            "stage3.batch",
+            orders=[a.get("order") for a in activities],
+            content_types=[a.get("content_type") for a in activities]
+        ):
+            return await generate_h5p_content_batch(activities, structured_script)
+
+    # 6. Build H5P packages (in a worker thread) ...
+    def build(unit: PackageUnit, contents: dict) -> Optional[dict]:
+        with timed_span(timings, "build", kind=unit.kind, index=unit.index + 1) as span:
+            if unit.kind == "column":
+                built = build_column(unit, contents)
+            else:
+                built = build_activity(unit, contents[unit.keys[0]])
+            if built and built.get("h5p_path"):
+                span.set(bytes=os.path.getsize(built["h5p_path"]))
+            return built
+
+    def build_column(unit: PackageUnit, contents: dict) -> Optional[dict]:
+        # Collect content for each activity in this column
+        column_activities = []
+        for activity in unit.activities:
+            order = activity.get("order", 0)
+            content_type = activity.get("content_type")
 
-                if moodle_result.get("courseid") and current_courseid is None:
-                    current_courseid = moodle_result.get("courseid")
+            content = contents.get(order)
 
-                    if delete_old_courseid:
-                        delete_moodle_course(delete_old_courseid)
+            if not content:
+                log_info(f"No generated content for order {order} ({content_type})")
+                continue
 
-                results.append({
-                    "column": col_idx + 1,
-                    "title": col_title,
-                    "activities_count": len(column_activities),
-                    "h5p_path": h5p_path,
-                    "moodle": moodle_result
-                })
+            if "_error" in content:
+                log_info(f"Skipping activity with generation error (order={order}, type={content_type})")
+                continue
 
-                log_progress(
-                    f"Imported Column '{col_title}'",
-                    column=col_idx + 1,
-                    activities=len(column_activities)
-                )
+            prepared = prepare_activity_for_column(
+                content_type,
+                content,
+                auto_check=auto_check
+            )
+            column_activities.append(prepared)
+
+        if not column_activities:
+            log_info(f"Skipping empty column: {unit.title}")
+            return None
+
+        h5p_path = os.path.join(output_dir, f"column_{unit.index + 1}_{unit.title[:20]}.h5p")
+        column_data = {
+            "title": unit.title,
+            "activities": column_activities
+        }
 
-            except Exception as e:
-                results.append({
-                    "column": col_idx + 1,
-                    "title": col_title,
-                    "error": str(e)
-                })
-                log_error(f"Column build failed: {e}")
+        try:
+            build_h5p("column", column_data, h5p_path)
+        except Exception as e:
+            log_error(f"Column build failed: {e}")
+            return {"column": unit.index + 1, "title": unit.title, "error": str(e)}
 
-    else:
-        # LEGACY: Separate activity import (7 Moodle entries)
-        log_info("Building separate H5P packages (legacy mode)...")
+        return {
+            "column": unit.index + 1,
+            "title": unit.title,
+            "activities_count": len(column_activities),
+            "h5p_path": h5p_path
+        }
 
-        for i, (activity, content) in enumerate(zip(activities, h5p_contents)):
-            content_type = activity.get("content_type")
-            act_title = f"{i+1}. {activity.get('brief', content_type)[:50]}"
+    def build_activity(unit: PackageUnit, content: dict) -> dict:
+        activity = unit.activities[0]
+        i = unit.index
+        content_type = activity.get("content_type")
+        act_title = f"{i+1}. {activity.get('brief', content_type)[:50]}"
+        result = {"order": i + 1, "type": content_type, "title": act_title}
 
-            if "_error" in content:
-                results.append({
-                    "order": i + 1,
-                    "type": content_type,
-                    "title": act_title,
-                    "error": content["_error"]
-                })
-                continue
+        if "_error" in content:
+            return {**result, "error": content["_error"]}
 
-            h5p_path = os.path.join(output_dir, f"activity_{i+1}_{content_type}.h5p")
-
-            try:
-                build_data = {**content}
-                build_data["title"] = act_title
-                if not build_data.get("video_url") and video_url:
-                    build_data["video_url"] = video_url
-
-                if auto_check and content_type in ["multichoice", "truefalse", "blanks"]:
-                    build_data["auto_check"] = True
-
-                build_h5p(content_type, build_data, h5p_path)
-                moodle_result = import_h5p_to_moodle(
-                    h5p_path,
-                    current_courseid,
-                    act_title,
-                    create_course=create_course and current_courseid is None,
-                    course_name=course_title,
-                    section=target_section
-                )
+        h5p_path = os.path.join(output_dir, f"activity_{i+1}_{content_type}.h5p")
 
-                if moodle_result.get("courseid") and current_courseid is None:
-                    current_courseid = moodle_result.get("courseid")
+        try:
+            build_data = {**content}
+            build_data["title"] = act_title
+            if not build_data.get("video_url") and video_url:
+                build_data["video_url"] = video_url
 
-                    if delete_old_courseid:
-                        delete_moodle_course(delete_old_courseid)
+            if auto_check and content_type in ["multichoice", "truefalse", "blanks"]:
+                build_data["auto_check"] = True
 
-                results.append({
-                    "order": i + 1,
-                    "type": content_type,
-                    "title": act_title,
-                    "h5p_path": h5p_path,
-                    "moodle": moodle_result
-                })
+            build_h5p(content_type, build_data, h5p_path)
+        except Exception as e:
+            return {**result, "error": str(e)}
 
-                log_progress(
-                    f"Imported {content_type}",
-                    order=i + 1
-                )
+        return {**result, "h5p_path": h5p_path}
 
-            except Exception as e:
-                results.append({
-                    "order": i + 1,
-                    "type": content_type,
-                    "title": act_title,
-                    "error": str(e)
-                })
+    # ... and import them to Moodle in plan order, while later packages are still generated
+    async def import_package(unit: PackageUnit, built: dict) -> dict:
+        nonlocal current_courseid
+        import_key = f"{youtube_url_id}:{unit.kind}:{unit.index + 1}"
+        if dry_run:
+            log_progress(f"Built {unit.kind} '{built['title']}' (dry run, not imported)", h5p_path=built["h5p_path"])
+            return {**built, "import_key": import_key, "dry_run": True}
+
+        with timed_span(
+            timings,
+            "import",
+            import_key=import_key,
+            bytes=os.path.getsize(built["h5p_path"])
+        ) as span:
+            moodle_result = await import_h5p_tracked_async(
+                import_key,
+                built["h5p_path"],
+                current_courseid,
+                built["title"],
+                incremental=incremental,
+                update_in_place=update_in_place,
+                create_course=create_course and current_courseid is None,
+                course_name=course_title,
+                section=target_section
+            )
+            span.set(action=moodle_result.get("action"), moodle_status=moodle_result.get("status"))
+
+        if moodle_result.get("courseid") and current_courseid is None:
+            current_courseid = moodle_result.get("courseid")
+
+            if delete_old_courseid:
+                await delete_moodle_course_async(delete_old_courseid)
+
+        if unit.kind == "column":
+            log_progress(
+                f"Imported Column '{built['title']}'",
+                column=built["column"],
+                activities=built["activities_count"],
+                action=moodle_result.get("action")
+            )
+        else:
+            log_progress(
+                f"Imported {built['type']}",
+                order=built["order"],
+                action=moodle_result.get("action")
+            )
+
+        return {**built, "moodle": moodle_result}
+
+    executor = PipelinedExecutor(
+        generate,
+        build,
+        import_package,
+        max_concurrency=stage3_concurrency,
+        generate_batch=generate_batch,
+        batch_size=stage3_batch_size
+    )
+    run = await executor.run(plan)
+    activities = run.learning_path.get("learning_path", [])
+    results = run.results
+    log_progress("Stages 2-3, build and import complete", generated=len(run.contents), packages=len(results))
+
+    # Stage 1 cache: wait for the background upload to Supabase
+    pending_uploads = await flush_script_cache()
+    if pending_uploads:
+        log_info(f"{pending_uploads} structured script(s) cached locally only, upload is retried next run")
 
     # 7. Summary
     successful = sum(1 for r in results if "moodle" in r and r["moodle"].get("status") == "success")
+    built = sum(1 for r in results if r.get("h5p_path"))
+    import_actions: dict = {}
+    for r in results:
+        action = r.get("moodle", {}).get("action")
+        if action:
+            import_actions[action] = import_actions.get(action, 0) + 1
+
+    timings["total"] = [round(time.monotonic() - run_started, 3)]
+    log_progress("Stage timings", **summarize_timings(timings))
+
+    manifest_path = None
+    if dry_run:
+        manifest_path = os.path.join(output_dir, "manifest.json")
+        write_build_manifest(
+            manifest_path,
+            {
+                "youtube_url_id": youtube_url_id,
+                "title": title,
+                "video_url": video_url,
+                "milestone": milestone,
+                "course_name": course_title,
+                "target_section": target_section,
+                "timings": timings
+            },
+            results
+        )
+        log_progress("Dry run manifest written", path=manifest_path, packages=built)
 
     return {
-        "status": "success" if successful > 0 else "error",
+        "status": "success" if (built if dry_run else successful) > 0 else "error",
         "pipeline_version": "3-stage",
+        "dry_run": dry_run,
         "milestone": milestone,
         "youtube_url_id": youtube_url_id,
         "title": title,
         "total_activities": len(activities),
         "successful_imports": successful,
+        "import_actions": import_actions,
         "validation": validation,
+        "timings": timings,
+        "manifest": manifest_path,
         "activities": results
     }
 
@@ -447,8 +607,19 @@ async def run_full_pipeline(
 @click.option("--delete-old-courseid", type=int, default=None, help="Optional course ID to delete after successful import")
 @click.option("--target-section", type=int, default=0, help="Moodle section number to place activities (0 = General)")
 @click.option("--skip-cache", is_flag=True, help="Ignore cached structured script")
+@click.option("--incremental", is_flag=True, help="Only re-import activities whose package changed (needs --courseid)")
+@click.option("--replace-changed", is_flag=True, help="Incremental: delete and re-create changed activities instead of updating in place")
+@click.option("--no-llm-cache", is_flag=True, help="Bypass the local LLM response cache (fresh responses are still stored)")
+@click.option("--no-build-cache", is_flag=True, help="Rebuild all H5P packages (fresh builds are still stored)")
 @click.option("--output-dir", default="/tmp/h5p_pipeline", help="Output directory for H5P files")
-@click.option("--dry-run", is_flag=True, help="Generate content but don't import to Moodle")
+@click.option("--stage3-concurrency", type=int, default=4, help="Max parallel LLM calls in Stage 3 (1 = sequential)")
+@click.option("--stage3-batch-size", type=int, default=1, help="Generate up to N activities of a column in one LLM call (1 = off)")
+@click.option("--usage-report", default=None, help="Write per-call LLM token usage and latency to this JSON file")
+@click.option("--trace-file", default=None, help="Append tracing spans (fetch, stages, LLM calls, builds, imports) as JSON lines")
+@click.option("--trace-otlp-file", default=None, help="Append tracing spans in OpenTelemetry OTLP/JSON format")
+@click.option("--raw-transcript", is_flag=True, help="Send the transcript to Stage 1 without local normalization")
+@click.option("--stream", is_flag=True, help="Stream LLM responses and log items as soon as they are generated")
+@click.option("--dry-run", is_flag=True, help="Generate and build all packages plus a manifest, but don't import to Moodle")
 def main(
     youtube_url_id: int,
     milestone: str,
@@ -458,7 +629,18 @@ def main(
     delete_old_courseid: Optional[int],
     target_section: int,
     skip_cache: bool,
+    incremental: bool,
+    replace_changed: bool,
+    no_llm_cache: bool,
+    no_build_cache: bool,
     output_dir: str,
+    stage3_concurrency: int,
+    stage3_batch_size: int,
+    usage_report: Optional[str],
+    trace_file: Optional[str],
+    trace_otlp_file: Optional[str],
+    raw_transcript: bool,
+    stream: bool,
     dry_run: bool
 ):
     """
@@ -469,25 +651,50 @@ def main(
     - Stage 2: Learning path planning
     - Stage 3: H5P content generation
     """
+    if no_llm_cache:
+        get_llm_client().cache_bypass = True
+    build_cache = get_build_cache()
+    if no_build_cache and build_cache is not None:
+        build_cache.bypass = True
+    configure_tracing(trace_file, otlp_path=trace_otlp_file)
+
     async def _run():
         if dry_run:
             log_info("DRY RUN - Will not import to Moodle")
-            # TODO: Implement dry run mode
-            return {"status": "error", "message": "Dry run not yet implemented"}
 
-        return await run_full_pipeline(
-            youtube_url_id=youtube_url_id,
-            milestone=milestone,
-            courseid=courseid,
-            create_course=create_course,
-            course_name=course_name,
-            delete_old_courseid=delete_old_courseid,
-            target_section=target_section,
-            skip_cache=skip_cache,
-            output_dir=output_dir
-        )
+        try:
+            return await run_full_pipeline(
+                youtube_url_id=youtube_url_id,
+                milestone=milestone,
+                courseid=courseid,
+                create_course=create_course,
+                course_name=course_name,
+                delete_old_courseid=delete_old_courseid,
+                target_section=target_section,
+                skip_cache=skip_cache,
+                output_dir=output_dir,
+                stage3_concurrency=stage3_concurrency,
+                stage3_batch_size=stage3_batch_size,
+                incremental=incremental,
+                update_in_place=not replace_changed,
+                stream=stream,
+                normalize=not raw_transcript,
+                dry_run=dry_run
+            )
+        finally:
+            await close_async_clients()
 
     result = asyncio.run(_run())
+    if build_cache is not None:
+        log_progress("Build cache", **build_cache.stats())
+    transcript_store = get_transcript_store()
+    if transcript_store is not None:
+        log_progress("Transcript store", **transcript_store.stats())
+    script_cache = get_script_cache()
+    if script_cache is not None:
+        log_progress("Stage 1 cache", **script_cache.stats())
+    report_llm_usage(usage_report)
+    get_tracer().close()
     print(json.dumps(result, indent=2, ensure_ascii=False))
 
 
@@ -0,0 +1,311 @@
+"""
+Tracing
+
+Lightweight spans that show where a pipeline run spends its time.
+- `with span("stage1", chars=n) as s: ...; s.set(sections=k)` records start,
+  end, duration, status and attributes (bytes, tokens, ...) of a block
+- @traced("name") does the same for a sync or async function
+- Nesting is tracked with a context variable, so spans opened in asyncio
+  tasks and asyncio.to_thread workers get the right parent
+- Finished spans go to exporters: JSON lines (TRACE_FILE) and OTLP/JSON
+  (TRACE_OTLP_FILE), the OpenTelemetry file format read by the collector's
+  otlpjsonfile receiver and most trace viewers
+- Without an exporter spans are still measured but not kept
+
+Usage:
+    configure_tracing("trace.jsonl", otlp_path="trace.otlp.jsonl")
+    with span("fetch", youtube_url_id=42) as s:
+        row = fetch(...)
+        s.set(bytes=len(row["subtitles"]))
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+DEFAULT_TRACE_FILE = os.getenv("TRACE_FILE") or None
+DEFAULT_OTLP_FILE = os.getenv("TRACE_OTLP_FILE") or None
+DEFAULT_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME") or "h5p-pipeline"
+
+# OTLP enums (opentelemetry/proto/trace/v1/trace.proto)
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+
+def _iso(ns: int) -> str:
+    return datetime.fromtimestamp(ns / 1e9, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+@dataclass
+class Span:
+    """One timed operation."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    duration_s: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes) -> "Span":
+        """Add or overwrite attributes."""
+        self.attributes.update(attributes)
+        return self
+
+    def add(self, key: str, amount: float = 1) -> "Span":
+        """Increase a numeric attribute (e.g. retries, bytes)."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+        return self
+
+    def elapsed(self) -> float:
+        """Seconds since the span started (final once it has ended)."""
+        if self.duration_s is not None:
+            return self.duration_s
+        return time.perf_counter() - self._started
+
+    def finish(self) -> None:
+        self.duration_s = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration_s * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-lines record."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": _iso(self.start_ns),
+            "end": _iso(self.end_ns) if self.end_ns is not None else None,
+            "duration_s": round(self.duration_s, 6) if self.duration_s is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Span in OTLP/JSON encoding."""
+        otlp: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns if self.end_ns is not None else self.start_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": STATUS_CODE_ERROR, "message": self.error or ""}
+                if self.status == "error" else {"code": STATUS_CODE_OK}
+            ),
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        return otlp
+
+
+class _NoopSpan(Span):
+    """Returned by current_span() outside of any span; discards attributes."""
+
+    def set(self, **attributes) -> "Span":
+        return self
+
+    def add(self, key: str, amount: float = 1) -> "Span":
+        return self
+
+
+_NOOP_SPAN = _NoopSpan(name="", trace_id="", span_id="")
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("h5p_current_span", default=None)
+
+
+def current_span() -> Span:
+    """The innermost open span of this task/thread (a no-op span if none)."""
+    return _current.get() or _NOOP_SPAN
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    if value is None:
+        return {"stringValue": ""}
+    return {"stringValue": str(value)}
+
+
+class JSONLinesExporter:
+    """Appends one JSON object per finished span to a file."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _record(self, span: Span) -> Dict[str, Any]:
+        return span.to_dict()
+
+    def export(self, span: Span) -> None:
+        self._file.write(json.dumps(self._record(span), ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class OTLPJSONExporter(JSONLinesExporter):
+    """Appends one OTLP ExportTraceServiceRequest (JSON) per finished span."""
+
+    def __init__(self, path: str, service_name: str = DEFAULT_SERVICE_NAME):
+        super().__init__(path)
+        self.service_name = service_name
+
+    def _record(self, span: Span) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]
+                },
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp()]
+                }]
+            }]
+        }
+
+
+class MemoryExporter:
+    """Keeps finished spans in a list (tests, in-process reports)."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def close(self) -> None:
+        pass
+
+
+class Tracer:
+    """Creates spans and hands finished ones to its exporters."""
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters: List[Any] = list(exporters or [])
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: Any) -> None:
+        with self._lock:
+            self.exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span."""
+        parent = _current.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=dict(attributes)
+        )
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.finish()
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        with self._lock:
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except (OSError, TypeError, ValueError):
+                    # Tracing must never break a run
+                    pass
+
+    def close(self) -> None:
+        with self._lock:
+            for exporter in self.exporters:
+                exporter.close()
+            self.exporters.clear()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer (exporters from TRACE_FILE / TRACE_OTLP_FILE)."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            if DEFAULT_TRACE_FILE:
+                _tracer.add_exporter(JSONLinesExporter(DEFAULT_TRACE_FILE))
+            if DEFAULT_OTLP_FILE:
+                _tracer.add_exporter(OTLPJSONExporter(DEFAULT_OTLP_FILE))
+        return _tracer
+
+
+def configure_tracing(
+    path: Optional[str] = None,
+    otlp_path: Optional[str] = None,
+    service_name: str = DEFAULT_SERVICE_NAME
+) -> Tracer:
+    """Add a JSON-lines and/or OTLP/JSON file exporter to the process-wide tracer."""
+    tracer = get_tracer()
+    if path:
+        tracer.add_exporter(JSONLinesExporter(path))
+    if otlp_path:
+        tracer.add_exporter(OTLPJSONExporter(otlp_path, service_name))
+    return tracer
+
+
+def span(name: str, **attributes):
+    """Context manager: a span of the process-wide tracer."""
+    return get_tracer().span(name, **attributes)
+
+
+def traced(name: Optional[str] = None, **attributes) -> Callable:
+    """Decorator: run every call of a sync or async function in a span."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_tracer().span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
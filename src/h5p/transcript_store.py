@@ -0,0 +1,557 @@
+"""
+Local Transcript Store
+
+Persistent cache for youtube_urls rows (title, subtitles, url) fetched from
+Supabase, so re-runs and batch runs stop re-downloading large subtitle blobs.
+- SQLite file, rows stored zlib-compressed, keyed by youtube_urls.id
+- Each entry remembers a version (the updated_at column) and the ETag
+- Revalidation: a tiny `select=id,updated_at` probe; only if the version
+  changed is the full row downloaded again. Without a version column the
+  full GET is sent with If-None-Match and a 304 keeps the local copy.
+- Optional max age: entries younger than TRANSCRIPT_CACHE_MAX_AGE seconds
+  are served without any request
+
+- Bulk fetch for batch runs: id=in.(...) pages, one paged version probe,
+  rows decoded while streaming and stored as they arrive
+
+The single-row HTTP flow is written once as a step generator and driven by a
+sync (httpx.Client) or async (httpx.AsyncClient) runner.
+
+Usage:
+    row = fetch_youtube_row(42, supabase_url, supabase_key)
+    row = await fetch_youtube_row_async(42, supabase_url, supabase_key)
+    rows = await fetch_youtube_rows_async(range(100, 2000), supabase_url, supabase_key)
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Generator, Iterable, List, Optional
+
+import httpx
+
+
+DEFAULT_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR") or Path.home() / ".cache" / "h5p_pipeline")
+DEFAULT_STORE_PATH = Path(os.getenv("TRANSCRIPT_CACHE_PATH") or DEFAULT_CACHE_DIR / "transcripts.sqlite3")
+DEFAULT_MAX_AGE = float(os.getenv("TRANSCRIPT_CACHE_MAX_AGE") or 0)
+DEFAULT_VERSION_COLUMN = os.getenv("SUPABASE_VERSION_COLUMN", "updated_at")
+
+SELECT_COLUMNS = "id,title,subtitles,url"
+REQUEST_TIMEOUT = 30.0
+# IDs per id=in.(...) request; keeps URLs well below proxy limits
+BULK_PAGE_SIZE = int(os.getenv("SUPABASE_BULK_PAGE_SIZE") or 100)
+
+
+@dataclass
+class StoredTranscript:
+    """One cached youtube_urls row."""
+    youtube_url_id: int
+    data: Dict[str, Any]
+    version: Optional[str]
+    etag: Optional[str]
+    fetched_at: float
+
+
+@dataclass
+class _Request:
+    url: str
+    headers: Dict[str, str]
+
+
+class TranscriptStore:
+    """SQLite-backed store of compressed youtube_urls rows."""
+
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_STORE_PATH,
+        max_age: float = DEFAULT_MAX_AGE,
+        version_column: Optional[str] = DEFAULT_VERSION_COLUMN
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.version_column = version_column or None
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS transcripts (
+                id INTEGER PRIMARY KEY,
+                version TEXT,
+                etag TEXT,
+                data BLOB NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["TranscriptStore"]:
+        """
+        Create the default store, or None if disabled via TRANSCRIPT_CACHE_DISABLE=1.
+        """
+        if os.getenv("TRANSCRIPT_CACHE_DISABLE", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(DEFAULT_STORE_PATH)
+
+    def get(self, youtube_url_id: int) -> Optional[StoredTranscript]:
+        """Return the stored row for youtube_url_id, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, etag, data, fetched_at FROM transcripts WHERE id = ?",
+                (youtube_url_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        version, etag, blob, fetched_at = row
+        data = json.loads(zlib.decompress(blob).decode("utf-8"))
+        return StoredTranscript(youtube_url_id, data, version, etag, fetched_at)
+
+    def put(
+        self,
+        youtube_url_id: int,
+        data: Dict[str, Any],
+        version: Optional[str] = None,
+        etag: Optional[str] = None
+    ) -> None:
+        """Store (or replace) a row."""
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO transcripts (id, version, etag, data, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (youtube_url_id, version, etag, blob, time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, youtube_url_id: int) -> None:
+        """Mark an entry as just revalidated."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE transcripts SET fetched_at = ? WHERE id = ?", (time.time(), youtube_url_id)
+            )
+            self._conn.commit()
+
+    def is_fresh(self, entry: StoredTranscript) -> bool:
+        """True if the entry may be served without revalidation."""
+        return self.max_age > 0 and time.time() - entry.fetched_at < self.max_age
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self) -> None:
+        """Remove all stored rows."""
+        with self._lock:
+            self._conn.execute("DELETE FROM transcripts")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit (no download) / miss (full download) counters and stored rows."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM transcripts"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _row_url(supabase_url: str, youtube_url_id: int, select: str) -> str:
+    return f"{supabase_url}/rest/v1/youtube_urls?id=eq.{youtube_url_id}&select={select}"
+
+
+def _fetch_steps(
+    store: Optional[TranscriptStore],
+    youtube_url_id: int,
+    supabase_url: str,
+    headers: Dict[str, str],
+    force: bool
+) -> Generator[_Request, httpx.Response, Dict[str, Any]]:
+    """
+    Request sequence for one row: yields requests, receives responses,
+    returns the row.
+    """
+    entry = store.get(youtube_url_id) if store is not None and not force else None
+
+    if entry is not None and store.is_fresh(entry):
+        store._count(hit=True)
+        return entry.data
+
+    column = store.version_column if store is not None else None
+
+    # 1. Cheap version probe
+    if entry is not None and column and entry.version is not None:
+        resp = yield _Request(_row_url(supabase_url, youtube_url_id, f"id,{column}"), headers)
+        if resp.status_code == 200:
+            rows = resp.json()
+            if rows and str(rows[0].get(column)) == entry.version:
+                store.touch(youtube_url_id)
+                store._count(hit=True)
+                return entry.data
+        elif resp.status_code == 400:
+            # Table has no such column: fall back to ETag revalidation
+            store.version_column = column = None
+
+    # 2. Full fetch, conditional if an ETag is known and no probe said "changed"
+    request_headers = dict(headers)
+    if entry is not None and entry.etag and not column:
+        request_headers["If-None-Match"] = entry.etag
+
+    select = f"{SELECT_COLUMNS},{column}" if column else SELECT_COLUMNS
+    resp = yield _Request(_row_url(supabase_url, youtube_url_id, select), request_headers)
+
+    if resp.status_code == 400 and column:
+        store.version_column = column = None
+        resp = yield _Request(_row_url(supabase_url, youtube_url_id, SELECT_COLUMNS), request_headers)
+
+    if resp.status_code == 304 and entry is not None:
+        store.touch(youtube_url_id)
+        store._count(hit=True)
+        return entry.data
+
+    resp.raise_for_status()
+    rows = resp.json()
+    if not rows:
+        raise ValueError(f"YouTube URL with ID {youtube_url_id} not found in Supabase")
+
+    return _store_row(store, rows[0], column, etag=resp.headers.get("etag"))
+
+
+def _store_row(
+    store: Optional[TranscriptStore],
+    row: Dict[str, Any],
+    column: Optional[str],
+    etag: Optional[str] = None
+) -> Dict[str, Any]:
+    """Strip the version column from a downloaded row and store it."""
+    version = row.pop(column, None) if column else None
+    if store is not None:
+        store.put(
+            row["id"],
+            row,
+            version=str(version) if version is not None else None,
+            etag=etag
+        )
+        store._count(hit=False)
+    return row
+
+
+# Scanner patterns for the array decoder; the scanning itself runs in C
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_SCALAR_END = re.compile(r'[\s,\]]')
+_NEXT_VALUE = re.compile(r'[^\s,]')
+
+
+class JSONArrayDecoder:
+    """
+    Incremental decoder for a streamed top-level JSON array.
+
+    feed() returns every element completed by the new text, so large
+    responses are decoded (and can be stored) row by row while downloading.
+    Only the new chunk is scanned (nesting depth, in-string and escape state
+    carry over), and each element is decoded once when it is complete, so
+    decoding stays linear in the response size.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Text of the unfinished element from earlier chunks (None between elements)
+        self._parts: Optional[List[str]] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        items = []
+        pos = 0
+        # Start of the unfinished element within this chunk
+        element_start = 0
+
+        while pos < len(chunk) and not self._done:
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+
+            if self._in_string:
+                pos = _STRING_BODY.match(chunk, pos).end()
+                if pos == len(chunk):
+                    break
+                if chunk[pos] == "\\":
+                    # Backslash at the end of the chunk, it escapes the next chunk's first character
+                    self._escape = True
+                    pos += 1
+                    continue
+                pos += 1
+                self._in_string = False
+                if self._depth == 0:
+                    items.append(self._complete(chunk, element_start, pos))
+                continue
+
+            if self._parts is None:
+                match = _NEXT_VALUE.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.start()
+                char = chunk[pos]
+                if not self._started:
+                    if char != "[":
+                        raise ValueError("Expected a JSON array")
+                    self._started = True
+                    pos += 1
+                elif char == "]":
+                    self._done = True
+                else:
+                    self._parts = []
+                    element_start = pos
+                    if char == '"':
+                        self._in_string = True
+                        pos += 1
+                    elif char in "[{":
+                        self._depth = 1
+                        pos += 1
+                continue
+
+            if self._depth == 0:
+                # Number, true, false or null: ends at the next separator
+                match = _SCALAR_END.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.start()
+                items.append(self._complete(chunk, element_start, pos))
+                continue
+
+            match = _STRUCTURE.search(chunk, pos)
+            if match is None:
+                break
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(self._complete(chunk, element_start, pos))
+
+        if self._parts is not None:
+            self._parts.append(chunk[element_start:])
+        return items
+
+    def _complete(self, chunk: str, start: int, end: int) -> Any:
+        """Decode the element that ends at chunk[end]."""
+        self._parts.append(chunk[start:end])
+        text = "".join(self._parts)
+        self._parts = None
+        return json.loads(text)
+
+
+def _headers(supabase_key: str) -> Dict[str, str]:
+    return {
+        "apikey": supabase_key,
+        "Authorization": f"Bearer {supabase_key}"
+    }
+
+
+_store: Optional[TranscriptStore] = None
+_store_loaded = False
+_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> Optional[TranscriptStore]:
+    """Return the process-wide transcript store (None if disabled)."""
+    global _store, _store_loaded
+    with _store_lock:
+        if not _store_loaded:
+            _store = TranscriptStore.from_env()
+            _store_loaded = True
+        return _store
+
+
+def fetch_youtube_row(
+    youtube_url_id: int,
+    supabase_url: str,
+    supabase_key: str,
+    *,
+    force: bool = False,
+    client: Optional[httpx.Client] = None
+) -> Dict[str, Any]:
+    """
+    Fetch a youtube_urls row (id, title, subtitles, url), served from the
+    local store when it is still current.
+
+    Args:
+        youtube_url_id: Supabase youtube_urls.id
+        supabase_url: Supabase base URL
+        supabase_key: API key for the REST API
+        force: Skip the local copy and download the row again
+        client: Optional httpx.Client to reuse
+
+    Returns:
+        Row dict
+
+    Raises:
+        ValueError: If the row does not exist
+    """
+    steps = _fetch_steps(get_transcript_store(), youtube_url_id, supabase_url, _headers(supabase_key), force)
+    own_client = client is None
+    client = client or httpx.Client()
+    try:
+        request = next(steps)
+        while True:
+            resp = client.get(request.url, headers=request.headers, timeout=REQUEST_TIMEOUT)
+            request = steps.send(resp)
+    except StopIteration as done:
+        return done.value
+    finally:
+        if own_client:
+            client.close()
+
+
+async def fetch_youtube_row_async(
+    youtube_url_id: int,
+    supabase_url: str,
+    supabase_key: str,
+    *,
+    force: bool = False,
+    client: Optional[httpx.AsyncClient] = None
+) -> Dict[str, Any]:
+    """Async variant of fetch_youtube_row."""
+    steps = _fetch_steps(get_transcript_store(), youtube_url_id, supabase_url, _headers(supabase_key), force)
+    own_client = client is None
+    client = client or httpx.AsyncClient()
+    try:
+        request = next(steps)
+        while True:
+            resp = await client.get(request.url, headers=request.headers, timeout=REQUEST_TIMEOUT)
+            request = steps.send(resp)
+    except StopIteration as done:
+        return done.value
+    finally:
+        if own_client:
+            await client.aclose()
+
+
+def _pages(ids: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _bulk_url(supabase_url: str, ids: List[int], select: str) -> str:
+    id_list = ",".join(str(i) for i in ids)
+    return f"{supabase_url}/rest/v1/youtube_urls?id=in.({id_list})&select={select}&order=id.asc"
+
+
+async def fetch_youtube_rows_async(
+    youtube_url_ids: Iterable[int],
+    supabase_url: str,
+    supabase_key: str,
+    *,
+    force: bool = False,
+    page_size: int = BULK_PAGE_SIZE,
+    client: Optional[httpx.AsyncClient] = None
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch many youtube_urls rows with id=in.(...) requests.
+
+    Stored rows are revalidated with one paged version probe; only new or
+    changed rows are downloaded, page by page, decoded while streaming and
+    written to the local store as they arrive.
+
+    Args:
+        youtube_url_ids: Supabase youtube_urls.id values
+        supabase_url: Supabase base URL
+        supabase_key: API key for the REST API
+        force: Ignore local copies and download every row
+        page_size: IDs per request
+        client: Optional httpx.AsyncClient to reuse
+
+    Returns:
+        Dict youtube_url_id -> row; IDs that do not exist are missing
+    """
+    store = get_transcript_store()
+    headers = _headers(supabase_key)
+    ids = list(dict.fromkeys(youtube_url_ids))
+    rows: Dict[int, Dict[str, Any]] = {}
+    own_client = client is None
+    client = client or httpx.AsyncClient()
+
+    try:
+        column = store.version_column if store is not None else None
+        entries = {}
+        if store is not None and not force:
+            for youtube_url_id in ids:
+                entry = store.get(youtube_url_id)
+                if entry is None:
+                    continue
+                if store.is_fresh(entry):
+                    rows[youtube_url_id] = entry.data
+                    store._count(hit=True)
+                elif column and entry.version is not None:
+                    entries[youtube_url_id] = entry
+
+        # 1. Version probe for stored rows
+        for page in _pages(list(entries), page_size):
+            if not column:
+                break
+            resp = await client.get(
+                _bulk_url(supabase_url, page, f"id,{column}"), headers=headers, timeout=REQUEST_TIMEOUT
+            )
+            if resp.status_code == 400:
+                store.version_column = column = None
+                break
+            resp.raise_for_status()
+            for probe in resp.json():
+                entry = entries.get(probe["id"])
+                if entry is not None and str(probe.get(column)) == entry.version:
+                    store.touch(entry.youtube_url_id)
+                    store._count(hit=True)
+                    rows[entry.youtube_url_id] = entry.data
+
+        # 2. Streamed download of everything else
+        missing = [i for i in ids if i not in rows]
+        for page in _pages(missing, page_size):
+            while True:
+                select = f"{SELECT_COLUMNS},{column}" if column else SELECT_COLUMNS
+                async with client.stream(
+                    "GET", _bulk_url(supabase_url, page, select), headers=headers, timeout=REQUEST_TIMEOUT
+                ) as resp:
+                    if resp.status_code == 400 and column:
+                        store.version_column = column = None
+                        continue
+                    if resp.status_code != 200:
+                        await resp.aread()
+                    resp.raise_for_status()
+
+                    decoder = JSONArrayDecoder()
+                    async for chunk in resp.aiter_text():
+                        for row in decoder.feed(chunk):
+                            rows[row["id"]] = _store_row(store, row, column)
+                break
+    finally:
+        if own_client:
+            await client.aclose()
+
+    return rows
@@ -3,7 +3,6 @@
 Create a showcase section in Moodle with all H5P content types.
 Marks broken content types with (-) in the title.
 """
-import json
 import os
 import sys
 import subprocess
@@ -25,6 +24,7 @@ from learning_path_generator import (
     build_interactive_video_h5p,
     build_image_hotspots_h5p,
 )
+import moodle_import
 
 # Content Types with their status
 # OK = renders correctly, BROKEN = only shows intro text
@@ -172,33 +172,8 @@ CONTENT_TYPES = [
 
 
 def import_h5p_to_moodle(h5p_path: str, courseid: int, title: str, section: int = 0) -> dict:
-    """Import H5P to Moodle via PHP script"""
-    # Copy to container
-    subprocess.run(
-        ["docker", "cp", h5p_path, "moodle-app:/tmp/showcase.h5p"],
-        check=True, capture_output=True
-    )
-
-    # Import with section parameter
-    cmd = [
-        "docker", "exec", "moodle-app", "php",
-        "/opt/bitnami/moodle/local/import_h5p.php",
-        f"--file=/tmp/showcase.h5p",
-        f"--title={title}",
-        f"--courseid={courseid}",
-        f"--section={section}"
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    for line in result.stdout.split("\n"):
-        if line.startswith("{"):
-            try:
-                return json.loads(line)
-            except json.JSONDecodeError:
-                pass
-
-    return {"status": "error", "message": result.stderr or result.stdout}
+    """Import H5P to Moodle via the shared import worker"""
+    return moodle_import.import_h5p_to_moodle(h5p_path, courseid, title, section=section)
 
 
 def get_next_section_number(courseid: int) -> int:
@@ -0,0 +1,38 @@
+"""
+Shared fixtures
+
+make_llm_client builds LLMClients whose pooled httpx clients answer through an
+httpx.MockTransport handler (or talk to a local mock server via base_url),
+so the real connection-pool path is exercised without network access.
+"""
+import httpx
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import LLMClient, LLMResponseCache, RateLimiter, UsageTracker
+
+
+@pytest.fixture
+def make_llm_client(tmp_path):
+    """
+    Factory: make_llm_client(handler, cache=False, **LLMClient kwargs).
+
+    Clients get their own usage tracker and rate limiter and retry without
+    backoff delays; cache=True adds a response cache in tmp_path.
+    """
+    def make(handler=None, *, cache: bool = False, **kwargs) -> LLMClient:
+        kwargs.setdefault("api_key", "test-key")
+        kwargs.setdefault("usage", UsageTracker())
+        kwargs.setdefault("rate_limiter", RateLimiter())
+        if cache:
+            kwargs["cache"] = LLMResponseCache(tmp_path / "cache.sqlite3", max_bytes=1_000_000)
+        if handler is not None:
+            kwargs["transport"] = httpx.MockTransport(handler)
+        client = LLMClient(**kwargs)
+        client._backoff = lambda attempt: 0
+        return client
+
+    return make
@@ -0,0 +1,135 @@
+"""
+Tests for the /metrics endpoint of the answer matcher API
+
+Validates that:
+1. Counters, gauges and histograms render in the Prometheus text format
+2. /api/match records its latency per path (exact, llm, fallback)
+3. Upstream errors and fallbacks are counted by reason
+"""
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.api import answer_matcher
+from src.api.match_cache import MatchCache
+from src.api.metrics import CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+from src.h5p.llm import get_llm_client
+from src.h5p.llm.mock_server import MockLLMServer
+
+
+MATCH_FIXTURE = (
+    re.compile(r"Gesprochene Antwort"),
+    {"match_score": 85, "is_correct": True, "feedback": "Gut gemacht!"}
+)
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """Value of one sample in a rendered exposition (0 if absent)."""
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    series = f"{name}{{{label_text}}}" if labels else name
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.split(" ")[-1])
+    return 0.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(answer_matcher, "OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(answer_matcher, "match_cache", MatchCache())
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(get_llm_client(), "cache", None)
+    monkeypatch.setattr(get_llm_client(), "max_retries", 0)
+    return TestClient(answer_matcher.app)
+
+
+def scrape(client: TestClient) -> str:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    return response.text
+
+
+def test_exposition_format():
+    registry = Registry()
+    requests = Counter("demo_requests_total", "Requests.", ["path"], registry=registry)
+    in_flight = Gauge("demo_in_flight", "In flight.", registry=registry)
+    latency = Histogram("demo_seconds", "Latency.", ["path"], registry=registry, buckets=(0.1, 1.0))
+
+    requests.labels(path="llm").inc()
+    requests.labels(path="llm").inc(2)
+    with in_flight.track_inprogress():
+        assert sample(registry.render(), "demo_in_flight") == 1
+    latency.labels(path="llm").observe(0.05)
+    latency.labels(path="llm").observe(0.5)
+    latency.labels(path="llm").observe(3)
+
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter" in text
+    assert sample(text, "demo_requests_total", path="llm") == 3
+    assert sample(text, "demo_in_flight") == 0
+    assert sample(text, "demo_seconds_bucket", path="llm", le="0.1") == 1
+    assert sample(text, "demo_seconds_bucket", path="llm", le="1.0") == 2
+    assert sample(text, "demo_seconds_bucket", path="llm", le="+Inf") == 3
+    assert sample(text, "demo_seconds_count", path="llm") == 3
+    assert sample(text, "demo_seconds_sum", path="llm") == pytest.approx(3.55)
+
+    with pytest.raises(ValueError):
+        requests.labels(other="x")
+    with pytest.raises(ValueError):
+        Counter("demo_requests_total", "Duplicate.", registry=registry)
+
+
+def test_latency_is_recorded_per_path(client, monkeypatch):
+    before = scrape(client)
+
+    response = client.post("/api/match", json={"spoken": "Photosynthese!", "expected": "photosynthese"})
+    assert response.json()["match_score"] == 100
+
+    with MockLLMServer(fixtures=[MATCH_FIXTURE]) as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        response = client.post("/api/match", json={"spoken": "Pflanzen machen Zucker", "expected": "Photosynthese"})
+    assert response.json()["match_score"] == 85
+
+    after = scrape(client)
+    count = "answer_matcher_request_duration_seconds_count"
+    assert sample(after, count, path="exact") - sample(before, count, path="exact") == 1
+    assert sample(after, count, path="llm") - sample(before, count, path="llm") == 1
+    llm_count = "answer_matcher_llm_duration_seconds_count"
+    assert sample(after, llm_count) - sample(before, llm_count) == 1
+    assert sample(after, "answer_matcher_requests_in_flight") == 0
+    assert sample(after, "answer_matcher_llm_requests_in_flight") == 0
+
+
+def test_upstream_errors_fall_back(client, monkeypatch):
+    before = scrape(client)
+
+    with MockLLMServer(error_rate=1.0) as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        response = client.post("/api/match", json={"spoken": "Photosynthese", "expected": "Fotosynthese"})
+    assert response.status_code == 200
+    assert response.json()["feedback"]
+
+    after = scrape(client)
+    errors = "answer_matcher_upstream_errors_total"
+    fallbacks = "answer_matcher_fallbacks_total"
+    count = "answer_matcher_request_duration_seconds_count"
+    assert sample(after, errors, reason="http_503") - sample(before, errors, reason="http_503") == 1
+    assert sample(after, fallbacks, reason="upstream_error") - sample(before, fallbacks, reason="upstream_error") == 1
+    assert sample(after, count, path="fallback") - sample(before, count, path="fallback") == 1
+
+
+def test_missing_api_key_is_counted(client, monkeypatch):
+    monkeypatch.setattr(answer_matcher, "OPENAI_API_KEY", None)
+    before = scrape(client)
+
+    client.post("/api/match", json={"spoken": "Zellkern", "expected": "Mitochondrium"})
+
+    after = scrape(client)
+    fallbacks = "answer_matcher_fallbacks_total"
+    assert sample(after, fallbacks, reason="no_api_key") - sample(before, fallbacks, reason="no_api_key") == 1
@@ -0,0 +1,57 @@
+"""
+Tests for the content-hash H5P build cache
+
+Unchanged build data must be served from the cache instead of rebuilt.
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.builders import H5PBuildCache, compute_build_key, get_builder
+
+
+TF_DATA = {"statement": "Python ist eine Programmiersprache", "correct": True}
+
+
+def counting_builder(content_type: str, calls: list):
+    builder = get_builder(content_type)
+
+    def _build(data, output_path):
+        calls.append(1)
+        return builder(data, output_path)
+    return _build
+
+
+def test_key_depends_on_type_and_data_only():
+    assert compute_build_key("truefalse", TF_DATA) == compute_build_key("truefalse", dict(reversed(TF_DATA.items())))
+    assert compute_build_key("truefalse", TF_DATA) != compute_build_key("truefalse", {**TF_DATA, "correct": False})
+    assert compute_build_key("truefalse", TF_DATA) != compute_build_key("multichoice", TF_DATA)
+
+
+def test_unchanged_data_is_served_from_cache(tmp_path):
+    cache = H5PBuildCache(tmp_path / "cache")
+    calls = []
+    builder = counting_builder("truefalse", calls)
+
+    first = cache.build("truefalse", TF_DATA, str(tmp_path / "a.h5p"), builder)
+    second = cache.build("truefalse", TF_DATA, str(tmp_path / "b.h5p"), builder)
+    in_memory = cache.build("truefalse", TF_DATA, None, builder)
+
+    assert len(calls) == 1
+    assert first == str(tmp_path / "a.h5p")
+    assert second == str(tmp_path / "b.h5p")
+    assert Path(second).read_bytes() == Path(first).read_bytes() == in_memory
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1}
+
+
+def test_bypass_rebuilds_and_refreshes(tmp_path):
+    cache = H5PBuildCache(tmp_path / "cache")
+    calls = []
+    builder = counting_builder("truefalse", calls)
+
+    cache.build("truefalse", TF_DATA, None, builder)
+    cache.bypass = True
+    cache.build("truefalse", TF_DATA, None, builder)
+
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 1
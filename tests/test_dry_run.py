@@ -0,0 +1,64 @@
+"""
+Tests for the dry-run mode of run_full_pipeline
+
+Runs all stages against the local mock LLM server and validates that:
+1. Every package is built and listed in the manifest with size and sha256
+2. Moodle import and course deletion are never called
+3. Timings are reported per stage
+"""
+import asyncio
+import hashlib
+import json
+
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p import run_pipeline
+from src.h5p.llm import get_llm_client
+from src.h5p.llm.mock_server import MockLLMServer
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    with MockLLMServer() as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "mock")
+        monkeypatch.setattr(get_llm_client(), "cache", None)
+        yield server
+
+
+def test_dry_run_builds_packages_and_writes_manifest(mock_llm, monkeypatch, tmp_path):
+    async def no_moodle(*args, **kwargs):
+        raise AssertionError("Moodle must not be called in a dry run")
+
+    monkeypatch.setattr(run_pipeline, "import_h5p_tracked_async", no_moodle)
+    monkeypatch.setattr(run_pipeline, "delete_moodle_course_async", no_moodle)
+
+    result = asyncio.run(run_pipeline.run_full_pipeline(
+        youtube_url_id=0,
+        milestone="mvp",
+        courseid=None,
+        delete_old_courseid=99,
+        skip_cache=True,
+        output_dir=str(tmp_path),
+        yt_data={"id": 0, "title": "Testvideo", "subtitles": "Machine Learning lernt aus Daten. " * 20, "url": ""},
+        dry_run=True
+    ))
+
+    assert result["status"] == "success"
+    assert result["successful_imports"] == 0
+
+    manifest = json.loads(Path(result["manifest"]).read_text(encoding="utf-8"))
+    assert manifest["title"] == "Testvideo"
+    assert [p["column"] for p in manifest["packages"]] == [1, 2, 3, 4]
+    for package in manifest["packages"]:
+        data = Path(package["h5p_path"]).read_bytes()
+        assert package["sha256"] == hashlib.sha256(data).hexdigest()
+        assert package["import_key"] == f"0:column:{package['column']}"
+
+    assert set(result["timings"]) >= {"stage1", "stage2", "stage3", "build", "total"}
+    assert "import" not in result["timings"]
+    assert len(result["timings"]["build"]) == 4
@@ -0,0 +1,31 @@
+"""
+Smoke tests for the legacy CLIs run as scripts
+
+Validates that:
+1. Each script still imports when started as `python src/h5p/<cli>.py`
+   (the shared llm package is then imported as top-level `llm`)
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.mark.parametrize("script", [
+    "learning_path_generator.py",
+    "cli_youtube_to_h5p_v2.py",
+    "multi_quiz_generator.py",
+])
+def test_cli_help(script):
+    result = subprocess.run(
+        [sys.executable, str(ROOT / "src" / "h5p" / script), "--help"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert "usage" in result.stdout.lower()
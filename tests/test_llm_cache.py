@@ -0,0 +1,104 @@
+"""
+Tests for the local LLM response cache
+
+Covers key stability, LRU eviction and the client integration.
+"""
+import asyncio
+import json
+
+import httpx
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import LLMResponseCache, compute_cache_key
+
+
+def test_cache_key_is_order_independent():
+    a = {"model": "m", "temperature": 0.5, "messages": [{"role": "user", "content": "x"}]}
+    b = {"messages": [{"role": "user", "content": "x"}], "temperature": 0.5, "model": "m"}
+
+    assert compute_cache_key(a) == compute_cache_key(b)
+    assert compute_cache_key(a) != compute_cache_key({**a, "temperature": 0.6})
+
+
+def test_get_set_roundtrip(tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3", max_bytes=10_000)
+
+    assert cache.get("k") is None
+    cache.set("k", '{"a": 1}', model="m")
+
+    assert cache.get("k") == '{"a": 1}'
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3", max_bytes=25)
+
+    cache.set("old", "x" * 10)
+    cache.set("used", "y" * 10)
+    cache.get("old")  # "used" is now least recently used
+    cache.set("new", "z" * 10)
+
+    assert cache.get("used") is None
+    assert cache.get("old") == "x" * 10
+    assert cache.get("new") == "z" * 10
+    assert cache.total_bytes() <= 25
+
+
+def test_client_serves_identical_requests_from_cache(make_llm_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        content = json.dumps({"n": len(calls)})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    client = make_llm_client(handler, cache=True)
+
+    first = asyncio.run(client.chat_json("Prompt"))
+    second = client.chat_json_sync("Prompt")
+    other = client.chat_json_sync("Anderer Prompt")
+
+    assert first == second == {"n": 1}
+    assert other == {"n": 2}
+    assert len(calls) == 2
+
+
+def test_bypass_refreshes_cache(make_llm_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        content = json.dumps({"n": len(calls)})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    client = make_llm_client(handler, cache=True)
+    client.chat_json_sync("Prompt")
+
+    client.cache_bypass = True
+    assert client.chat_json_sync("Prompt") == {"n": 2}
+
+    client.cache_bypass = False
+    assert client.chat_json_sync("Prompt") == {"n": 2}
+    assert len(calls) == 2
+
+
+def test_invalid_json_is_not_cached(make_llm_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "kein json"}}]})
+
+    client = make_llm_client(handler, cache=True)
+
+    for _ in range(2):
+        try:
+            client.chat_json_sync("Prompt")
+        except json.JSONDecodeError:
+            pass
+
+    assert len(calls) == 2
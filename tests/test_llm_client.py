@@ -0,0 +1,219 @@
+"""
+Tests for the shared LLM client
+
+Uses httpx.MockTransport (make_llm_client in conftest.py), no network access required.
+"""
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import LLMClient, LLMError, RateLimiter, backoff_delay, retry_after
+from src.h5p.llm import client as llm_module
+from src.h5p.llm.ratelimit import parse_duration
+from src.h5p import run_pipeline
+from src.h5p.pipeline import stage1_summarizer
+
+
+def completion(content: dict | str) -> httpx.Response:
+    if isinstance(content, dict):
+        content = json.dumps(content)
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def test_chat_json_sends_json_mode_and_parses(make_llm_client):
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["auth"] = request.headers["Authorization"]
+        seen["payload"] = json.loads(request.content)
+        return completion({"ok": True})
+
+    client = make_llm_client(handler, max_retries=2)
+    result = asyncio.run(client.chat_json("Prompt", max_tokens=123, temperature=0.1))
+
+    assert result == {"ok": True}
+    assert seen["auth"] == "Bearer test-key"
+    assert seen["payload"]["max_tokens"] == 123
+    assert seen["payload"]["response_format"] == {"type": "json_object"}
+    assert seen["payload"]["messages"][1]["content"] == "Prompt"
+
+
+def test_retries_transient_errors(make_llm_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        if len(calls) < 3:
+            return httpx.Response(503, text="overloaded")
+        return completion({"ok": True})
+
+    client = make_llm_client(handler, max_retries=2)
+
+    assert client.chat_json_sync("Prompt") == {"ok": True}
+    assert len(calls) == 3
+
+
+def test_client_errors_raise_without_retry(make_llm_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(400, text="bad request")
+
+    client = make_llm_client(handler, max_retries=2)
+
+    with pytest.raises(LLMError) as exc_info:
+        asyncio.run(client.chat_json("Prompt"))
+
+    assert exc_info.value.status_code == 400
+    assert len(calls) == 1
+
+
+def test_missing_api_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    client = LLMClient()
+
+    with pytest.raises(ValueError):
+        client.chat_json_sync("Prompt")
+
+
+def test_async_pool_is_reused_per_event_loop():
+    client = LLMClient(api_key="test-key")
+
+    async def get_pool():
+        return client._get_async_client(), client._get_async_client()
+
+    first_a, first_b = asyncio.run(get_pool())
+    second_a, _ = asyncio.run(get_pool())
+
+    assert first_a is first_b
+    assert second_a is not first_a
+
+
+def test_pool_of_a_loop_in_another_thread_is_closed_there():
+    client = LLMClient(api_key="test-key")
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+
+    async def get_pool():
+        return client._get_async_client()
+
+    try:
+        stale = asyncio.run_coroutine_threadsafe(get_pool(), other_loop).result()
+        asyncio.run(get_pool())
+        for _ in range(100):
+            if stale.is_closed:
+                break
+            time.sleep(0.01)
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+
+    assert stale.is_closed
+
+
+def test_close_async_clients_closes_shared_pools(monkeypatch):
+    monkeypatch.setattr(llm_module, "_default_client", LLMClient(api_key="test-key"))
+
+    async def scenario():
+        pools = (llm_module.get_llm_client()._get_async_client(), stage1_summarizer._get_supabase_client())
+        await run_pipeline.close_async_clients()
+        return pools
+
+    llm_pool, supabase_pool = asyncio.run(scenario())
+
+    assert llm_pool.is_closed
+    assert supabase_pool.is_closed
+
+
+def test_rate_limit_honours_retry_after(monkeypatch, make_llm_client):
+    calls = []
+    sleeps = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "250"}, text="rate limited")
+        return completion({"ok": True})
+
+    limiter = RateLimiter()
+    client = make_llm_client(handler, max_retries=2)
+    client.rate_limiter = limiter
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+
+    assert client.chat_json_sync("Prompt") == {"ok": True}
+    assert len(calls) == 2
+    assert 0.25 <= sleeps[0] <= 0.275
+    assert limiter.stats()["throttled"] == 1
+
+
+@pytest.mark.parametrize("mode", ["async", "sync", "stream"])
+def test_failed_attempts_return_their_reservation(mode, make_llm_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after": "0"}, text="rate limited")
+        usage = {"prompt_tokens": 20, "completion_tokens": 30, "total_tokens": 50}
+        if json.loads(request.content).get("stream"):
+            body = (
+                'data: {"choices": [{"delta": {"content": "{\\"ok\\": true}"}}]}\n\n'
+                f'data: {json.dumps({"choices": [], "usage": usage})}\n\n'
+                "data: [DONE]\n\n"
+            )
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"ok": true}'}}], "usage": usage})
+
+    limiter = RateLimiter(tpm=6000)
+    client = make_llm_client(handler, max_retries=2)
+    client.rate_limiter = limiter
+
+    if mode == "async":
+        result = asyncio.run(client.chat_json("Prompt", max_tokens=1000))
+    elif mode == "sync":
+        result = client.chat_json_sync("Prompt", max_tokens=1000)
+    else:
+        result = asyncio.run(client.chat_json_stream("Prompt", max_tokens=1000))
+
+    assert result == {"ok": True}
+    assert len(calls) == 2
+    # Only the tokens the successful attempt used are gone from the bucket
+    assert limiter._tokens._level == pytest.approx(6000 - 50, abs=5)
+
+
+def test_token_bucket_spaces_requests():
+    limiter = RateLimiter(rpm=60, tpm=6000)
+
+    assert limiter.reserve(1000) == 0.0
+    # Bucket holds one minute (6000 tokens); the next 6000 must wait ~10 s
+    assert limiter.reserve(6000) == pytest.approx(10, abs=0.1)
+
+    limiter.release(6000)
+    assert limiter.reserve(500) == pytest.approx(0, abs=0.1)
+
+
+def test_retry_hints_and_backoff():
+    assert retry_after({"retry-after": "3"}) == 3.0
+    assert retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert retry_after({}) is None
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("120ms") == pytest.approx(0.12)
+
+    delays = [backoff_delay(3) for _ in range(20)]
+    assert all(2.0 <= d <= 4.0 for d in delays)
+    assert len(set(delays)) > 1
+
+    limiter = RateLimiter()
+    limiter.observe({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "2s"})
+    assert 1.9 < limiter.reserve(10) <= 2.0
@@ -0,0 +1,102 @@
+"""
+Tests for streamed LLM responses
+
+Validates that:
+1. Array elements are reported as soon as they are complete, across chunk boundaries
+2. SSE lines are decoded into content deltas
+3. The client streams, caches and replays responses with the same callbacks
+"""
+import asyncio
+import json
+
+import httpx
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import IncrementalJSONParser, parse_sse_line
+
+
+RESPONSE = {
+    "title": "KI {Grundlagen}",
+    "sections": [
+        {"title": "Abschnitt 1: \"Daten\" [Teil 1]", "concepts": [{"term": "KI"}]},
+        {"title": "Abschnitt 2: Training}", "concepts": []},
+    ],
+    "key_terms": ["KI", "Training"],
+}
+
+
+def chunks(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_parser_emits_items_across_chunk_boundaries():
+    text = json.dumps(RESPONSE, ensure_ascii=False)
+
+    for size in (1, 3, 7, len(text)):
+        parser = IncrementalJSONParser()
+        items = []
+        for chunk in chunks(text, size):
+            items.extend(parser.feed(chunk))
+
+        assert items == [
+            ("sections", RESPONSE["sections"][0]),
+            ("sections", RESPONSE["sections"][1]),
+        ]
+        assert parser.result() == RESPONSE
+
+
+def test_parser_reports_first_item_before_the_rest_arrives():
+    text = json.dumps(RESPONSE, ensure_ascii=False)
+    split = text.index("Abschnitt 2")
+    parser = IncrementalJSONParser()
+
+    assert parser.feed(text[:split]) == [("sections", RESPONSE["sections"][0])]
+    assert parser.feed(text[split:]) == [("sections", RESPONSE["sections"][1])]
+
+
+def test_parse_sse_line():
+    event = {"choices": [{"delta": {"content": "{\"a\""}}]}
+
+    assert parse_sse_line("data: " + json.dumps(event)) == "{\"a\""
+    assert parse_sse_line("data: {\"choices\": [{\"delta\": {\"role\": \"assistant\"}}]}") == ""
+    assert parse_sse_line(": keep-alive") == ""
+    assert parse_sse_line("data: [DONE]") is None
+
+
+def sse_body(text: str) -> bytes:
+    lines = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]})
+        for chunk in chunks(text, 5)
+    ]
+    return ("\n\n".join(lines + ["data: [DONE]"]) + "\n\n").encode("utf-8")
+
+
+def test_client_streams_caches_and_replays(make_llm_client):
+    text = json.dumps(RESPONSE, ensure_ascii=False)
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, content=sse_body(text), headers={"content-type": "text/event-stream"})
+
+    client = make_llm_client(handler, cache=True)
+
+    async def run():
+        items = []
+        result = await client.chat_json_stream("prompt", on_item=lambda k, v: items.append((k, v)))
+        return result, items
+
+    first, first_items = asyncio.run(run())
+    second, second_items = asyncio.run(run())
+
+    assert len(requests) == 1
+    assert requests[0]["stream"] is True
+    assert first == second == RESPONSE
+    assert first_items == second_items == [("sections", s) for s in RESPONSE["sections"]]
+
+    # Streamed and non-streamed calls share the cache entry
+    assert asyncio.run(client.chat_json("prompt")) == RESPONSE
+    assert len(requests) == 1
@@ -0,0 +1,89 @@
+"""
+Tests for token budgeting and usage accounting
+
+Validates that:
+1. Prompt tokens are counted and max_tokens is capped to the context window
+2. Usage from the response (or a local estimate) is recorded per stage
+3. The run report aggregates tokens and latency per stage
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import (
+    TokenBudgetError,
+    UsageRecord,
+    UsageTracker,
+    chars_for_tokens,
+    completion_budget,
+    count_tokens,
+    scaled_max_tokens,
+)
+from src.h5p.llm import tokens
+
+
+def test_completion_budget_caps_to_context(monkeypatch):
+    monkeypatch.setitem(tokens.MODEL_CONTEXT_TOKENS, "tiny-model", 4000)
+
+    assert completion_budget(1000, 2000, "tiny-model") <= 2000
+    assert completion_budget(3000, 2000, "tiny-model") < 1000
+    with pytest.raises(TokenBudgetError):
+        completion_budget(3990, 2000, "tiny-model")
+
+
+def test_sizing_helpers():
+    assert scaled_max_tokens(1000, 0.6, 1200, 3000) == 1200
+    assert scaled_max_tokens(4000, 0.6, 1200, 3000) == 2400
+    assert scaled_max_tokens(9000, 0.6, 1200, 3000) == 3000
+
+    text = "Machine Learning lernt aus Daten. " * 200
+    window = chars_for_tokens(text, 100)
+    assert abs(count_tokens(text[:window]) - 100) <= 10
+
+
+def test_client_records_usage_per_stage(make_llm_client):
+    tracker = UsageTracker()
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": json.dumps({"ok": True})}}],
+            "usage": {"prompt_tokens": 42, "completion_tokens": 7, "total_tokens": 49},
+        })
+
+    client = make_llm_client(handler, cache=True, usage=tracker)
+
+    asyncio.run(client.chat_json("Prompt", stage="stage1", max_tokens=500))
+    asyncio.run(client.chat_json("Prompt", stage="stage1", max_tokens=500))  # cached
+
+    records = tracker.records()
+    assert sent[0]["max_tokens"] == 500
+    assert [(r.stage, r.prompt_tokens, r.completion_tokens, r.cached) for r in records] == [
+        ("stage1", 42, 7, False),
+        ("stage1", records[1].prompt_tokens, records[1].completion_tokens, True),
+    ]
+    assert records[1].estimated is True
+    assert records[1].prompt_tokens > 0
+
+
+def test_report_aggregates_per_stage():
+    tracker = UsageTracker()
+    for latency in (1.0, 2.0, 3.0):
+        tracker.record(UsageRecord("stage3", "m", 100, 50, latency, max_tokens=2000))
+    tracker.record(UsageRecord("stage1", "m", 1000, 500, 0.0, max_tokens=3000, cached=True))
+
+    report = tracker.report()
+
+    assert report["stages"]["stage3"]["calls"] == 3
+    assert report["stages"]["stage3"]["total_tokens"] == 450
+    assert report["stages"]["stage3"]["latency_p50_s"] == 2.0
+    assert report["stages"]["stage1"]["cached_calls"] == 1
+    assert report["stages"]["stage1"]["max_tokens_reserved"] == 0
+    assert report["total"]["prompt_tokens"] == 1300
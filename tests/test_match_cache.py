@@ -0,0 +1,182 @@
+"""
+Tests for the answer match cache (src/api/match_cache.py)
+
+Validates that:
+1. Verdicts are found by (expected, context, normalized spoken) and expire
+   by TTL and LRU
+2. The near-duplicate tier is off by default; when enabled it reuses
+   verdicts for trivially different transcripts, but not across a
+   negation, a different number or another card
+3. Concurrent identical requests share one computation
+4. /api/match answers repeated transcripts without a second LLM call
+"""
+import asyncio
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.api import answer_matcher
+from src.api.match_cache import MatchCache, dice_coefficient
+from src.h5p.llm import get_llm_client
+from src.h5p.llm.mock_server import MockLLMServer
+
+
+VERDICT = {"match_score": 90, "is_correct": True, "feedback": "Richtig!", "path": "llm"}
+
+
+def test_exact_tier_is_keyed_by_card_and_transcript():
+    cache = MatchCache(near_threshold=0)
+    cache.set("Photosynthese", "Wie nennt man...?", "pflanzen machen zucker", VERDICT)
+
+    assert cache.get("Photosynthese", "Wie nennt man...?", "pflanzen machen zucker") == (VERDICT, "hit")
+    assert cache.get("Photosynthese", None, "pflanzen machen zucker") == (None, "miss")
+    assert cache.get("Zellatmung", "Wie nennt man...?", "pflanzen machen zucker") == (None, "miss")
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.api.match_cache.time.monotonic", lambda: now[0])
+    cache = MatchCache(max_entries=2, ttl=60, near_threshold=0)
+
+    cache.set("a", None, "eins", VERDICT)
+    cache.set("a", None, "zwei", VERDICT)
+    cache.get("a", None, "eins")
+    cache.set("a", None, "drei", VERDICT)
+
+    assert cache.get("a", None, "zwei") == (None, "miss")
+    assert cache.get("a", None, "eins")[1] == "hit"
+    assert len(cache) == 2
+
+    now[0] += 61
+    assert cache.get("a", None, "eins") == (None, "miss")
+    assert len(cache) == 1
+
+
+def test_near_duplicate_tier():
+    cache = MatchCache(near_threshold=0.9)
+    cache.set("Photosynthese", None, "die pflanze macht aus licht zucker", VERDICT)
+
+    assert dice_coefficient("die pflanze macht aus licht zucker", "die pflanze macht aus licht zuckerr") >= 0.9
+    assert cache.get("Photosynthese", None, "die pflanze macht aus licht zuckerr") == (VERDICT, "near")
+    assert cache.get("Photosynthese", None, "der mensch atmet sauerstoff ein") == (None, "miss")
+    assert cache.get("Zellatmung", None, "die pflanze macht aus licht zuckerr") == (None, "miss")
+
+
+def test_near_duplicate_tier_is_off_by_default():
+    cache = MatchCache()
+    cache.set("Photosynthese", None, "die pflanze macht aus licht zucker", VERDICT)
+
+    assert cache.near_threshold == 0
+    assert cache.get("Photosynthese", None, "die pflanze macht aus licht zuckerr") == (None, "miss")
+
+
+def test_near_duplicate_tier_respects_negation():
+    cache = MatchCache(near_threshold=0.8)
+    cache.set("Wal", None, "der wal ist ein säugetier", VERDICT)
+
+    assert dice_coefficient("der wal ist ein säugetier", "der wal ist kein säugetier") >= 0.8
+    assert cache.get("Wal", None, "der wal ist kein säugetier") == (None, "miss")
+
+
+@pytest.mark.parametrize("cached, spoken, typo", [
+    (
+        "die französische revolution begann 1789",
+        "die französische revolution begann 1798",
+        "die französische revolutio begann 1789"
+    ),
+    (
+        "der zweite weltkrieg endete 1945",
+        "der zweite weltkrieg endete 1954",
+        "der zweite weltkrig endete 1945"
+    ),
+])
+def test_near_duplicate_tier_respects_numbers(cached, spoken, typo):
+    cache = MatchCache(near_threshold=0.9)
+    cache.set("Jahr", None, cached, VERDICT)
+
+    assert dice_coefficient(cached, spoken) >= 0.9
+    assert cache.get("Jahr", None, spoken) == (None, "miss")
+    assert cache.get("Jahr", None, typo) == (VERDICT, "near")
+
+
+def test_concurrent_identical_requests_share_one_computation():
+    cache = MatchCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return VERDICT
+
+    async def main():
+        return await asyncio.gather(*(
+            cache.get_or_compute("Photosynthese", None, "zucker aus licht", compute)
+            for _ in range(5)
+        ))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ["miss"] + ["shared"] * 4
+    assert all(result == VERDICT for result, _ in results)
+    assert cache.get("Photosynthese", None, "zucker aus licht") == (VERDICT, "hit")
+
+
+def test_uncacheable_results_are_not_stored():
+    cache = MatchCache()
+
+    async def compute():
+        return {**VERDICT, "path": "fallback"}
+
+    result, source = asyncio.run(cache.get_or_compute(
+        "a", None, "antwort", compute, cacheable=lambda r: r["path"] == "llm"
+    ))
+
+    assert source == "miss"
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(answer_matcher, "OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(answer_matcher, "match_cache", MatchCache(near_threshold=0.9))
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(get_llm_client(), "cache", None)
+    monkeypatch.setattr(get_llm_client(), "max_retries", 0)
+    return TestClient(answer_matcher.app)
+
+
+def test_match_endpoint_reuses_verdicts(client, monkeypatch):
+    fixture = (re.compile(r"Gesprochene Antwort"), {"match_score": 80, "is_correct": True, "feedback": "Gut!"})
+    card = {"expected": "Photosynthese", "context": "Wie gewinnen Pflanzen Energie?"}
+
+    with MockLLMServer(fixtures=[fixture]) as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        first = client.post("/api/match", json={**card, "spoken": "Aus Licht machen sie Zucker"})
+        again = client.post("/api/match", json={**card, "spoken": "aus licht machen sie zucker!"})
+        near = client.post("/api/match", json={**card, "spoken": "Aus Licht machen sie Zuckerr"})
+        requests = server.stats()["requests"]
+
+    assert requests == 1
+    assert first.json()["match_score"] == again.json()["match_score"] == near.json()["match_score"] == 80
+    assert again.json()["spoken_normalized"] == "aus licht machen sie zucker"
+    assert near.json()["spoken_normalized"] == "aus licht machen sie zuckerr"
+    assert client.get("/api/health").json()["match_cache"]["near_hits"] == 1
+
+
+def test_upstream_errors_are_not_cached(client, monkeypatch):
+    card = {"expected": "Mitochondrium", "spoken": "Das Kraftwerk der Zelle"}
+
+    with MockLLMServer(error_rate=1.0) as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        client.post("/api/match", json=card)
+        client.post("/api/match", json=card)
+        requests = server.stats()["requests"]
+
+    assert requests == 2
@@ -0,0 +1,102 @@
+"""
+Tests for the local mock LLM server and the offline benchmark
+
+Validates that:
+1. The shared client talks to the mock server via a configurable base URL
+2. Built-in fixtures answer every pipeline stage, recorded responses are replayed
+3. Injected 429s are retried and SSE streaming reports usage
+4. The benchmark runs the full pipeline offline (dry run) and reports stage timings
+"""
+import asyncio
+import json
+
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import LLMResponseCache, compute_cache_key
+from src.h5p.llm import get_llm_client
+from src.h5p.llm.mock_server import MockLLMServer
+from src.h5p.pipeline import resources
+
+
+@pytest.fixture(autouse=True)
+def clean_limits():
+    yield
+    resources.reset_limits()
+
+
+def test_fixtures_answer_single_and_batched_stage3(make_llm_client):
+    with MockLLMServer() as server:
+        client = make_llm_client(api_key="mock", base_url=server.base_url)
+        single = client.chat_json_sync("Generiere H5P-Content für den Typ: multichoice\n...")
+        batch = client.chat_json_sync("### AKTIVITÄT 0: truefalse\n...\n### AKTIVITÄT 1: blanks\n...")
+
+    assert len(single["answers"]) == 3
+    assert [(item["index"], "statement" in item["content"]) for item in batch["items"]] == [(0, True), (1, False)]
+
+
+def test_rate_limits_are_retried_and_streams_report_usage(make_llm_client):
+    items = []
+
+    with MockLLMServer(rate_limit_rate=0.5, retry_after_ms=1, seed=3) as server:
+        client = make_llm_client(api_key="mock", base_url=server.base_url)
+
+        async def run():
+            plans = await asyncio.gather(*(
+                client.chat_json("Lernpfad-Plan", use_cache=False) for _ in range(4)
+            ))
+            streamed = await client.chat_json_stream(
+                "Lernpfad-Plan", on_item=lambda key, item: items.append(key), use_cache=False
+            )
+            return plans, streamed
+
+        plans, streamed = asyncio.run(run())
+        stats = server.stats()
+
+    assert all(len(plan["learning_path"]) == 10 for plan in plans)
+    assert stats["rate_limited"] > 0
+    assert client.rate_limiter.stats()["throttled"] == stats["rate_limited"]
+    assert streamed == plans[0]
+    assert items.count("columns") == 4
+    assert client.usage.records()[-1].estimated is False
+
+
+def test_recorded_responses_are_replayed(tmp_path, make_llm_client):
+    recorded = LLMResponseCache(tmp_path / "recorded.sqlite3", max_bytes=1_000_000)
+
+    with MockLLMServer(recorded=recorded) as server:
+        client = make_llm_client(api_key="mock", base_url=server.base_url)
+        payload = client._payload(
+            [{"role": "user", "content": "Anything"}], 100, 0.0, False, None
+        )
+        recorded.set(compute_cache_key(payload), "recorded answer", payload["model"])
+
+        content = client.chat_sync(
+            [{"role": "user", "content": "Anything"}], max_tokens=100, temperature=0.0, json_mode=False
+        )
+
+    assert content == "recorded answer"
+    assert server.stats()["replayed"] == 1
+
+
+def test_benchmark_runs_pipeline_offline(monkeypatch, tmp_path):
+    from src.h5p import run_benchmark
+
+    with MockLLMServer() as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "mock")
+        monkeypatch.setattr(get_llm_client(), "cache", None)
+
+        report = asyncio.run(run_benchmark.run_benchmark(
+            2, parallel=2, stage3_batch_size=3, transcript_chars=800, output_dir=str(tmp_path)
+        ))
+
+    assert report["successful"] == 2, report["errors"]
+    assert report["stages"]["stage1"]["count"] == 2
+    assert report["stages"]["stage3"]["count"] > 0
+    assert report["stages"]["build"]["count"] == 8
+    assert report["throughput"]["videos_per_min"] > 0
+    assert "import" not in report["stages"]
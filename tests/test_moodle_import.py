@@ -0,0 +1,199 @@
+"""
+Tests for the persistent Moodle import worker and pool
+
+A small Python script stands in for `import_h5p.php --stdin`.
+
+Validates that:
+1. Many packages share one worker process
+2. A crashed worker reports its stderr tail and is restarted
+3. A hung worker is killed after the timeout and restarted
+4. The pool imports in parallel and keeps input order
+5. Incremental imports skip unchanged and update changed packages
+6. Import state written by several instances keeps every entry
+"""
+import hashlib
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p import moodle_import
+from src.h5p.moodle_import import ImportState, MoodleImportPool, MoodleImportWorker, import_h5p_tracked
+
+
+FAKE_WORKER = textwrap.dedent("""
+    import base64, json, os, sys, time
+    count = 0
+    for line in sys.stdin:
+        request = json.loads(line)
+        count += 1
+        if request.get("title") == "crash":
+            print("PHP Fatal error: Allowed memory size exhausted", file=sys.stderr, flush=True)
+            sys.exit(1)
+        if request.get("title") == "slow":
+            time.sleep(0.2)
+        if request.get("title") == "hang":
+            time.sleep(60)
+        print("PHP Notice: something harmless", flush=True)
+        data = base64.b64decode(request.get("data", ""))
+        print(json.dumps({
+            "status": "success",
+            "cmid": request.get("cmid") or count,
+            "courseid": request.get("courseid"),
+            "bytes": len(data),
+            "pid": os.getpid(),
+            "request": {k: v for k, v in request.items() if k != "data"},
+        }), flush=True)
+""")
+
+
+class FakeWorker(MoodleImportWorker):
+    spawned = 0
+
+    def _command(self):
+        FakeWorker.spawned += 1
+        return [sys.executable, "-c", FAKE_WORKER]
+
+
+def test_many_packages_share_one_worker(tmp_path):
+    FakeWorker.spawned = 0
+    package = tmp_path / "quiz.h5p"
+    package.write_bytes(b"PK-fake-package")
+
+    worker = FakeWorker()
+    try:
+        results = worker.import_packages([
+            {"h5p_path": str(package), "title": "A", "courseid": 7},
+            {"h5p_path": str(package), "title": "B", "create_course": True, "course_name": "Neu"},
+        ])
+    finally:
+        worker.close()
+
+    assert [r["cmid"] for r in results] == [1, 2]
+    assert results[0]["bytes"] == len(b"PK-fake-package")
+    assert results[0]["request"]["filename"] == "quiz.h5p"
+    assert results[0]["request"]["sha256"] == hashlib.sha256(b"PK-fake-package").hexdigest()
+    assert results[0]["request"]["courseid"] == 7
+    assert results[1]["request"]["createcourse"] is True
+    assert results[1]["request"]["coursename"] == "Neu"
+    assert FakeWorker.spawned == 1
+
+
+def test_crashed_worker_reports_error_and_restarts(tmp_path):
+    FakeWorker.spawned = 0
+    package = tmp_path / "quiz.h5p"
+    package.write_bytes(b"x")
+
+    worker = FakeWorker()
+    try:
+        crashed = worker.import_package(str(package), "crash", courseid=1)
+        recovered = worker.import_package(str(package), "ok", courseid=1)
+    finally:
+        worker.close()
+
+    assert crashed["status"] == "error"
+    assert "Allowed memory size exhausted" in crashed["stderr"]
+    assert "Allowed memory size exhausted" in crashed["message"]
+    assert recovered["status"] == "success"
+    assert FakeWorker.spawned == 2
+
+
+def test_hung_worker_times_out_and_restarts(tmp_path):
+    FakeWorker.spawned = 0
+    package = tmp_path / "quiz.h5p"
+    package.write_bytes(b"x")
+
+    worker = FakeWorker(timeout=0.5)
+    try:
+        started = time.monotonic()
+        hung = worker.import_package(str(package), "hang", courseid=1)
+        elapsed = time.monotonic() - started
+        recovered = worker.import_package(str(package), "ok", courseid=1)
+    finally:
+        worker.close()
+
+    assert hung["status"] == "error"
+    assert "did not answer" in hung["message"]
+    assert elapsed < 10
+    assert recovered["status"] == "success"
+    assert FakeWorker.spawned == 2
+
+
+def test_missing_package_is_reported():
+    worker = FakeWorker()
+    result = worker.import_package("/nonexistent/file.h5p", "A", courseid=1)
+
+    assert result["status"] == "error"
+    assert worker._proc is None
+
+
+def test_pool_imports_in_parallel_in_input_order(tmp_path):
+    FakeWorker.spawned = 0
+    packages = []
+    for i in range(4):
+        package = tmp_path / f"quiz_{i}.h5p"
+        package.write_bytes(b"x" * (i + 1))
+        packages.append({"h5p_path": str(package), "title": "slow", "courseid": 1})
+
+    pool = MoodleImportPool(size=2, worker_factory=FakeWorker)
+    try:
+        results = pool.import_packages(packages)
+    finally:
+        pool.close()
+
+    assert [r["bytes"] for r in results] == [1, 2, 3, 4]
+    assert len({r["pid"] for r in results}) == 2
+    assert FakeWorker.spawned == 2
+
+
+def test_incremental_import_skips_unchanged_and_updates_changed(tmp_path, monkeypatch):
+    pool = MoodleImportPool(size=1, worker_factory=FakeWorker)
+    monkeypatch.setattr(moodle_import, "_pool", pool)
+    state = ImportState(tmp_path / "state.json")
+    package = tmp_path / "col.h5p"
+
+    def sync(**kwargs):
+        return import_h5p_tracked("42:column:1", str(package), 7, "Teil 1", state=state, **kwargs)
+
+    try:
+        package.write_bytes(b"v1")
+        created = sync()
+        unchanged = sync(incremental=True)
+
+        package.write_bytes(b"v2")
+        updated = sync(incremental=True)
+
+        package.write_bytes(b"v3")
+        replaced = sync(incremental=True, update_in_place=False)
+    finally:
+        pool.close()
+
+    assert created["action"] == "created"
+    assert unchanged == {"status": "success", "action": "unchanged", "cmid": created["cmid"], "courseid": 7, "title": "Teil 1"}
+    assert updated["action"] == "updated"
+    assert updated["request"]["cmid"] == created["cmid"]
+    assert replaced["action"] == "replaced"
+    assert "cmid" not in replaced["request"]
+
+    # State survives a reload and points at the re-created activity
+    entry = ImportState(tmp_path / "state.json").get(7, "42:column:1")
+    assert entry["cmid"] == replaced["cmid"]
+    assert entry["sha256"] == hashlib.sha256(b"v3").hexdigest()
+
+
+def test_import_state_keeps_entries_of_other_writers(tmp_path):
+    # Two processes (e.g. a batch and a single run) with their own instance
+    batch = ImportState(tmp_path / "state.json")
+    single = ImportState(tmp_path / "state.json")
+
+    batch.record(7, "1:column:1", 11, "a" * 64, "Teil 1")
+    single.record(8, "2:column:1", 21, "b" * 64, "Teil 1")
+    batch.record(7, "1:column:2", 12, "c" * 64, "Teil 2")
+
+    reloaded = ImportState(tmp_path / "state.json")
+    assert reloaded.get(7, "1:column:1")["cmid"] == 11
+    assert reloaded.get(8, "2:column:1")["cmid"] == 21
+    assert reloaded.get(7, "1:column:2")["cmid"] == 12
+    assert batch.get(8, "2:column:1")["cmid"] == 21
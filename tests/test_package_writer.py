@@ -0,0 +1,122 @@
+"""
+Tests for in-memory H5P package assembly
+
+Packages are built as bytes or written straight to the target file,
+without temporary directories. subContentIds are stable for identical input.
+"""
+import io
+import json
+import re
+import tempfile
+import zipfile
+
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p import package_builder
+from src.h5p.builders import build_h5p
+from src.h5p.course_schema import CoursePresentation
+from src.h5p.package_writer import write_h5p_package
+from src.h5p.learning_path_generator import _create_h5p_package_with_image
+
+
+@pytest.fixture(autouse=True)
+def no_temp_dirs(monkeypatch):
+    def _fail(*args, **kwargs):
+        raise AssertionError("temporary directory used")
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", _fail)
+
+
+def read_package(data: bytes) -> dict:
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def test_write_returns_bytes_without_output_path():
+    data = write_h5p_package(
+        {"question": "Frage?"},
+        {"title": "Quiz", "mainLibrary": "H5P.MultiChoice"},
+        files={"content/images/a.png": b"\x89PNG", "content/css/x.css": "body {}"}
+    )
+
+    entries = read_package(data)
+    assert sorted(entries) == [
+        "content/content.json", "content/css/x.css", "content/images/a.png", "h5p.json"
+    ]
+    assert json.loads(entries["content/content.json"]) == {"question": "Frage?"}
+    assert entries["content/images/a.png"] == b"\x89PNG"
+
+
+def test_file_output_matches_bytes_output(tmp_path):
+    data = {"statement": "Python ist eine Programmiersprache", "correct": True}
+    output_path = tmp_path / "tf.h5p"
+
+    assert build_h5p("truefalse", data, str(output_path), use_cache=False) == str(output_path)
+    in_memory = build_h5p("truefalse", data, use_cache=False)
+
+    assert read_package(output_path.read_bytes()) == read_package(in_memory)
+
+
+def test_legacy_image_package_is_built_in_memory():
+    data = _create_h5p_package_with_image(
+        {"image": {"path": "images/infographic.png"}},
+        {"title": "Hotspots", "mainLibrary": "H5P.ImageHotspots"},
+        None,
+        "images/infographic.png",
+        b"image-bytes"
+    )
+
+    entries = read_package(data)
+    assert entries["content/images/infographic.png"] == b"image-bytes"
+    assert b"content/css/dark-theme.css" in entries["h5p.json"]
+    assert "content/css/dark-theme.css" in entries
+
+
+def test_identical_input_gives_identical_bytes():
+    column = {
+        "title": "Teil 1",
+        "activities": [
+            {"content_type": "summary", "content": {"statements": [{"correct": "A", "wrong": ["B"]}]}},
+            {"content_type": "truefalse", "content": {"question": "<p>X</p>", "correct": "true"}},
+        ]
+    }
+
+    first = build_h5p("column", column, use_cache=False)
+    second = build_h5p("column", column, use_cache=False)
+    summary = build_h5p("summary", {"statements": [{"correct": "A", "wrong": ["B"]}]}, use_cache=False)
+
+    assert first == second
+    assert summary == build_h5p("summary", {"statements": [{"correct": "A", "wrong": ["B"]}]}, use_cache=False)
+    with zipfile.ZipFile(io.BytesIO(first)) as zf:
+        assert {info.date_time for info in zf.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+
+
+def test_course_subcontent_ids_hash_course_once(monkeypatch):
+    course = CoursePresentation.model_validate({
+        "metadata": {"title": "Kurs", "description": "Intro"},
+        "slides": [
+            {"title": f"Folie {i}", "elements": [
+                {"type": "text", "content": f"<p>Text {i}</p>"},
+                {"type": "truefalse", "question": f"Aussage {i}", "correct": True},
+            ]}
+            for i in range(20)
+        ]
+    })
+    hashed = []
+    derive = package_builder.derive_subcontent_id
+    monkeypatch.setattr(
+        package_builder, "derive_subcontent_id",
+        lambda *parts: hashed.append(len(json.dumps(parts, default=str))) or derive(*parts)
+    )
+
+    first = package_builder.H5PPackageBuilder(course)._build_content_json()
+    second = package_builder.H5PPackageBuilder(course)._build_content_json()
+    ids = re.findall(r'"subContentId": "([^"]+)"', json.dumps(first))
+
+    assert first == second
+    assert len(ids) == len(set(ids)) >= 40
+    # The whole course is hashed once per builder, not once per ID
+    assert sum(size > 1000 for size in hashed) == 2
@@ -0,0 +1,107 @@
+"""
+Tests for the pipelined Stage 2 → Stage 3 → build → import executor
+
+Validates that:
+1. Activities are generated while the plan is still being produced
+2. A column is built and imported before later columns finish generating
+3. Imports run in plan order and errors are captured per package
+"""
+import asyncio
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.pipeline.executor import PipelinedExecutor, plan_units
+
+
+COLUMN_PLAN = {
+    "columns": [
+        {"title": "Teil 1", "activities": [{"order": 1, "content_type": "truefalse"}]},
+        {"title": "Teil 2", "activities": [
+            {"order": 2, "content_type": "truefalse"},
+            {"order": 3, "content_type": "truefalse"},
+        ]},
+    ],
+    "learning_path": [{"order": i, "content_type": "truefalse"} for i in (1, 2, 3)],
+}
+
+
+def test_plan_units_for_columns_and_legacy():
+    units = plan_units(COLUMN_PLAN, [1, 2, 3])
+    assert [(u.kind, u.title, u.keys) for u in units] == [
+        ("column", "Teil 1", [1]), ("column", "Teil 2", [2, 3])
+    ]
+
+    legacy = plan_units({"learning_path": [{"content_type": "summary"}]}, ["#0"])
+    assert [(u.kind, u.keys) for u in legacy] == [("activity", ["#0"])]
+
+
+def test_pipeline_overlaps_stages_and_keeps_import_order():
+    events = []
+
+    async def plan(on_activity):
+        for activity in COLUMN_PLAN["learning_path"]:
+            events.append(("planned", activity["order"]))
+            on_activity(activity)
+            await asyncio.sleep(0.01)
+        return COLUMN_PLAN
+
+    async def generate(activity):
+        events.append(("generate", activity["order"]))
+        # Column 2 is slow, column 1 fast
+        await asyncio.sleep(0.05 if activity["order"] > 1 else 0)
+        events.append(("generated", activity["order"]))
+        return {"order": activity["order"]}
+
+    def build(unit, contents):
+        return {"title": unit.title, "h5p_path": f"/tmp/{unit.index}.h5p",
+                "orders": [contents[k]["order"] for k in unit.keys]}
+
+    async def import_package(unit, built):
+        events.append(("import", unit.index))
+        return {**built, "moodle": {"status": "success"}}
+
+    executor = PipelinedExecutor(generate, build, import_package, max_concurrency=4)
+    run = asyncio.run(executor.run(plan))
+
+    # Generation of activity 1 starts before planning has finished
+    assert events.index(("generate", 1)) < events.index(("planned", 3))
+    # Column 1 is imported while column 2 is still generating
+    assert events.index(("import", 0)) < events.index(("generated", 2))
+    assert [r["title"] for r in run.results] == ["Teil 1", "Teil 2"]
+    assert run.results[1]["orders"] == [2, 3]
+    assert [c["order"] for c in run.contents] == [1, 2, 3]
+    # Every activity is generated exactly once
+    assert sorted(e[1] for e in events if e[0] == "generate") == [1, 2, 3]
+
+
+def test_imports_follow_plan_order_and_errors_are_captured():
+    plan_data = {"learning_path": [{"order": i, "content_type": "truefalse"} for i in (1, 2, 3)]}
+    imported = []
+
+    async def plan(on_activity):
+        return plan_data
+
+    async def generate(activity):
+        # Later activities finish first
+        await asyncio.sleep(0.01 * (4 - activity["order"]))
+        if activity["order"] == 2:
+            raise RuntimeError("LLM down")
+        return {"order": activity["order"]}
+
+    def build(unit, contents):
+        content = contents[unit.keys[0]]
+        if "_error" in content:
+            return {"title": unit.title, "error": content["_error"]}
+        return {"title": unit.title, "h5p_path": "x.h5p"}
+
+    async def import_package(unit, built):
+        imported.append(unit.index)
+        return {**built, "moodle": {"status": "success"}}
+
+    run = asyncio.run(PipelinedExecutor(generate, build, import_package).run(plan))
+
+    assert imported == [0, 2]
+    assert [("error" in r) for r in run.results] == [False, True, False]
+    assert run.contents[1]["_error"] == "LLM down"
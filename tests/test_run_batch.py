@@ -0,0 +1,112 @@
+"""
+Tests for the batch pipeline runner
+
+run_full_pipeline is replaced by a stub, no Supabase/LLM/Moodle needed.
+"""
+import asyncio
+import io
+import json
+
+import pytest
+from click.testing import CliRunner
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p import run_batch
+from src.h5p.pipeline import resources
+
+
+@pytest.fixture(autouse=True)
+def clean_limits():
+    yield
+    resources.reset_limits()
+
+
+def test_parse_ids_merges_list_and_range():
+    assert run_batch.parse_ids("7, 3,3", "4-6") == [3, 4, 5, 6, 7]
+    assert run_batch.parse_ids(None, None) == []
+
+
+def test_run_batch_streams_one_line_per_video(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def fake_pipeline(youtube_url_id, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if youtube_url_id == 2:
+            raise RuntimeError("kaputt")
+        return {"status": "success", "output_dir": kwargs["output_dir"], "prefetched": kwargs["yt_data"] is not None}
+
+    async def fake_prefetch(youtube_url_ids):
+        return {i: {"id": i, "subtitles": "x"} for i in youtube_url_ids if i != 4}
+
+    monkeypatch.setattr(run_batch, "run_full_pipeline", fake_pipeline)
+    monkeypatch.setattr(run_batch, "prefetch_youtube_rows", fake_prefetch)
+    stream = io.StringIO()
+
+    summary = asyncio.run(
+        run_batch.run_batch([1, 2, 3, 4], stream, video_concurrency=2, output_dir="/tmp/batch")
+    )
+
+    records = {r["youtube_url_id"]: r for r in map(json.loads, stream.getvalue().splitlines())}
+
+    assert set(records) == {1, 2, 3, 4}
+    assert records[2]["status"] == "error"
+    assert records[2]["result"]["message"] == "kaputt"
+    assert records[1]["result"]["output_dir"] == "/tmp/batch/1"
+    assert records[1]["result"]["prefetched"] is True
+    assert records[4]["result"]["prefetched"] is False
+    assert summary["successful"] == 3
+    assert summary["failed"] == 1
+    assert peak == 2
+
+
+def test_main_writes_only_json_lines_to_stdout(monkeypatch):
+    async def chatty_pipeline(youtube_url_id, **kwargs):
+        # Stages print plain-text progress to stdout
+        print(f"Generating content for activity {youtube_url_id}...")
+        return {"status": "success"}
+
+    async def fake_prefetch(youtube_url_ids):
+        return {}
+
+    monkeypatch.setattr(run_batch, "run_full_pipeline", chatty_pipeline)
+    monkeypatch.setattr(run_batch, "prefetch_youtube_rows", fake_prefetch)
+
+    result = CliRunner().invoke(run_batch.main, ["--ids", "1,2", "--results-file", "-"])
+
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert sorted(r["youtube_url_id"] for r in records) == [1, 2]
+    assert "Generating content for activity 1..." in result.stderr
+
+
+def test_resource_limits_cap_concurrency():
+    async def scenario():
+        resources.configure_limits(llm=2)
+        running = 0
+        peak = 0
+
+        async def call():
+            nonlocal running, peak
+            async with resources.resource_slot("llm"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_unknown_resource_is_rejected():
+    with pytest.raises(ValueError):
+        resources.configure_limits(gpu=1)
@@ -0,0 +1,134 @@
+"""
+Tests for the local Stage 1 cache tier
+
+Validates that:
+1. Cached scripts are served from memory/disk without any Supabase call
+2. New scripts are uploaded in the background (write-behind)
+3. Failed uploads stay pending and are retried on flush, also after a restart
+4. Raw and normalized transcripts are cached separately
+"""
+import asyncio
+
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.pipeline import stage1_summarizer
+from src.h5p.pipeline.script_cache import ScriptCache
+
+
+SCRIPT = {"title": "KI", "summary": "S", "sections": [], "key_terms": ["KI"]}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ScriptCache(tmp_path / "scripts.sqlite3", max_entries=10, memory_entries=2)
+    monkeypatch.setattr(stage1_summarizer, "get_script_cache", lambda: cache)
+    return cache
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = ScriptCache(tmp_path / "scripts.sqlite3", max_entries=2, memory_entries=1)
+    cache.put(1, "a", {"n": 1})
+    cache.put(2, "b", {"n": 2})
+
+    assert cache.get(2, "b") == {"n": 2}  # memory
+    assert cache.get(1, "a") == {"n": 1}  # disk
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["disk_hits"] == 1
+
+    cache.put(3, "c", {"n": 3})  # evicts least recently used on disk (2)
+    assert ScriptCache(tmp_path / "scripts.sqlite3").get(2, "b") is None
+    assert cache.get(3, "c") == {"n": 3}
+
+
+def test_cached_run_needs_no_network(cache, monkeypatch):
+    remote_calls = []
+    llm_calls = []
+
+    async def fake_remote_get(youtube_url_id, transcript_hash):
+        remote_calls.append("get")
+        return None
+
+    async def fake_remote_put(youtube_url_id, transcript_hash, script):
+        remote_calls.append("put")
+        return True
+
+    async def fake_windows(transcript, on_section=None):
+        llm_calls.append(transcript)
+        return dict(SCRIPT)
+
+    monkeypatch.setattr(stage1_summarizer, "get_cached_script", fake_remote_get)
+    monkeypatch.setattr(stage1_summarizer, "cache_script", fake_remote_put)
+    monkeypatch.setattr(stage1_summarizer, "summarize_windows", fake_windows)
+
+    async def run():
+        first = await stage1_summarizer.summarize_transcript("Hallo", youtube_url_id=5)
+        pending = await stage1_summarizer.flush_script_cache()
+        second = await stage1_summarizer.summarize_transcript("Hallo", youtube_url_id=5)
+        return first, pending, second
+
+    first, pending, second = asyncio.run(run())
+
+    assert first == second == SCRIPT
+    assert pending == 0
+    assert remote_calls == ["get", "put"]
+    assert len(llm_calls) == 1
+    assert cache.stats()["pending_uploads"] == 0
+
+
+def test_raw_and_normalized_runs_use_separate_entries(cache, monkeypatch):
+    llm_calls = []
+
+    async def no_remote(*args):
+        return None
+
+    async def fake_windows(transcript, on_section=None):
+        llm_calls.append(transcript)
+        return {**SCRIPT, "title": transcript}
+
+    monkeypatch.setattr(stage1_summarizer, "get_cached_script", no_remote)
+    monkeypatch.setattr(stage1_summarizer, "cache_script", no_remote)
+    monkeypatch.setattr(stage1_summarizer, "summarize_windows", fake_windows)
+    transcript = "Hallo, ähm, Welt"
+
+    async def run():
+        normalized = await stage1_summarizer.summarize_transcript(transcript, youtube_url_id=5)
+        raw = await stage1_summarizer.summarize_transcript(transcript, youtube_url_id=5, normalize=False)
+        normalized_again = await stage1_summarizer.summarize_transcript(transcript, youtube_url_id=5)
+        return normalized, raw, normalized_again
+
+    normalized, raw, normalized_again = asyncio.run(run())
+
+    assert normalized["title"] == normalized_again["title"] == "Hallo Welt"
+    assert raw["title"] == transcript
+    assert llm_calls == ["Hallo Welt", transcript]
+
+
+def test_failed_upload_is_retried_on_flush(tmp_path):
+    path = tmp_path / "scripts.sqlite3"
+    attempts = []
+
+    async def failing_upload(youtube_url_id, transcript_hash, script):
+        attempts.append(youtube_url_id)
+        raise ConnectionError("Supabase down")
+
+    async def working_upload(youtube_url_id, transcript_hash, script):
+        attempts.append(youtube_url_id)
+        return True
+
+    async def first_run():
+        cache = ScriptCache(path)
+        cache.write_behind(1, "h", SCRIPT, failing_upload)
+        return await cache.flush(failing_upload)
+
+    assert asyncio.run(first_run()) == 1
+
+    # Next process: entry is still served locally and uploaded on flush
+    cache = ScriptCache(path)
+    assert cache.get(1, "h") == SCRIPT
+    assert asyncio.run(cache.flush(working_upload)) == 0
+    assert cache.stats()["pending_uploads"] == 0
+    assert attempts[-1] == 1
@@ -0,0 +1,175 @@
+"""
+Tests for map-reduce Stage 1 summarization
+
+Validates that long transcripts:
+1. Are split into overlapping windows covering the whole text
+2. Are summarized window by window instead of being truncated
+3. Merge into one script with deduplicated sections and key terms
+4. Retry failed windows and are never cached when windows are missing
+"""
+import asyncio
+import json
+import re
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.pipeline import stage1_summarizer
+from src.h5p.pipeline.stage1_summarizer import merge_scripts, split_transcript
+
+
+def make_transcript(sentences: int) -> str:
+    return " ".join(f"Satz {i} erklärt etwas über Machine Learning." for i in range(sentences))
+
+
+def test_short_transcript_is_one_window():
+    assert split_transcript("kurz", window_chars=100) == ["kurz"]
+
+
+def test_windows_overlap_and_cover_everything():
+    transcript = make_transcript(200)
+    windows = split_transcript(transcript, window_chars=1000, overlap_chars=200)
+
+    assert len(windows) > 1
+    assert all(len(w) <= 1000 for w in windows)
+    assert windows[0].startswith("Satz 0 ")
+    assert windows[-1].endswith("Satz 199 erklärt etwas über Machine Learning.")
+    # Every sentence survives, consecutive windows share text
+    for i in range(200):
+        assert any(f"Satz {i} " in w for w in windows)
+    for left, right in zip(windows, windows[1:]):
+        assert right[:50] in left
+
+
+def test_merge_dedupes_sections_concepts_and_terms():
+    partials = [
+        {
+            "title": "KI Teil 1",
+            "summary": "Erster Teil.",
+            "sections": [
+                {"title": "Abschnitt 1: Einführung", "concepts": [{"type": "DEFINITION", "term": "KI"}]},
+                {"title": "Abschnitt 2: Training", "concepts": [{"type": "PROZESS", "name": "Training"}]},
+            ],
+            "key_terms": ["KI", "Training"],
+            "visual_opportunities": ["Flowchart Training"],
+        },
+        {
+            "title": "KI Teil 2",
+            "summary": "Zweiter Teil.",
+            "sections": [
+                {"title": "Abschnitt 1: training", "concepts": [
+                    {"type": "PROZESS", "name": "training"},
+                    {"type": "FAKT", "statement": "Mehr Daten helfen"},
+                ]},
+                {"title": "Abschnitt 2: Anwendung", "concepts": []},
+            ],
+            "key_terms": ["ki", "Anwendung"],
+            "visual_opportunities": ["Flowchart Training"],
+        },
+    ]
+
+    merged = merge_scripts(partials, title="KI", summary="Alles über KI.")
+
+    assert merged["title"] == "KI"
+    assert [s["title"] for s in merged["sections"]] == [
+        "Abschnitt 1: Einführung", "Abschnitt 2: Training", "Abschnitt 3: Anwendung"
+    ]
+    assert len(merged["sections"][1]["concepts"]) == 2
+    assert merged["key_terms"] == ["KI", "Training", "Anwendung"]
+    assert merged["visual_opportunities"] == ["Flowchart Training"]
+
+
+def test_long_transcript_is_summarized_per_window(monkeypatch):
+    monkeypatch.setattr(stage1_summarizer, "WINDOW_CHARS", 1000)
+    monkeypatch.setattr(stage1_summarizer, "WINDOW_OVERLAP_CHARS", 200)
+    transcript = make_transcript(100)
+    map_inputs = []
+
+    async def fake_call_openai(prompt, content, on_item=None):
+        if prompt == stage1_summarizer.REDUCE_PROMPT:
+            assert len(json.loads(content)) == len(map_inputs)
+            return {"title": "Gesamt", "summary": "Gesamtzusammenfassung."}
+        map_inputs.append(content)
+        return {
+            "title": f"Teil {len(map_inputs)}",
+            "summary": "Teil.",
+            "sections": [{"title": f"Abschnitt {len(map_inputs)}", "concepts": []}],
+            "key_terms": ["Machine Learning"],
+        }
+
+    monkeypatch.setattr(stage1_summarizer, "call_openai", fake_call_openai)
+
+    result = asyncio.run(stage1_summarizer.summarize_transcript(transcript))
+
+    assert len(map_inputs) > 1
+    assert "Satz 99 " in map_inputs[-1]
+    assert result["title"] == "Gesamt"
+    assert result["key_terms"] == ["Machine Learning"]
+
+
+def _fake_map(map_inputs, fail):
+    async def fake_call_openai(prompt, content, on_item=None):
+        if prompt == stage1_summarizer.REDUCE_PROMPT:
+            return {"title": "Gesamt", "summary": "Gesamtzusammenfassung."}
+        map_inputs.append(content)
+        if fail(content):
+            raise ValueError("invalid JSON")
+        return {
+            "title": "Teil",
+            "summary": "Teil.",
+            "sections": [],
+            "key_terms": [re.search(r"Satz \d+", content).group()],
+        }
+    return fake_call_openai
+
+
+def _record_cache_writes(monkeypatch) -> list:
+    writes = []
+
+    async def fake_cache_script(youtube_url_id, transcript_hash, script):
+        writes.append(script)
+        return True
+
+    monkeypatch.setattr(stage1_summarizer, "get_script_cache", lambda: None)
+    monkeypatch.setattr(stage1_summarizer, "get_cached_script", lambda *args: asyncio.sleep(0))
+    monkeypatch.setattr(stage1_summarizer, "cache_script", fake_cache_script)
+    return writes
+
+
+def test_failed_window_is_retried(monkeypatch):
+    monkeypatch.setattr(stage1_summarizer, "WINDOW_CHARS", 1000)
+    monkeypatch.setattr(stage1_summarizer, "WINDOW_OVERLAP_CHARS", 200)
+    writes = _record_cache_writes(monkeypatch)
+    transcript = make_transcript(100)
+    windows = split_transcript(transcript, window_chars=1000, overlap_chars=200)
+    map_inputs = []
+    monkeypatch.setattr(
+        stage1_summarizer,
+        "call_openai",
+        _fake_map(map_inputs, lambda content: content == windows[1] and map_inputs.count(content) == 1)
+    )
+
+    result = asyncio.run(stage1_summarizer.summarize_transcript(transcript, youtube_url_id=7))
+
+    assert map_inputs.count(windows[1]) == 2
+    assert len(result["key_terms"]) == len(windows)
+    assert "_missing_windows" not in result
+    assert writes == [result]
+
+
+def test_incomplete_script_is_not_cached(monkeypatch):
+    monkeypatch.setattr(stage1_summarizer, "WINDOW_CHARS", 1000)
+    monkeypatch.setattr(stage1_summarizer, "WINDOW_OVERLAP_CHARS", 200)
+    writes = _record_cache_writes(monkeypatch)
+    transcript = make_transcript(100)
+    windows = split_transcript(transcript, window_chars=1000, overlap_chars=200)
+    map_inputs = []
+    monkeypatch.setattr(stage1_summarizer, "call_openai", _fake_map(map_inputs, lambda content: content == windows[1]))
+
+    result = asyncio.run(stage1_summarizer.summarize_transcript(transcript, youtube_url_id=7))
+
+    assert map_inputs.count(windows[1]) == 1 + stage1_summarizer.WINDOW_RETRIES
+    assert len(result["key_terms"]) == len(windows) - 1
+    assert "_missing_windows" not in result
+    assert writes == []
@@ -0,0 +1,163 @@
+"""
+Tests for batched Stage 3 generation
+
+Validates that:
+1. Several activities of a column are generated with one LLM call
+2. Items that are missing or fail validate_content fall back to single calls
+3. Groups never cross column boundaries and results keep plan order
+4. Fallback single calls stay within max_concurrency
+"""
+import asyncio
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.pipeline import stage3_generator
+from src.h5p.pipeline.executor import PipelinedExecutor
+
+
+def truefalse(statement: str) -> dict:
+    return {
+        "title": "Aussage",
+        "statement": statement,
+        "correct": True,
+        "feedback_correct": "Richtig",
+        "feedback_wrong": "Falsch"
+    }
+
+
+PLAN = {
+    "columns": [
+        {"title": "Teil 1", "activities": [
+            {"order": 1, "content_type": "truefalse", "brief": "A"},
+            {"order": 2, "content_type": "blanks", "brief": "B"},
+            {"order": 3, "content_type": "truefalse", "brief": "C"},
+        ]},
+        {"title": "Teil 2", "activities": [
+            {"order": 4, "content_type": "truefalse", "brief": "D"},
+        ]},
+    ],
+}
+PLAN["learning_path"] = [a for column in PLAN["columns"] for a in column["activities"]]
+
+
+def test_batch_groups_stay_within_columns():
+    assert stage3_generator.batch_groups(PLAN, 2) == [[0, 1], [2], [3]]
+    assert stage3_generator.batch_groups(PLAN, 4) == [[0, 1, 2], [3]]
+    assert stage3_generator.batch_groups(PLAN, 1) == [[0], [1], [2], [3]]
+
+
+def test_invalid_batch_items_fall_back_to_single_calls(monkeypatch):
+    calls = []
+    singles = []
+
+    async def fake_call_openai(prompt, concepts_json, on_item=None, max_tokens=2000):
+        calls.append(prompt)
+        return {"items": [
+            {"index": 0, "content": truefalse("Aussage A")},
+            # Blanks without enough gaps fails validation
+            {"index": 1, "content": {"title": "Lücken", "text": "Kein *Wort*", "description": ""}},
+        ]}
+
+    async def fake_generate(activity, structured_script, on_item=None):
+        singles.append(activity["order"])
+        return {"single": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "call_openai", fake_call_openai)
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    results = asyncio.run(stage3_generator.generate_h5p_content_batch(
+        PLAN["columns"][0]["activities"], {"key_terms": ["KI"]}
+    ))
+
+    assert len(calls) == 1
+    assert "AKTIVITÄT 2: truefalse" in calls[0]
+    assert results[0]["statement"] == "Aussage A"
+    assert results[0]["_meta"]["order"] == 1
+    # Invalid blanks and the missing third item are generated one by one
+    assert sorted(singles) == [2, 3]
+    assert results[1:] == [{"single": 2}, {"single": 3}]
+
+
+def test_batch_fallbacks_respect_max_concurrency(monkeypatch):
+    in_flight = 0
+    peak = 0
+
+    async def failing_call_openai(prompt, concepts_json, on_item=None, max_tokens=2000):
+        raise RuntimeError("upstream down")
+
+    async def fake_generate(activity, structured_script, on_item=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"order": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "call_openai", failing_call_openai)
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    results = asyncio.run(
+        stage3_generator.generate_all_content(PLAN, {}, max_concurrency=1, batch_size=3)
+    )
+
+    # The whole failed batch falls back to single calls, one at a time
+    assert peak == 1
+    assert [r["order"] for r in results] == [1, 2, 3, 4]
+
+
+def test_generate_all_content_batches_per_column(monkeypatch):
+    batches = []
+
+    async def fake_batch(activities, structured_script):
+        batches.append([a["order"] for a in activities])
+        return [{"order": a["order"]} for a in activities]
+
+    async def fake_generate(activity, structured_script):
+        return {"order": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content_batch", fake_batch)
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    results = asyncio.run(
+        stage3_generator.generate_all_content(PLAN, {}, max_concurrency=2, batch_size=3)
+    )
+
+    assert batches == [[1, 2, 3]]
+    assert [r["order"] for r in results] == [1, 2, 3, 4]
+
+
+def test_executor_generates_streamed_columns_in_batches():
+    batches = []
+
+    async def plan(on_activity, on_column=None):
+        for column in PLAN["columns"]:
+            for activity in column["activities"]:
+                on_activity(activity)
+            on_column(column)
+            await asyncio.sleep(0)
+        return PLAN
+
+    async def generate(activity):
+        batches.append([activity["order"]])
+        return {"order": activity["order"]}
+
+    async def generate_batch(activities):
+        batches.append([a["order"] for a in activities])
+        return [{"order": a["order"]} for a in activities]
+
+    def build(unit, contents):
+        return {"title": unit.title, "h5p_path": f"/tmp/{unit.index}.h5p"}
+
+    async def import_package(unit, built):
+        return built
+
+    executor = PipelinedExecutor(
+        generate, build, import_package, max_concurrency=2, generate_batch=generate_batch, batch_size=2
+    )
+    run = asyncio.run(executor.run(plan))
+
+    assert sorted(batches) == [[1, 2], [3], [4]]
+    assert [c["order"] for c in run.contents] == [1, 2, 3, 4]
+    assert [r["title"] for r in run.results] == ["Teil 1", "Teil 2"]
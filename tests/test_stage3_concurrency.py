@@ -0,0 +1,95 @@
+"""
+Tests for concurrent Stage 3 content generation
+
+Validates that generate_all_content:
+1. Keeps results in plan order
+2. Never exceeds the configured concurrency limit
+3. Captures per-activity errors without aborting the run
+"""
+import asyncio
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.pipeline import stage3_generator
+
+
+def make_plan(count: int) -> dict:
+    return {
+        "learning_path": [
+            {"order": i + 1, "content_type": "truefalse", "brief": f"Aktivitaet {i + 1}"}
+            for i in range(count)
+        ]
+    }
+
+
+def test_results_keep_plan_order(monkeypatch):
+    async def fake_generate(activity, structured_script):
+        # Later activities finish first
+        await asyncio.sleep(0.01 * (10 - activity["order"]))
+        return {"order": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    results = asyncio.run(
+        stage3_generator.generate_all_content(make_plan(6), {}, max_concurrency=6)
+    )
+
+    assert [r["order"] for r in results] == [1, 2, 3, 4, 5, 6]
+
+
+def test_concurrency_limit_is_respected(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def fake_generate(activity, structured_script):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"order": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    asyncio.run(stage3_generator.generate_all_content(make_plan(8), {}, max_concurrency=3))
+
+    assert peak == 3
+
+
+def test_default_is_sequential(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def fake_generate(activity, structured_script):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        return {"order": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    asyncio.run(stage3_generator.generate_all_content(make_plan(4), {}))
+
+    assert peak == 1
+
+
+def test_errors_are_captured_per_activity(monkeypatch):
+    async def fake_generate(activity, structured_script):
+        if activity["order"] == 2:
+            raise RuntimeError("LLM kaputt")
+        return {"order": activity["order"]}
+
+    monkeypatch.setattr(stage3_generator, "generate_h5p_content", fake_generate)
+
+    results = asyncio.run(
+        stage3_generator.generate_all_content(make_plan(3), {}, max_concurrency=3)
+    )
+
+    assert results[0] == {"order": 1}
+    assert results[1]["_error"] == "LLM kaputt"
+    assert results[1]["_activity"]["order"] == 2
+    assert results[2] == {"order": 3}
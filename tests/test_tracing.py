@@ -0,0 +1,162 @@
+"""
+Tests for the tracing spans (src/h5p/tracing.py)
+
+Validates that:
+1. Spans record duration, attributes, errors and their parent, also across
+   asyncio tasks and worker threads
+2. JSON-lines and OTLP/JSON exporters write one record per span
+3. A dry pipeline run yields stage, LLM and build spans below a single
+   "pipeline" span, with token and byte counts
+"""
+import asyncio
+import json
+
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p import run_pipeline
+from src.h5p.llm import get_llm_client
+from src.h5p.llm.mock_server import MockLLMServer
+from src.h5p.tracing import (
+    JSONLinesExporter,
+    MemoryExporter,
+    OTLPJSONExporter,
+    Tracer,
+    current_span,
+    traced,
+)
+
+
+def test_span_records_duration_attributes_and_parent():
+    exporter = MemoryExporter()
+    tracer = Tracer([exporter])
+
+    with tracer.span("outer", video=1) as outer:
+        with tracer.span("inner") as inner:
+            current_span().set(tokens=42).add("retries").add("retries")
+        assert current_span() is outer
+
+    assert [s.name for s in exporter.spans] == ["inner", "outer"]
+    assert inner.parent_id == outer.span_id
+    assert inner.trace_id == outer.trace_id
+    assert outer.parent_id is None
+    assert inner.attributes == {"tokens": 42, "retries": 2}
+    assert outer.attributes == {"video": 1}
+    assert outer.duration_s >= inner.duration_s >= 0
+    assert outer.end_ns >= outer.start_ns
+
+
+def test_span_outside_of_tracing_is_noop():
+    current_span().set(tokens=1).add("retries")
+    assert current_span().attributes == {}
+
+
+def test_error_is_recorded_and_reraised():
+    exporter = MemoryExporter()
+    tracer = Tracer([exporter])
+
+    with pytest.raises(ValueError):
+        with tracer.span("failing"):
+            raise ValueError("boom")
+
+    assert exporter.spans[0].status == "error"
+    assert exporter.spans[0].error == "ValueError: boom"
+
+
+def test_parent_is_kept_across_tasks_and_threads(monkeypatch):
+    exporter = MemoryExporter()
+    tracer = Tracer([exporter])
+    monkeypatch.setattr("src.h5p.tracing._tracer", tracer)
+
+    @traced("llm.chat")
+    async def call():
+        await asyncio.sleep(0.01)
+
+    @traced()
+    def build():
+        return 1
+
+    async def main():
+        with tracer.span("pipeline") as root:
+            await asyncio.gather(call(), call(), asyncio.to_thread(build))
+        return root
+
+    root = asyncio.run(main())
+
+    children = [s for s in exporter.spans if s.name != "pipeline"]
+    assert sorted(s.name for s in children) == ["llm.chat", "llm.chat", build.__qualname__]
+    assert all(s.parent_id == root.span_id for s in children)
+
+
+def test_file_exporters(tmp_path):
+    jsonl_path = tmp_path / "trace.jsonl"
+    otlp_path = tmp_path / "trace.otlp.jsonl"
+    tracer = Tracer([JSONLinesExporter(str(jsonl_path)), OTLPJSONExporter(str(otlp_path), "test")])
+
+    with tracer.span("build", bytes=1024, cached=False, ratio=0.5, types=["a", "b"]):
+        with tracer.span("child"):
+            pass
+    tracer.close()
+
+    records = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert [r["name"] for r in records] == ["child", "build"]
+    assert records[1]["attributes"]["bytes"] == 1024
+    assert records[0]["parent_id"] == records[1]["span_id"]
+    assert records[1]["start"].endswith("Z") and records[1]["duration_s"] >= 0
+
+    requests = [json.loads(line) for line in otlp_path.read_text().splitlines()]
+    resource = requests[1]["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "test"
+    span = resource["scopeSpans"][0]["spans"][0]
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    assert "parentSpanId" not in span
+    assert requests[0]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["parentSpanId"] == span["spanId"]
+    assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+    assert span["status"] == {"code": 1}
+    attributes = {a["key"]: a["value"] for a in span["attributes"]}
+    assert attributes["bytes"] == {"intValue": "1024"}
+    assert attributes["cached"] == {"boolValue": False}
+    assert attributes["ratio"] == {"doubleValue": 0.5}
+    assert attributes["types"]["arrayValue"]["values"][0] == {"stringValue": "a"}
+
+
+def test_pipeline_run_is_traced(monkeypatch, tmp_path):
+    exporter = MemoryExporter()
+    monkeypatch.setattr("src.h5p.tracing._tracer", Tracer([exporter]))
+
+    with MockLLMServer() as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "mock")
+        monkeypatch.setattr(get_llm_client(), "cache", None)
+
+        result = asyncio.run(run_pipeline.run_full_pipeline(
+            youtube_url_id=0,
+            milestone="mvp",
+            courseid=None,
+            skip_cache=True,
+            output_dir=str(tmp_path),
+            yt_data={"id": 0, "title": "Testvideo", "subtitles": "Machine Learning lernt aus Daten. " * 20, "url": ""},
+            dry_run=True
+        ))
+
+    assert result["status"] == "success"
+    spans = exporter.spans
+    root = [s for s in spans if s.name == "pipeline"]
+    assert len(root) == 1
+    assert root[0].attributes["dry_run"] is True
+    assert all(s.trace_id == root[0].trace_id for s in spans)
+
+    by_id = {s.span_id: s for s in spans}
+    names = [s.name for s in spans]
+    assert names.count("build") == len(result["timings"]["build"])
+    assert names.count("stage3") == len(result["timings"]["stage3"])
+    assert "fetch" not in names and "import" not in names
+
+    llm = [s for s in spans if s.name in ("llm.chat", "llm.chat_stream")]
+    assert llm
+    assert all(s.attributes["prompt_tokens"] > 0 and s.attributes["completion_tokens"] > 0 for s in llm)
+    assert {by_id[s.parent_id].name for s in llm} >= {"stage1", "stage2", "stage3"}
+    assert all(s.attributes["bytes"] > 0 for s in spans if s.name == "build")
@@ -0,0 +1,92 @@
+"""
+Tests for the transcript normalization pre-pass
+
+Validates that timestamps, rolling-caption duplicates, filler words and
+boilerplate are removed while the spoken content is kept. Cue numbers,
+leading timestamps and rolling captions are only handled in SRT/WebVTT input.
+"""
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p.llm import count_tokens
+from src.h5p.pipeline.normalize import is_caption_format, normalize_transcript
+
+
+AUTO_CAPTIONS = """WEBVTT
+Kind: captions
+Language: de
+
+00:00:00.000 --> 00:00:02.500 align:start position:0%
+[Musik]
+
+00:00:02.500 --> 00:00:04.000 align:start position:0%
+hallo<00:00:02.900><c> und</c><00:00:03.100><c> willkommen</c>
+
+00:00:04.000 --> 00:00:06.000 align:start position:0%
+hallo und willkommen
+zu diesem Video über äh KI
+
+00:00:06.000 --> 00:00:08.000 align:start position:0%
+zu diesem Video über äh KI
+das ist, ähm, ganz wichtig
+"""
+
+
+def test_auto_captions_are_reduced_to_spoken_text():
+    text, stats = normalize_transcript(AUTO_CAPTIONS)
+
+    assert text == "hallo und willkommen zu diesem Video über KI das ist ganz wichtig"
+    assert stats["chars_before"] == len(AUTO_CAPTIONS)
+    assert stats["chars_after"] == len(text)
+    assert stats["tokens_after"] < stats["tokens_before"]
+    assert stats["saved_percent"] > 50
+
+
+def test_srt_and_boilerplate():
+    srt = (
+        "1\n00:00:01,000 --> 00:00:03,000\nMachine Learning lernt aus Daten.\n\n"
+        "2\n00:00:03,000 --> 00:00:05,000\nÄhm, das ist der Kern. Hm.\n\n"
+        "3\n00:00:05,000 --> 00:00:07,000\nUntertitel im Auftrag des ZDF, 2021\n"
+    )
+
+    text, _ = normalize_transcript(srt)
+
+    assert text == "Machine Learning lernt aus Daten. das ist der Kern."
+
+
+def test_plain_text_keeps_content_and_real_repetitions():
+    transcript = "[00:12] Die die Daten sind gut.\nDaten sind gut, weil sie sauber sind.\nÄhnlich wie Hummeln."
+
+    text, _ = normalize_transcript(transcript)
+
+    assert text == "Die die Daten sind gut. Daten sind gut, weil sie sauber sind. Ähnlich wie Hummeln."
+
+
+@pytest.mark.parametrize("transcript, expected", [
+    ("Der Zug fährt um\n14:30 Uhr ab", "Der Zug fährt um 14:30 Uhr ab"),
+    ("Die Antwort lautet\n42\nund das ist sicher.", "Die Antwort lautet 42 und das ist sicher."),
+    (
+        "Es ist immer wieder das gleiche\ndas gleiche gilt auch hier.",
+        "Es ist immer wieder das gleiche das gleiche gilt auch hier."
+    ),
+])
+def test_plain_text_rules_do_not_drop_content(transcript, expected):
+    assert not is_caption_format(transcript)
+
+    text, _ = normalize_transcript(transcript)
+
+    assert text == expected
+
+
+def test_caption_format_detection_and_token_stats():
+    assert is_caption_format(AUTO_CAPTIONS)
+    assert is_caption_format("1\n00:00:01,000 --> 00:00:03,000\nText\n")
+
+    text, stats = normalize_transcript(AUTO_CAPTIONS)
+
+    # Same token count as the LLM budgeting
+    assert stats["tokens_before"] == count_tokens(AUTO_CAPTIONS)
+    assert stats["tokens_after"] == count_tokens(text)
@@ -0,0 +1,177 @@
+"""
+Tests for the local Supabase transcript store
+
+Validates that:
+1. The first fetch downloads and stores the row compressed
+2. Re-fetches only send a small version probe while the row is unchanged
+3. A changed version, a missing version column (ETag/304) and force refresh work
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.h5p import transcript_store
+from src.h5p.transcript_store import TranscriptStore, fetch_youtube_row, fetch_youtube_row_async
+
+
+ROW = {"id": 7, "title": "KI", "subtitles": "Hallo " * 5000, "url": "https://youtu.be/x"}
+
+
+class FakeSupabase:
+    def __init__(self, has_version_column=True, etag='"v1"'):
+        self.version = "2025-01-01T00:00:00"
+        self.has_version_column = has_version_column
+        self.etag = etag
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        select = request.url.params["select"]
+        self.requests.append(select)
+        if "updated_at" in select and not self.has_version_column:
+            return httpx.Response(400, json={"message": "column does not exist"})
+        if self.etag and request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304)
+        if select == "id,updated_at":
+            return httpx.Response(200, json=[{"id": 7, "updated_at": self.version}])
+        row = dict(ROW)
+        if "updated_at" in select:
+            row["updated_at"] = self.version
+        headers = {"etag": self.etag} if self.etag else {}
+        return httpx.Response(200, json=[row], headers=headers)
+
+    def client(self) -> httpx.Client:
+        return httpx.Client(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = TranscriptStore(tmp_path / "transcripts.sqlite3")
+    monkeypatch.setattr(transcript_store, "get_transcript_store", lambda: store)
+    return store
+
+
+def fetch(server: FakeSupabase, force: bool = False) -> dict:
+    return fetch_youtube_row(7, "http://supabase", "key", force=force, client=server.client())
+
+
+def test_unchanged_row_is_revalidated_with_probe_only(store):
+    server = FakeSupabase()
+
+    assert fetch(server) == ROW
+    assert fetch(server) == ROW
+
+    assert server.requests == [transcript_store.SELECT_COLUMNS + ",updated_at", "id,updated_at"]
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 1
+    # Stored compressed
+    assert store.stats()["bytes"] < len(json.dumps(ROW)) / 10
+
+
+def test_changed_version_downloads_again(store):
+    server = FakeSupabase()
+    fetch(server)
+    server.version = "2025-02-01T00:00:00"
+
+    fetch(server)
+
+    assert server.requests[-2:] == ["id,updated_at", transcript_store.SELECT_COLUMNS + ",updated_at"]
+    assert store.get(7).version == "2025-02-01T00:00:00"
+
+
+def test_without_version_column_etag_revalidation_is_used(store):
+    server = FakeSupabase(has_version_column=False)
+
+    assert fetch(server) == ROW
+    assert fetch(server) == ROW
+
+    assert store.version_column is None
+    assert server.requests[-1] == transcript_store.SELECT_COLUMNS
+    assert store.stats()["hits"] == 1
+
+
+def test_force_and_async_fetch(store):
+    server = FakeSupabase()
+    fetch(server)
+    fetch(server, force=True)
+    assert store.stats()["misses"] == 2
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server.handler)) as client:
+            return await fetch_youtube_row_async(7, "http://supabase", "key", client=client)
+
+    assert asyncio.run(run()) == ROW
+    assert server.requests[-1] == "id,updated_at"
+
+
+def test_missing_row_raises(store):
+    client = httpx.Client(transport=httpx.MockTransport(lambda r: httpx.Response(200, json=[])))
+
+    with pytest.raises(ValueError):
+        fetch_youtube_row(99, "http://supabase", "key", client=client)
+
+
+def test_json_array_decoder_yields_rows_across_chunks():
+    text = json.dumps([{"id": 1, "subtitles": "a, [b] {c}"}, {"id": 2, "subtitles": "ä"}])
+    decoder = transcript_store.JSONArrayDecoder()
+    items = []
+    for i in range(0, len(text), 4):
+        items.extend(decoder.feed(text[i:i + 4]))
+
+    assert [item["id"] for item in items] == [1, 2]
+    assert items[0]["subtitles"] == "a, [b] {c}"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4096])
+def test_json_array_decoder_handles_escapes_split_across_chunks(chunk_size):
+    rows = [
+        {"id": 1, "subtitles": 'Er sagte: "Hallo" \\ und ging.\n' * 200},
+        {"id": 2, "subtitles": "endet mit Backslash \\", "tags": [[], {}, "]"]},
+        7, None, True, "\\\"",
+    ]
+    text = json.dumps(rows, ensure_ascii=False)
+    decoder = transcript_store.JSONArrayDecoder()
+    items = []
+    for i in range(0, len(text), chunk_size):
+        items.extend(decoder.feed(text[i:i + chunk_size]))
+
+    assert items == rows
+
+
+def test_bulk_fetch_pages_and_skips_unchanged_rows(store):
+    versions = {i: "v1" for i in range(1, 8)}
+    requests = []
+
+    def handler(request):
+        select = request.url.params["select"]
+        ids = [int(i) for i in request.url.params["id"][len("in.("):-1].split(",")]
+        requests.append((select, ids))
+        if select == "id,updated_at":
+            return httpx.Response(200, json=[{"id": i, "updated_at": versions[i]} for i in ids])
+        rows = [{"id": i, "title": f"T{i}", "subtitles": "x" * 100, "url": "u", "updated_at": versions[i]}
+                for i in ids if i != 7]
+        return httpx.Response(200, json=rows)
+
+    async def run(ids):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await transcript_store.fetch_youtube_rows_async(
+                ids, "http://supabase", "key", page_size=3, client=client
+            )
+
+    rows = asyncio.run(run(range(1, 8)))
+    assert sorted(rows) == [1, 2, 3, 4, 5, 6]  # 7 does not exist
+    assert [len(ids) for _, ids in requests] == [3, 3, 1]
+    assert "updated_at" not in rows[1]
+
+    requests.clear()
+    versions[2] = "v2"
+    rows = asyncio.run(run([1, 2, 3]))
+
+    assert requests == [("id,updated_at", [1, 2, 3]), (transcript_store.SELECT_COLUMNS + ",updated_at", [2])]
+    assert rows[1]["title"] == "T1"
+    assert store.get(2).version == "v2"